@@ -1,26 +1,37 @@
 from flask import Flask, request, jsonify, redirect, session
 from flask_session import Session
-from concurrent.futures import ThreadPoolExecutor
-from twilio.rest import Client
-from openai import OpenAI
 from datetime import datetime
 import json
 import pytz
 import logging
-import firebase_admin
-from firebase_admin import firestore, credentials
 from googleapiclient.discovery import build
 from google.cloud.firestore_v1.base_query import FieldFilter
 from google_auth_oauthlib.flow import Flow 
 import os
 
-from utils.tools_instructions import tools, recurring_tools, email_tools
+from utils.tools_instructions import recurring_tools, email_tools
 from utils.tools_instructions import assistant_instructions, recurrence_instructions, list_to_text_instructions
-from utils.reminder_utils import get_reminders, handle_reminders, update_recurring_reminders, add_reminder, delete_reminder
-from utils.calendar_utils import list_calendar, add_to_calendar
-from utils.memory import setSummary, setFacts, getSummary, getFacts
-from utils.gmail import build_gmail_service, check_new_emails, send_reply
-from utils.time_utils import find_conflict
+from utils.reminder_store import migrate_reminders
+from utils.reminder_utils import get_reminders, handle_reminder_batch, update_recurring_reminders, add_reminder, delete_reminder
+from utils.calendar_utils import list_calendar, list_busy, add_to_calendar, add_events, build_event
+from utils.calendar_mirror import get_calendar_mirror
+from utils.memory import setSummary, setFacts, getSummary, getFacts, build_memory_context
+from utils.summarizer import SummaryEngine
+from utils.gmail import build_gmail_service, send_reply
+from utils.gmail_sync import GmailSync
+from utils.email_sweep import EmailSweep, SHARD_FIELD, shard_for
+from utils.email_classifier import EmailClassifier
+from utils.time_utils import find_conflict, candidate_window
+from utils.scheduler import ReminderScheduler, set_scheduler, CATCH_UP
+from utils.intent_router import route
+from utils.sms_stream import stream_reply, DeliveredText
+from utils.list_render import render_reminders, render_events, wants_prose
+from utils.prompt import build_request, tools_for, date_context, request_context, log_usage
+from utils.llm_cache import cached, get_response_cache
+from utils.clients import get_openai_client, get_twilio_client, get_firestore_client, run_async
+from utils.job_queue import KeyedExecutor, KeyedLock
+from utils.user_cache import get_user_cache
+from utils.google_services import get_service_pool
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
@@ -34,22 +45,37 @@ Session(app)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
-# Twilio credentials
-TWILIO_SID = os.getenv("TWILIO_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+# Twilio number conversations are created from
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
-# OpenAI api key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Clients
-Tclient = Client(TWILIO_SID, TWILIO_AUTH_TOKEN)
-Oclient = OpenAI(api_key=OPENAI_API_KEY)
+# Clients, shared with the utils modules and pooled in utils/clients.py
+Tclient = get_twilio_client()
+Oclient = get_openai_client()
+Cclient = cached(Oclient) # For calls whose output depends only on the request
 
 # Initialize firestore
-cred = credentials.Certificate("/mnt/secrets4/FIREBASE_ADMIN_AUTH")
-DB_app = firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = get_firestore_client()
+users_cache = get_user_cache(db)
+
+def store_refreshed_token(number, credential):
+    """ Write a refreshed Google access token back so other requests and instances reuse it """
+    fields = {"google_token.token": credential.token}
+    if credential.expiry:
+        fields["google_token.expiry"] = credential.expiry.isoformat()
+    users_cache.update(number, fields)
+
+# Share Google credentials and API clients across requests
+get_service_pool().on_refresh = store_refreshed_token
+gmail_sync = GmailSync(users_cache)
+
+# Start in-process reminder scheduler. /reminder_thread still works as a catch-up tick when this is disabled
+scheduler = ReminderScheduler(db, handle_reminder_batch)
+set_scheduler(scheduler)
+if os.getenv("REMINDER_SCHEDULER", "1") == "1":
+    scheduler.start()
+
+# Text long answers to users in SMS-sized pieces while the model is still writing them
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
 
 # Set up Google API scopes
 SCOPES = [
@@ -73,106 +99,281 @@ def credentials_to_dict(credentials):
             'scopes': credentials.scopes
         }
 
-def convert_list_to_text(schedule, r):
+def send_text(Twilio_id, body):
+    """ Send one message to a user's conversation """
+    return Tclient.conversations.v1.conversations(
+        Twilio_id
+    ).messages.create(
+        body=body
+    )
+
+def reply_failed(response):
+    """ True when there is no usable response: the call raised, the stream ended without one, or the model reported a failure """
+    return response is None or getattr(response, "status", None) == "failed" or not response.output
+
+def stream_text(stream_to, request, sent, label="response"):
+    """
+    Stream a reply to a Twilio conversation, collecting the texts sent in `sent`.
+
+    Returns:
+        The completed response, or None if it failed after some texts went out. Raises if it failed before any did
+    """
+    def deliver(body):
+        send_text(stream_to, body)
+        sent.append(body)
+    try:
+        response = stream_reply(Oclient, deliver, **request)
+    except Exception as e:
+        if not sent:
+            raise
+        logger.exception("OpenAI %s stream broke off after %d texts", label, len(sent))
+        return None
+    log_usage(response, label)
+    if reply_failed(response) and not sent:
+        raise RuntimeError(f"OpenAI {label} stream ended without a reply")
+    return response
+
+def convert_list_to_text(schedule, r, stream_to=None):
     # r: whether the user is asking for reminder or calendar. 0 for reminder and 1 for calendar
+    # stream_to: Twilio conversation to text the list to as it is generated
     # Create a response message to send back to the user
-    response = Oclient.responses.create(
-        model="gpt-4.1",
-        input=[{
-                    "role": "user",
-                    "content": [
-                            {
-                            "type": "input_text",
-                            "text": f"{schedule}"
-                        }
-                    ]
-                }],
-        instructions= list_to_text_instructions(r)
-        )
+    request = build_request(list_to_text_instructions(r), "user", [{"type": "input_text", "text": f"{schedule}"}])
+    if STREAM_REPLIES and stream_to:
+        sent = []
+        response = stream_text(stream_to, request, sent, "list")
+        return DeliveredText("\n".join(sent) if reply_failed(response) else response.output_text)
+    response = Cclient.responses.create(**request)
+    log_usage(response, "list")
     return response.output_text
 
-def create_response(instructions, role, message, tools):
+def create_response(instructions, role, message, tools, stream_to=None, context=None, cache=False, sent=None):
+    # stream_to: Twilio conversation to text any output text to as it is generated
+    # context: Per-request text such as the current time, sent after the static instructions and tools
+    # cache: Reuse the response to an identical earlier request. Only for pure calls, never conversation turns
+    # sent: List collecting the texts that went out while streaming, so a failed reply can tell whether the user saw any of it
+    sent = [] if sent is None else sent
     try:
-        response = Oclient.responses.create(
-            instructions=instructions,
-            model="gpt-4.1",
-            input=[{"role": role, "content": message}],
-            tools=tools
-        )
+        request = build_request(instructions, role, message, tools, context)
+        if STREAM_REPLIES and stream_to:
+            return stream_text(stream_to, request, sent)
+        response = (Cclient if cache else Oclient).responses.create(**request)
+        log_usage(response)
         return response
     except Exception as e:
         logger.exception("OpenAI response not created")
 
+def handle_tool_call(tool_name, parsed_data, user_message, from_number, user_dict):
+    """ Run the handler for a tool call, whether it came from the model or the local intent router """
+    Twilio_id = user_dict.get("twilio_ID")
+    Timezone = user_dict.get("profile").get("timezone", "US/Eastern")
+    message_final = None
+
+    if tool_name == "parse_set_reminder": # Set reminder
+        task = parsed_data.get("task")
+        date = parsed_data.get("date") 
+        time = parsed_data.get("time")
+        recurring = parsed_data.get("recurring")
+        if recurring == True: # Check if reminder is recurring
+            recurrence = create_response(recurrence_instructions, "developer", user_message, recurring_tools, cache=True)
+            parsed_frequency = recurrence.output[0].arguments
+            frequency = json.loads(parsed_frequency)
+        else:
+            frequency = None
+        if task and time:
+            status = add_reminder(from_number, db, task, date, time, Timezone, recurring, frequency)
+            if status == 1:
+                message = create_response(
+                    instructions="You create friendly automatic responses to confirm users' reminder requests.",
+                    role = "developer",
+                    message=user_message,
+                    tools=None,
+                    cache=True
+                )
+                message_final = message.output_text
+            else:
+                message_final = "Reminder not set, please try again."
+    
+    elif tool_name == "parse_delete_reminder": # Delete reminder
+        task = parsed_data.get("task")
+        date = parsed_data.get("date", None)
+        time = parsed_data.get("time", None)
+        delete_reminder(from_number, db, task, date, time)
+        message = create_response(
+            instructions="You create friendly automatic reponses to confirm users' reminder deletion.",
+            role = "developer",
+            message=user_message,
+            tools=None,
+            cache=True
+        )
+        message_final = message.output_text
+
+    elif tool_name == "list_reminders": # List reminders
+        p = get_reminders(from_number, db, Timezone)
+        if wants_prose(user_message): # Questions about the list still go to the model
+            message_final = convert_list_to_text(p,0, stream_to=user_dict.get("twilio_ID"))
+        else:
+            message_final = render_reminders(p, Timezone)
+    
+    elif tool_name == "user_timezone": # Set timezone
+        timezone = parsed_data.get("timezone")
+        users_cache.update(from_number, {"profile.timezone": timezone})
+        message_final = "Noted!"
+
+    elif tool_name == "link_calendar_gmail": # Link calendar and gmail
+        message = Tclient.conversations.v1.conversations(
+            Twilio_id
+        ).messages.create(
+            body=f"https://textmarley-one-21309214523.us-central1.run.app/authorize?phone={from_number}"
+        )
+        message_final = "Click this link to give me access to your Google Calendar so I can better help you!"
+    
+    elif tool_name == "parse_calendar_event": # Set calendar event
+        if "google_token" in user_dict:
+            creds = user_dict.get("google_token")
+            
+            if parsed_data.get("events"): # Several events in one message, added in one batch
+                events, failed = [], []
+                for item in parsed_data["events"]:
+                    try:
+                        events.append(build_event(item.get("event"), item.get("date"), item.get("start_time"), Timezone, item.get("duration"), item.get("end_time"),
+                                                  item.get("frequency"), ",".join(item.get("byday") or []), item.get("interval")))
+                    except (TypeError, ValueError): # Missing or malformed date/time
+                        failed.append(str(item.get("event")))
+                results = add_events(creds, events, owner=from_number)
+                added = [event["summary"] for event, result in zip(events, results) if result["status"] != "failed"]
+                failed += [event["summary"] for event, result in zip(events, results) if result["status"] == "failed"]
+                status = 1 if added else 0
+                if failed:
+                    user_message = f"{user_message}\n(Could not add: {', '.join(failed)})"
+            else:
+                event = parsed_data.get("event")
+                date = parsed_data.get("date") 
+                start_time = parsed_data.get("start_time")
+                end_time = parsed_data.get("end_time")
+                duration = parsed_data.get("duration")
+                recurring = parsed_data.get("recurring")
+                if recurring == True: # Check if event is recurring
+                    recurrence = create_response(recurrence_instructions, "developer", user_message, recurring_tools, cache=True)
+                    parsed_frequency = recurrence.output[0].arguments
+                    frequency = json.loads(parsed_frequency)
+                    FREQ = frequency.get("FREQ")
+                    INTERVAL = frequency.get("INTERVAL")
+                    BYDAY = frequency.get("BYDAY") or []
+                    comma = ","
+                    joined = comma.join(BYDAY)
+                    status = add_to_calendar(creds, event, date, start_time, Timezone, duration, end_time, FREQ, joined, INTERVAL, owner=from_number)
+                else:
+                    status = add_to_calendar(creds, event, date, start_time, Timezone, duration, end_time, owner=from_number)
+            if status == 1:
+                message = create_response(
+                    instructions="You create friendly automatic responses to confirm users' calendar event creation request. If some events could not be added, say which.", 
+                    role="developer",
+                    message=user_message,
+                    tools=None,
+                    cache=True
+                )
+                message_final = message.output_text
+            else: message_final = "Calendar event not added, please try again."
+        else: message_final = "You have not yet connected your calendar yet!"
+
+    elif tool_name == "list_calendar_events": # List calendar events
+        if "google_token" in user_dict:
+            creds = user_dict.get("google_token")
+            p = list_calendar(creds, owner=from_number)
+            if wants_prose(user_message):
+                message_final = convert_list_to_text(p,1, stream_to=user_dict.get("twilio_ID"))
+            else:
+                message_final = render_events(p, Timezone)
+        else:
+            message_final = "You have not yet connected your calendar yet!"
+
+    elif tool_name == "update_checkMail":
+        update = parsed_data.get("update")
+        users_cache.update(from_number, {"profile.preferences.checkMail": update})
+        message_final = "Updated your preferences!"
+    return message_final
+
+def classify_email_llm(subject, body, timezone=None):
+    """ Ask the model whether an email is about scheduling. Returns the check_scheduling_email arguments, {} if the model answered without the tool, and raises if the call failed """
+    response = create_response(
+        instructions="You determine if this user's email is asking about scheduling.", 
+        role="developer", 
+        message=f"Subject: {subject}, Body: {body}", 
+        tools=email_tools,
+        context=date_context(timezone), # Resolve weekdays in the email against the user's today; date only, so the cache hits all day
+        cache=True)
+    if reply_failed(response): # Not an answer; the email stays pending and is classified again next check
+        raise RuntimeError("Email classification call failed")
+    if not hasattr(response.output[0], "arguments"): # The model answered without the tool: not a scheduling email
+        return {}
+    return json.loads(response.output[0].arguments) # Load tool call arguments
+
+# Headers, then a local detector, then the model; verdicts cached by Message-ID
+email_classifier = EmailClassifier(classify_email_llm, db)
+
 def process_user_email(user):
     user_dict = user.to_dict()
+    credential = user_dict.get("google_token")
+
+    # Get their emails that arrived since the last check
+    service = build_gmail_service(credential, owner=user.id)
+    # Check if any of them are scheduling emails. Failed fetches and handlers are retried next check
+    gmail_sync.check(user.id, service, user_dict.get("gmail_sync"), lambda email: schedule_from_email(user, user_dict, service, email))
+
+def schedule_from_email(user, user_dict, service, email):
+    """ Put a scheduling email's event on the user's calendar, tell the user and draft a reply """
     Twilio_id = user_dict.get("twilio_ID")
     credential = user_dict.get("google_token")
     Timezone = user_dict.get("profile").get("timezone", "US/Eastern")
     email_address = user_dict.get("profile").get("email")
-
-    # Get their latest emails
-    service = build_gmail_service(credential)
-    emails = check_new_emails(service, email_address)
-
-    # Check if any of them are scheduling emails
-    for email in emails:
-        logger.info("Checking %s of user ID: %s for scheduling emails...", email_address, user.id)
-
-        msg_id, body, sender, subject, message_id, thread_id = email
-        response = create_response(
-            instructions="You determine if this user's email is asking about scheduling.", 
-            role="developer", 
-            message=f"Subject: {subject}, Body: {body}", 
-            tools=email_tools)
-        arguments = response.output[0].arguments # Load tool call arguments
-        parsed_data = json.loads(arguments)
-        to_schedule = parsed_data.get("scheduling", False)
-        
-        if to_schedule: # The email is asking to schedule 
-            event = parsed_data.get("event")
-            possible_times = parsed_data.get("possible_times")
-            user_events = list_calendar(credential)
-
-            # Check if there is an available time to schedule
-            logger.info("Finding best available times for %s of user ID %s among %d calendar events", email_address, user.id, len(user_events))
-            best_time = find_conflict(possible_times, user_events, Timezone)
-            logger.info("Best time found: %s", best_time)
-            
-            if best_time: # Only schedule if a best time was found
-
-                # Separate best time into time and date components
-                start_time = best_time.strftime("%H:%M")
-                date = best_time.strftime("%Y-%m-%d")
-
-                status = add_to_calendar(credential, event, date, start_time, Timezone) # Add event to calendar
-                if status == 1:
-                    send_to_user = create_response(
-                        f"Inform the user you have added this event to their calendar based on this email from {sender}. Start your response with who the user received the email from and what they were asking. Then you can inform the user what you scheduled.", 
-                        "developer",
-                        f"Subject: {subject}, Event: {event}, time: {start_time}, date: {date}", 
-                        tools=None
-                        )
-                    message_final = send_to_user.output_text
-                    message = Tclient.conversations.v1.conversations( # Send confirmation back to user
-                            Twilio_id
-                        ).messages.create(
-                            body=message_final
-                        )
-                    reply_response = create_response(f"Pretend you are the user and create an automatic response to this email confirming the time: {start_time} and date: {date}. No need to write a subject, just the email body is fine, including greeting and sign-off.",
-                        "developer",
-                        f"Original email: {body}",
-                        tools=None
-                        )
-                    reply = reply_response.output_text 
-                    send_reply(service, reply, sender, subject, email_address, message_id, thread_id) # Propose reply back to sender
-
-                    # service.users().messages().modify( # Set email as read
-                    #     userId='me',
-                    #     id=msg_id,
-                    #     body={'removeLabelIds': ['UNREAD']}
-                    # ).execute()
-            else:
-                logger.warning("Could not find time to schedule event for %s", email_address)
+    logger.info("Checking %s of user ID: %s for scheduling emails...", email_address, user.id)
+
+    msg_id, body, sender, subject, message_id, thread_id = email
+    verdict = email_classifier.classify(subject, body, sender, message_id, timezone=Timezone) # Raises if the model call fails, leaving the email for the next check
+    if not verdict.scheduling: # The email is not asking to schedule
+        return
+
+    event = verdict.event
+    possible_times = verdict.possible_times
+    window = candidate_window(possible_times, Timezone)
+    user_events = list_busy(credential, *window, owner=user.id) if window else []
+
+    # Check if there is an available time to schedule
+    logger.info("Finding best available times for %s of user ID %s among %d calendar events", email_address, user.id, len(user_events))
+    best_time = find_conflict(possible_times, user_events, Timezone, work_hours=user_dict.get("profile").get("workHours"))
+    logger.info("Best time found: %s", best_time)
+    if not best_time: # Only schedule if a best time was found
+        logger.warning("Could not find time to schedule event for %s", email_address)
+        return
+
+    # Separate best time into time and date components
+    start_time = best_time.strftime("%H:%M")
+    date = best_time.strftime("%Y-%m-%d")
+
+    # Add event to calendar, once per email
+    result = add_events(credential, [build_event(event, date, start_time, Timezone)], user.id, [message_id] if message_id else None)[0]
+    if result["status"] == "failed":
+        logger.warning("Could not add event from email %s of user ID %s: %s", msg_id, user.id, result["error"])
+        return
+    if result["status"] == "exists": # Already scheduled by an earlier check that was cut short; the user was told then
+        logger.info("Event from email %s of user ID %s already on the calendar", msg_id, user.id)
+        return
+
+    send_to_user = create_response(
+        f"Inform the user you have added this event to their calendar based on this email from {sender}. Start your response with who the user received the email from and what they were asking. Then you can inform the user what you scheduled.", 
+        "developer",
+        f"Subject: {subject}, Event: {event}, time: {start_time}, date: {date}", 
+        tools=None
+        )
+    message_final = send_to_user.output_text
+    send_text(Twilio_id, message_final) # Send confirmation back to user
+    reply_response = create_response(f"Pretend you are the user and create an automatic response to this email confirming the time: {start_time} and date: {date}. No need to write a subject, just the email body is fine, including greeting and sign-off.",
+        "developer",
+        f"Original email: {body}",
+        tools=None
+        )
+    reply = reply_response.output_text 
+    send_reply(service, reply, sender, subject, email_address, message_id, thread_id) # Propose reply back to sender
 
 # Endpoint for creating conversation once phone number is received
 @app.route("/create_conversation", methods=["POST"])
@@ -181,12 +382,11 @@ def create_conversation():
     if len(user_phone) == 10:
         user_phone = "+1" + user_phone
 
-    user_ref = db.collection("Users").document(f"{user_phone}").get()
+    user_dict = users_cache.get(user_phone)
 
     logger.info("Received user number: %s from website", user_phone)
 
-    if user_ref.exists:
-        user_dict = user_ref.to_dict()
+    if user_dict is not None:
         Twilio_id = user_dict.get("twilio_ID")
 
         message_final = "Hello! You have already signed up."
@@ -208,8 +408,7 @@ def create_conversation():
             )
         
         # Add conversation to firestore collection where document ID is phone number 
-        user_ref = db.collection("Users").document(f"{user_phone}")
-        user_ref.set({"twilio_ID": f"{conversation.sid}"}, merge=True)
+        users_cache.set(user_phone, {"twilio_ID": f"{conversation.sid}"}, merge=True)
 
         try: 
             # Add participant to new conversation
@@ -222,7 +421,7 @@ def create_conversation():
         except Exception as e:
             logger.exception("Invalid message binding address with this number: %s", user_phone)
 
-        response = create_response(assistant_instructions, "user", "Hello, introduce yourself!", tools=None)
+        response = create_response(assistant_instructions, "user", "Hello, introduce yourself!", tools=None, cache=True)
         send = response.output_text
 
         # Send initial message
@@ -233,9 +432,9 @@ def create_conversation():
             )
         
         # Set up user profile
-        user_ref.set({
+        users_cache.set(user_phone, {
             "memory": 
-            {"facts": [], "summary": [], "summarized": True}, 
+            {"facts": [], "daily": [], "weekly": [], "long_term": "", "watermark": -1, "summarized": True}, 
             "profile": 
             {"googleConnected": False, "name": None, "timezone": None, "preferences": {"dailyBriefing": False, "nudge": False, "checkMail": False}, "workHours": {"start": None, "end": None}}
             },
@@ -270,6 +469,64 @@ def create_conversation():
             'phone_number': user_phone
         })
 
+def process_message(from_number, user_message):
+    """ Answer one inbound text. Runs inside the webhook, or on a queue worker when ASYNC_RECEIVE is on """
+    # Get twilio id
+    user_dict = users_cache.get(from_number)
+    if user_dict is not None:
+        Twilio_id = user_dict.get("twilio_ID")
+
+        routed = route(user_message) # Skip the model for messages the local router is confident about
+        if routed:
+            logger.info("Routed message from %s to %s locally (score %.0f)", from_number, routed.tool_name, routed.score)
+            message_final = handle_tool_call(routed.tool_name, routed.arguments, user_message, from_number, user_dict)
+        else:
+            profile = user_dict.get("profile") or {}
+            sent = []
+            response = create_response(assistant_instructions, "user", user_message, tools_for(profile), stream_to=Twilio_id, # Create assistant response to user message, texting any answer as it streams
+                                       context=request_context(profile, memory=build_memory_context(user_dict)), sent=sent) # Add what we remember about the user after the static prefix
+
+            if reply_failed(response):
+                if not sent: # Nothing reached the user, so failing the webhook lets Twilio retry safely
+                    raise RuntimeError(f"No assistant reply for {from_number}")
+                logger.error("Assistant reply to %s broke off after %d texts", from_number, len(sent))
+                message_final = DeliveredText("\n".join(sent)) # Already partly delivered; a retry would repeat it
+            elif hasattr(response.output[0], 'name') and hasattr(response.output[0], 'arguments'): # Check if tool calls were used
+
+                # Load tool call name and argument
+                tool_name = response.output[0].name
+                arguments = response.output[0].arguments
+                parsed_data = json.loads(arguments)
+                message_final = handle_tool_call(tool_name, parsed_data, user_message, from_number, user_dict)
+            else:
+                message_final = DeliveredText(response.output_text) if STREAM_REPLIES else response.output_text
+
+        # Send response back using twilio conversation, unless it was already sent as it streamed
+        if not isinstance(message_final, DeliveredText):
+            send_text(Twilio_id, message_final)
+        if user_dict.get("memory", {}).get("summarized") != False: # Skip the write when already marked
+            users_cache.update(from_number, {"memory.summarized": False})
+        return message_final
+    else:
+        logger.warning("User %s not found in Firestore database", from_number)
+        return None
+
+def process_messages(from_number, messages):
+    """ Answer a burst of texts from one user as a single turn """
+    process_message(from_number, "\n".join(messages))
+
+# Acknowledge webhooks immediately and answer on background workers. Work is serialized per user
+# and texts that arrive within MESSAGE_COALESCE_WINDOW seconds are answered together
+ASYNC_RECEIVE = os.getenv("ASYNC_RECEIVE", "0") == "1"
+message_queue = KeyedExecutor(
+    process_messages,
+    workers=int(os.getenv("MESSAGE_WORKERS", 8)),
+    max_depth=int(os.getenv("MESSAGE_QUEUE_DEPTH", 500)),
+    coalesce_window=float(os.getenv("MESSAGE_COALESCE_WINDOW", 1.5))
+    ) if ASYNC_RECEIVE else None
+# Serializes synchronous requests from the same user within this process
+user_locks = KeyedLock()
+
 # Endpoint for processing received messages
 @app.route("/receive_message", methods=["POST"])
 def receive_message():
@@ -278,172 +535,59 @@ def receive_message():
     user_message = request.form.get("Body")  # Message body
     logger.info("Message recieved from %s", from_number)
 
-    # Get twilio id
-    user_ref = db.collection("Users").document(f"{from_number}")
-    user = user_ref.get()
-    if user.exists:
-        user_dict = user.to_dict()
-        Twilio_id = user_dict.get("twilio_ID")
-        Timezone = user_dict.get("profile").get("timezone", "US/Eastern")
-
-        response = create_response(assistant_instructions, "user", user_message, tools) # Create assistant response to user message
+    if message_queue is not None:
+        if message_queue.submit(from_number, user_message):
+            return jsonify({"Status": "Queued"})
+        logger.warning("Message queue full (%d waiting), rejecting message from %s", message_queue.depth, from_number)
+        return jsonify({"Status": "Busy"}), 503, {"Retry-After": "5"}
 
-        if hasattr(response.output[0], 'name') and hasattr(response.output[0], 'arguments'): # Check if tool calls were used
-
-            # Load tool call name and argument
-            tool_name = response.output[0].name
-            arguments = response.output[0].arguments
-            parsed_data = json.loads(arguments)
-
-            if tool_name == "parse_set_reminder": # Set reminder
-                task = parsed_data.get("task")
-                date = parsed_data.get("date") 
-                time = parsed_data.get("time")
-                recurring = parsed_data.get("recurring")
-                if recurring == True: # Check if reminder is recurring
-                    recurrence = create_response(recurrence_instructions, "developer", user_message, recurring_tools)
-                    parsed_frequency = recurrence.output[0].arguments
-                    frequency = json.loads(parsed_frequency)
-                else:
-                    frequency = None
-                if task and time:
-                    status = add_reminder(from_number, db, task, date, time, Timezone, recurring, frequency)
-                    if status == 1:
-                        message = create_response(
-                            instructions="You create friendly automatic responses to confirm users' reminder requests.",
-                            role = "developer",
-                            message=user_message,
-                            tools=None
-                        )
-                        message_final = message.output_text
-                    else:
-                        message_final = "Reminder not set, please try again."
-            
-            elif tool_name == "parse_delete_reminder": # Delete reminder
-                task = parsed_data.get("task")
-                date = parsed_data.get("date", None)
-                time = parsed_data.get("time", None)
-                delete_reminder(from_number, db, task, date, time)
-                message = create_response(
-                    instructions="You create friendly automatic reponses to confirm users' reminder deletion.",
-                    role = "developer",
-                    message=user_message,
-                    tools=None
-                )
-                message_final = message.output_text
+    with user_locks.hold(from_number):
+        message_final = process_message(from_number, user_message)
+    if message_final is None:
+        return jsonify({"Return message": f"User {from_number} not found in database"})
+    return jsonify({"Return message": message_final})
 
-            elif tool_name == "list_reminders": # List reminders
-                p = get_reminders(from_number, db, Timezone)
-                message_final = convert_list_to_text(p,0)
-            
-            elif tool_name == "user_timezone": # Set timezone
-                timezone = parsed_data.get("timezone")
-                user_ref.update({"profile.timezone": timezone})
-                message_final = "Noted!"
-
-            elif tool_name == "link_calendar_gmail": # Link calendar and gmail
-                message = Tclient.conversations.v1.conversations(
-                    Twilio_id
-                ).messages.create(
-                    body=f"https://textmarley-one-21309214523.us-central1.run.app/authorize?phone={from_number}"
-                )
-                message_final = "Click this link to give me access to your Google Calendar so I can better help you!"
-            
-            elif tool_name == "parse_calendar_event": # Set calendar event
-                if "google_token" in user_dict:
-                    creds = user_dict.get("google_token")
-                    
-                    event = parsed_data.get("event")
-                    date = parsed_data.get("date") 
-                    start_time = parsed_data.get("start_time")
-                    end_time = parsed_data.get("end_time")
-                    duration = parsed_data.get("duration")
-                    recurring = parsed_data.get("recurring")
-                    if recurring == True: # Check if event is recurring
-                        recurrence = create_response(recurrence_instructions, "developer", user_message, recurring_tools)
-                        parsed_frequency = recurrence.output[0].arguments
-                        frequency = json.loads(parsed_frequency)
-                        FREQ = parsed_frequency.get("FREQ")
-                        INTERVAL = parsed_frequency.get("INTERVAL")
-                        BYDAY = parsed_frequency.get("BYDAY")
-                        comma = ","
-                        joined = comma.join(BYDAY)
-                        status = add_to_calendar(creds, event, date, start_time, Timezone, duration, end_time, FREQ, joined, INTERVAL)
-                    else:
-                        status = add_to_calendar(creds, event, date, start_time, Timezone, duration, end_time )
-                    if status == 1:
-                        message = create_response(
-                            instructions="You create friendly automatic responses to confirm users' calendar event creation request.", 
-                            role="developer",
-                            message=user_message,
-                            tools=None
-                        )
-                        message_final = message.output_text
-                    else: message_final = "Calendar event not added, please try again."
-                else: message_final = "You have not yet connected your calendar yet!"
-
-            elif tool_name == "list_calendar_events": # List calendar events
-                if "google_token" in user_dict:
-                    creds = user_dict.get("google_token")
-                    p = list_calendar(creds)
-                    message_final = convert_list_to_text(p,1)
-                else:
-                    message_final = "You have not yet connected your calendar yet!"
+@app.route("/queue_stats", methods=["GET"])
+def queue_stats():
+    if message_queue is None:
+        return jsonify({"async": False})
+    return jsonify({"async": True, **message_queue.stats()})
 
-            elif tool_name == "update_checkMail":
-                update = parsed_data.get("update")
-                user_ref.update({"profile.preferences.checkMail": update})
-                message_final = "Updated your preferences!"
-       
-        else:
-            message_final = response.output_text
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    return jsonify(users_cache.stats())
 
-        # Send response back using twilio conversation
-        message = Tclient.conversations.v1.conversations(
-            Twilio_id
-        ).messages.create(
-            body=message_final
-        )
-        user_ref.update({"memory.summarized": False})
-        return jsonify({"Return message": message_final})
-    else:
-        logger.warning("User %s not found in Firestore database", from_number)
-        return jsonify({"Return message": f"User {from_number} not found in database"})
+@app.route("/llm_cache_stats", methods=["GET"])
+def llm_cache_stats():
+    return jsonify(get_response_cache().stats())
 
 @app.route("/summarize", methods=["POST"])
 def summarize():
-    # Summarize each user conversation every night
-    users = db.collection("Users").where(filter=FieldFilter("memory.summarized", "==", False)).stream()
-    executor2 = ThreadPoolExecutor(max_workers=10)
-    futures = []
-    for user in users:
-        user_dict = user.to_dict()
-        twilio_ID = user_dict["twilio_ID"]
-        futures.append(executor2.submit(setSummary, db, user, user.id, twilio_ID))
-    for f in futures:
-        f.result()    
-    return jsonify({"Message": "Recent messages summarized and stored"})
+    # Summarize each user conversation every night. Resumes from the last checkpoint if a previous run was cut short
+    engine = SummaryEngine(db, Cclient, Tclient) # A rerun after a cut-short run reuses the summaries already made
+    max_seconds = float(os.getenv("SUMMARIZE_MAX_SECONDS", 3000))
+    if os.getenv("ASYNC_PIPELINES", "0") == "1": # Fetch and summarize as coroutines on the async clients
+        stats = run_async(engine.run_async(max_seconds=max_seconds))
+    else:
+        stats = engine.run(max_seconds=max_seconds)
+    return jsonify({"Message": "Recent messages summarized and stored", **stats})
 
 # Endpoint for sending out reminders
 @app.route("/reminder_thread", methods=["POST"])
 def reminder_thread():
-    now = datetime.now(pytz.UTC).replace(second=0, microsecond=0).isoformat()
-    reminders = db.collection("Reminders").where(filter=FieldFilter("time", "==", now)).where(filter=FieldFilter("status", "==", "Pending")).stream()
-    
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [executor.submit(handle_reminders, event, db) for event in reminders]
-        for f in futures:
-            f.result()
-    return jsonify({"Status": "Reminders sent"})
+    # Send anything due, including reminders missed by late or failed ticks
+    sent = scheduler.tick()
+    return jsonify({"Status": "Reminders sent", "Sent": sent})
 
 # Endpoint for retiring old reminders
 @app.route("/delete_expired_reminders", methods=["POST"])
 def delete_past_reminder(): 
     """
-        Set past non-recurring reminders to be completed
+        Set past non-recurring reminders to be completed. Reminders inside the scheduler's 
+        catch-up window are left alone so they can still be sent
     """
-    now = datetime.now(pytz.UTC).replace(second=0, microsecond=0).isoformat()
-    reminders = db.collection("Reminders").where(filter=FieldFilter("time", "<", now)).where(filter=FieldFilter("status", "==", "Pending")).where(filter=FieldFilter("recurring", "==", False)).stream()
+    now = (datetime.now(pytz.UTC) - CATCH_UP).replace(second=0, microsecond=0)
+    reminders = db.collection("Reminders").where(filter=FieldFilter("fire_at", "<", now)).where(filter=FieldFilter("status", "==", "Pending")).where(filter=FieldFilter("recurring", "==", False)).stream()
     for event in reminders:
         event_dict = event.to_dict()
         if event_dict.get("recurring") == False:
@@ -454,9 +598,16 @@ def delete_past_reminder():
 # Endpoint for updating recurring reminders
 @app.route("/update_recurring", methods=["POST"])
 def update_recurring():
-    # Update recurring reminders
-    update_recurring_reminders(db)
-    return {"Status": "Recurring reminders updated"}
+    # Update recurring reminders, resuming from the last checkpoint. With ADVANCE_RECURRING_AT_FIRE=1 this only catches stragglers
+    stats = update_recurring_reminders(db, max_seconds=float(os.getenv("UPDATE_RECURRING_MAX_SECONDS", 240)))
+    return jsonify({"Status": "Recurring reminders updated", **stats})
+
+# Endpoint for backfilling fire_at and bucket on reminders stored before them
+@app.route("/migrate_reminders", methods=["POST"])
+def migrate_reminder_fields():
+    # Resumes from the last checkpoint; call until "finished" is true, before relying on the bucketed scheduler
+    stats = migrate_reminders(db, max_seconds=float(os.getenv("MIGRATE_MAX_SECONDS", 240)))
+    return jsonify({"Message": "Reminders migrated", **stats})
 
 # Endpoint for authorizing user with Googe
 @app.route("/authorize", methods=["GET"])
@@ -495,26 +646,28 @@ def oauth2callback():
 
     number = session.get("phone_number")
     logger.info("Retrieved phone number %s from session", number)
-    user_ref = db.collection("Users").document(number)
 
     gmail_service = build("gmail", "v1", credentials=credentials)
     profile = gmail_service.users().getProfile(userId='me').execute()
     email = profile.get("emailAddress")
     
-    user_dict = user_ref.get().to_dict()
+    user_dict = users_cache.get(number)
+    get_calendar_mirror().evict(number) # The account may have changed
     if "google_token" in user_dict:
-        user_ref.update({"google_token.token": credentials.token,
-                         "google_token.refresh_token": credentials.refresh_token,
-                         "google_token.scopes": credentials.scopes,
-                         "profile.googleConnected": True})
-        user_ref.set({"profile": {"email": email}}, merge = True)
+        users_cache.update(number, {"google_token.token": credentials.token,
+                                    "google_token.refresh_token": credentials.refresh_token,
+                                    "google_token.scopes": credentials.scopes,
+                                    "profile.googleConnected": True,
+                                    SHARD_FIELD: shard_for(number)})
+        users_cache.set(number, {"profile": {"email": email}}, merge = True)
         return "<p>You already have a Google Calendar and Gmail connected! You may exit this window."
     else: 
-        user_ref.update({
-            "profile.googleConnected": True
+        users_cache.update(number, {
+            "profile.googleConnected": True,
+            SHARD_FIELD: shard_for(number)
         })
         
-        user_ref.set({
+        users_cache.set(number, {
             "profile": {"email": email},
             "google_token": credentials_to_dict(credentials) # Store calendar credentials with user
         }, merge=True)
@@ -529,18 +682,12 @@ def oauth2callback():
 
 @app.route("/check_emails", methods=["POST"])
 def check_mail():
-    # Filter for users who have calendar and gmail connected and would like Marley to check their email
-    users = db.collection("Users").where(filter=FieldFilter("profile.googleConnected", "==", True)).where(filter=FieldFilter("profile.preferences.checkMail", "==", True)).stream()
-
-    with ThreadPoolExecutor(max_workers=10) as email_executor:
-        futures = [email_executor.submit(process_user_email, user) for user in users]
-        for f in futures:
-            try:
-                f.result()
-            except Exception as e:
-                logger.exception("Error in processing email")
+    # Work shards of users who have calendar and gmail connected and would like Marley to check their email.
+    # Concurrent calls (other instances or overlapping cron runs) lease different shards of the same round
+    sweep = EmailSweep(db, process_user_email, workers=int(os.getenv("EMAIL_SWEEP_WORKERS", 10)))
+    stats = sweep.run(max_seconds=float(os.getenv("EMAIL_SWEEP_MAX_SECONDS", 240)))
     
-    return jsonify({"status": "Checked email for scheduling intents."})
+    return jsonify({"status": "Checked email for scheduling intents.", **stats})
 
 # Endpoint for testing
 @app.route("/testing", methods=["GET"])
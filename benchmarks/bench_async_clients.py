@@ -0,0 +1,192 @@
+"""
+Hundreds of outstanding calls on threads versus coroutines on the async client helpers in
+utils/clients.py:
+
+    calls       - compose with the model, then text the user: a thread per call versus
+                  create_response_async and send_text_async
+    reminders   - ReminderPipeline.run on its thread pools versus run_async, with a model call
+                  per reminder
+    summarizer  - SummaryEngine.process_page versus process_page_async on one page of users
+
+Reports wall time, the peak number of threads added, and the peak number of model calls in flight,
+which the async paths hold to OPENAI_CONCURRENCY, and checks that both paths produce the same
+results.
+
+    python -m benchmarks.bench_async_clients --calls 500 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeAsyncOpenAI, FakeFirestore, FakeOpenAI, FakeTwilio
+from utils.clients import LIMITS, close_async_clients, create_response_async, send_text_async
+from utils.reminder_pipeline import ReminderPipeline
+from utils.reminder_text import ReminderTextEngine
+from utils.summarizer import PACKED_INSTRUCTIONS, SummaryEngine
+
+
+class ThreadPeak:
+    """ Samples threading.active_count() in the background. `added` excludes threads that were already running """
+
+    def __init__(self):
+        self.baseline = threading.active_count()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excinfo):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def added(self) -> int:
+        return self.peak - self.baseline - 1 # Not counting the sampler
+
+
+def measure(run):
+    """ (seconds, threads added at the peak, result) of run() """
+    with ThreadPeak() as threads:
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+    return elapsed, threads.added, result
+
+
+def on_loop(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await close_async_clients()
+    return asyncio.run(main())
+
+
+def calls_threaded(args):
+    openai_client, twilio_client = FakeOpenAI(latency=args.latency), FakeTwilio(latency=args.send)
+    in_flight = peak = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        text = openai_client.responses.create(model="gpt-4o-mini", input=f"task {i}").output_text
+        with lock:
+            in_flight -= 1
+        twilio_client.conversations.v1.conversations(f"CH{i}").messages.create(body=text)
+
+    def run():
+        with ThreadPoolExecutor(max_workers=args.calls) as pool:
+            list(pool.map(one, range(args.calls)))
+    elapsed, threads, _ = measure(run)
+    return elapsed, threads, peak, sorted(twilio_client.sent)
+
+
+def calls_async(args):
+    openai_client, twilio_client = FakeAsyncOpenAI(latency=args.latency), FakeTwilio(latency=args.send)
+
+    async def one(i):
+        response = await create_response_async(client=openai_client, model="gpt-4o-mini", input=f"task {i}")
+        await send_text_async(f"CH{i}", response.output_text, client=twilio_client)
+
+    async def main():
+        await asyncio.gather(*(one(i) for i in range(args.calls)))
+
+    elapsed, threads, _ = measure(lambda: on_loop(main()))
+    return elapsed, threads, openai_client.peak_in_flight, sorted(twilio_client.sent)
+
+
+def seed_reminders(args):
+    db = FakeFirestore()
+    for r in range(args.calls):
+        db.collection("Users").document(f"+1555{r:07d}").set({"twilio_ID": f"CH{r}"})
+        db.collection("Reminders").document(f"r{r}").set({"user_number": f"+1555{r:07d}", "task": f"task {r}", "time": "2025-01-01T15:00:00+00:00", "recurring": r % 4 == 0, "status": "Pending"})
+    return db, list(db.collection("Reminders").stream())
+
+
+def reminders_threaded(args):
+    db, events = seed_reminders(args)
+    openai_client, twilio_client = FakeOpenAI(latency=args.latency), FakeTwilio(latency=args.send)
+    pipeline = ReminderPipeline(db, openai_client, twilio_client, text_engine=ReminderTextEngine(openai_client, use_llm=True))
+    elapsed, threads, _ = measure(lambda: pipeline.run(events))
+    for pool in (pipeline._compose_pool, pipeline._send_pool, pipeline._lookup_pool): # So the next run starts from the same baseline
+        pool.shutdown()
+    return elapsed, threads, openai_client.peak_in_flight, sorted(twilio_client.sent)
+
+
+def reminders_async(args):
+    db, events = seed_reminders(args)
+    openai_client, twilio_client = FakeAsyncOpenAI(latency=args.latency), FakeTwilio(latency=args.send)
+    pipeline = ReminderPipeline(db, None, None, text_engine=ReminderTextEngine(openai_client, use_llm=True), async_openai_client=openai_client, async_twilio_client=twilio_client)
+    elapsed, threads, _ = measure(lambda: on_loop(pipeline.run_async(events)))
+    return elapsed, threads, openai_client.peak_in_flight, sorted(twilio_client.sent)
+
+
+def summary_reply(instructions=None, input=None, **kwargs):
+    if instructions == PACKED_INSTRUCTIONS:
+        return json.dumps({key: {"summary": f"talked about {messages[0]}", "facts": []} for key, messages in json.loads(input).items()})
+    return json.dumps({"summary": f"talked about {input.splitlines()[0]}", "facts": []})
+
+
+def seed_users(args, twilio_client):
+    db = FakeFirestore()
+    for u in range(args.calls):
+        db.collection("Users").document(f"+1555{u:07d}").set({"twilio_ID": f"CH{u}", "memory": {"summarized": False, "watermark": -1}})
+        twilio_client.add_message(f"CH{u}", f"message {u}")
+    return db, list(db.collection("Users").stream())
+
+
+def summaries(db):
+    return sorted((user.id, (user.to_dict()["memory"].get("daily") or [{}])[0].get("text")) for user in db.collection("Users").stream())
+
+
+def summarizer_threaded(args):
+    openai_client, twilio_client = FakeOpenAI(latency=args.latency, reply=summary_reply), FakeTwilio(latency=args.send)
+    db, users = seed_users(args, twilio_client)
+    engine = SummaryEngine(db, openai_client, twilio_client, pack_size=1) # One model call per user, as when packing fails
+    elapsed, threads, _ = measure(lambda: engine.process_page(users))
+    return elapsed, threads, openai_client.peak_in_flight, summaries(db)
+
+
+def summarizer_async(args):
+    openai_client, twilio_client = FakeAsyncOpenAI(latency=args.latency, reply=summary_reply), FakeTwilio(latency=args.send)
+    db, users = seed_users(args, twilio_client)
+    engine = SummaryEngine(db, None, None, pack_size=1, async_openai_client=openai_client, async_twilio_client=twilio_client)
+    elapsed, threads, _ = measure(lambda: on_loop(engine.process_page_async(users)))
+    return elapsed, threads, openai_client.peak_in_flight, summaries(db)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--send", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{args.calls} outstanding calls, {args.latency * 1000:.0f} ms per model call, {args.send * 1000:.0f} ms per Twilio call, limits {LIMITS}")
+    for workload, runs in (("calls", (("thread per call", calls_threaded), ("asyncio", calls_async))),
+                           ("reminders", (("thread pools", reminders_threaded), ("asyncio", reminders_async))),
+                           ("summarizer", (("thread pools", summarizer_threaded), ("asyncio", summarizer_async)))):
+        print(f"{workload}:")
+        outputs = []
+        for name, run in runs:
+            elapsed, threads, in_flight, output = run(args)
+            outputs.append(output)
+            print(f"  {name:>15}: {elapsed:5.2f}s  threads added={threads:4d}  peak model calls in flight={in_flight:4d}  results={len(output)}")
+        print(f"  same results: {outputs[0] == outputs[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare one events().insert per event with add_events' batched inserts, and check that
+retrying the same request (as a redelivered webhook would) adds nothing twice.
+
+A class schedule is a handful of weekly recurring events; an imported term calendar is many
+one-off events. Each round-trip costs --latency seconds.
+
+    python -m benchmarks.bench_calendar_batch --events 40 --latency 0.1
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from benchmarks.fakes import FakeCalendar
+from utils import calendar_utils
+from utils.calendar_utils import add_events, build_event
+
+TZ = "US/Eastern"
+
+
+def make_events(count):
+    first = date(2026, 9, 7)
+    events = []
+    for i in range(count):
+        day = first + timedelta(days=i // 4)
+        hour = 9 + 2 * (i % 4)
+        events.append(build_event(f"class {i}", day.isoformat(), f"{hour:02d}:00", TZ, _end=f"{hour + 1:02d}:15",
+                                  frequency="WEEKLY" if i % 5 == 0 else None, byday="MO,WE,FR" if i % 5 == 0 else None))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per Calendar API round-trip")
+    args = parser.parse_args()
+
+    # One insert call per event, as add_to_calendar did
+    sequential = FakeCalendar(latency=args.latency)
+    start = time.perf_counter()
+    for event in make_events(args.events):
+        sequential.events().insert(calendarId="primary", body=event).execute()
+    sequential_time = time.perf_counter() - start
+
+    calendar = FakeCalendar(latency=args.latency)
+    calendar_utils.get_service_pool = lambda: SimpleNamespace(service=lambda *args, **kwargs: calendar)
+    start = time.perf_counter()
+    results = add_events({}, make_events(args.events), owner="+15550000000")
+    batch_time = time.perf_counter() - start
+    batch_trips = calendar.round_trips
+
+    # The webhook is redelivered: same events again
+    retry = add_events({}, make_events(args.events), owner="+15550000000")
+    retry_trips = calendar.round_trips - batch_trips
+    # The user deletes one event, then asks again
+    calendar.delete_event(results[0]["id"])
+    again = add_events({}, make_events(args.events)[:1], owner="+15550000000")
+    live = sum(event["status"] != "cancelled" for event in calendar.stored.values())
+
+    print(f"{args.events} events, {args.latency * 1000:.0f} ms per round-trip")
+    print(f"  insert per event: {sequential.round_trips} round-trips, {sequential_time:.2f}s")
+    print(f"  add_events:       {batch_trips} round-trips, {batch_time:.2f}s, statuses {count(results)}")
+    print(f"  retry:            {retry_trips} round-trips, statuses {count(retry)}; {live} events on the calendar")
+    print(f"  re-add deleted:   status {again[0]['status']}")
+
+
+def count(results):
+    totals = {}
+    for result in results:
+        totals[result["status"]] = totals.get(result["status"], 0) + 1
+    return totals
+
+
+if __name__ == "__main__":
+    main()
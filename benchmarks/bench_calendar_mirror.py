@@ -0,0 +1,96 @@
+"""
+Compare full events().list calls with the sync-token calendar mirror.
+
+One calendar with a few thousand events gets a stream of lookups ("what's on my calendar"
+and busy-range checks for scheduling emails) while events are added and deleted elsewhere.
+By default lookups are closer together than the mirror's sync interval, as in a burst of
+texts; with --sync-interval 0 every mirror lookup still does a delta sync, which costs a
+round-trip but transfers only the changed events.
+
+    python -m benchmarks.bench_calendar_mirror --events 3000 --lookups 200 --latency 0.05
+    python -m benchmarks.bench_calendar_mirror --sync-interval 0
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.fakes import FakeCalendar
+from utils.calendar_mirror import CalendarMirror
+
+
+def direct_busy(service, time_min, time_max):
+    """ The uncached path: page through events().list for the range """
+    schedule, page_token = [], None
+    while True:
+        result = service.events().list(calendarId="primary", timeMin=time_min, timeMax=time_max, maxResults=2500,
+                                       singleEvents=True, orderBy="startTime", pageToken=page_token).execute()
+        for event in result.get("items", []):
+            if event.get("transparency") != "transparent":
+                schedule.append((event["start"]["dateTime"], event["end"]["dateTime"], event.get("summary", "")))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return schedule
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per Calendar API round-trip")
+    parser.add_argument("--sync-interval", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now(pytz.UTC).replace(minute=0, second=0, microsecond=0)
+    calendar = FakeCalendar()
+    slot = lambda: now + timedelta(minutes=rng.randrange(0, 90 * 24 * 60, 15))
+    for i in range(args.events):
+        start = slot()
+        calendar.add_event(start.isoformat(), (start + timedelta(minutes=rng.choice([30, 60, 90]))).isoformat(), f"event {i}")
+    calendar.latency = args.latency
+
+    mirror = CalendarMirror(sync_interval=args.sync_interval, service=lambda creds, owner: calendar)
+    direct_time = mirror_time = 0.0
+    direct_trips = mirror_trips = direct_items = mirror_items = 0
+    mismatches = fallbacks = 0
+    for i in range(args.lookups):
+        if rng.random() < 0.1: # Someone edits the calendar elsewhere
+            start = slot()
+            calendar.add_event(start.isoformat(), (start + timedelta(hours=1)).isoformat(), "new")
+        if rng.random() < 0.05:
+            calendar.delete_event(rng.choice(list(calendar.stored)))
+        lo = slot()
+        hi = lo + timedelta(days=rng.choice([1, 3, 7]))
+
+        before, items = calendar.round_trips, calendar.items_sent
+        start = time.perf_counter()
+        expected = direct_busy(calendar, lo.isoformat(), hi.isoformat())
+        direct_time += time.perf_counter() - start
+        direct_trips += calendar.round_trips - before
+        direct_items += calendar.items_sent - items
+
+        before, items = calendar.round_trips, calendar.items_sent
+        start = time.perf_counter()
+        got = mirror.between({}, "+15550000000", lo.isoformat(), hi.isoformat())
+        if got is None: # Past the mirror's horizon, list_busy asks the API
+            fallbacks += 1
+            got = direct_busy(calendar, lo.isoformat(), hi.isoformat())
+        mirror_time += time.perf_counter() - start
+        mirror_trips += calendar.round_trips - before
+        mirror_items += calendar.items_sent - items
+        if args.sync_interval == 0:
+            mismatches += sorted(expected) != sorted(got)
+
+    print(f"{args.events} events, {args.lookups} busy-range lookups, {args.latency * 1000:.0f} ms per round-trip")
+    print(f"  events().list per lookup: {direct_trips} round-trips, {direct_items} events transferred, {direct_time:.2f}s")
+    print(f"  calendar mirror:          {mirror_trips} round-trips, {mirror_items} events transferred, {mirror_time:.2f}s, {mirror.stats}, {fallbacks} past the horizon")
+    if args.sync_interval == 0:
+        print(f"  results differing from the direct listing: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
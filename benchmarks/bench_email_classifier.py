@@ -0,0 +1,72 @@
+"""
+Offline evaluation of the layered scheduling-email classifier against a labeled corpus.
+
+The model is stood in for by an oracle that returns the label, so recall here is the share of
+scheduling emails the cheap layers let through to the model, and precision is the share of
+model calls spent on real scheduling emails. The baseline sends every email to the model.
+
+    python -m benchmarks.bench_email_classifier
+"""
+import argparse
+import json
+import os
+
+from utils.email_classifier import EmailClassifier, plausible_scheduling
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "email_corpus.jsonl")
+
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def headers_of(email):
+    return {"Subject": email["subject"], "From": email["from"], **email["headers"]}
+
+
+def evaluate(corpus, min_signals, metadata_stage=True):
+    oracle = {email["subject"] + email["body"]: email["scheduling"] for email in corpus}
+    classifier = EmailClassifier(lambda subject, body, timezone=None: {"scheduling": oracle[subject + body]}, min_signals=min_signals)
+    tp = fp = fn = calls = 0
+    for i, email in enumerate(corpus):
+        if metadata_stage and not plausible_scheduling(headers_of(email), email["body"][:200]):
+            verdict_scheduling, reached_llm = False, False
+        else:
+            before = classifier.stats["llm"]
+            verdict = classifier.classify(email["subject"], email["body"], email["from"], f"<{i}@corpus>", headers_of(email))
+            verdict_scheduling, reached_llm = verdict.scheduling, classifier.stats["llm"] > before
+        calls += reached_llm
+        tp += verdict_scheduling and email["scheduling"]
+        fp += verdict_scheduling and not email["scheduling"]
+        fn += not verdict_scheduling and email["scheduling"]
+    positives = sum(email["scheduling"] for email in corpus)
+    recall = tp / positives if positives else 1.0
+    llm_precision = tp / calls if calls else 1.0
+
+    # Every email checked again, as after a retry or resync: all answered from the verdict cache
+    before = classifier.stats["llm"]
+    for i, email in enumerate(corpus):
+        classifier.classify(email["subject"], email["body"], email["from"], f"<{i}@corpus>", headers_of(email))
+    repeat_calls = classifier.stats["llm"] - before
+    return recall, llm_precision, calls, fp, repeat_calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    args = parser.parse_args()
+
+    corpus = load(args.corpus)
+    positives = sum(email["scheduling"] for email in corpus)
+    print(f"{len(corpus)} emails, {positives} about scheduling. Baseline: {len(corpus)} model calls, recall 100%, precision {positives / len(corpus):.0%}")
+    print(f"{'layers':<34} {'recall':>7} {'precision':>10} {'model calls':>12} {'saved':>7} {'calls on retry':>15}")
+    configs = [("headers + detector(1)", 1, False), ("headers + detector(2)", 2, False), ("headers + detector(3)", 3, False),
+               ("metadata + headers + detector(2)", 2, True)]
+    for name, min_signals, metadata_stage in configs:
+        recall, precision, calls, fp, repeat_calls = evaluate(corpus, min_signals, metadata_stage)
+        print(f"{name:<34} {recall:>7.0%} {precision:>10.0%} {calls:>12} {1 - calls / len(corpus):>7.0%} {repeat_calls:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the old nested-loop conflict check with the NumPy interval engine on large calendars.
+
+Events are random 15-120 minute blocks over a year; candidates are random start times. The
+engine's time includes parsing the events, which the old loop redid for every candidate.
+
+    python -m benchmarks.bench_free_slots --events 10000 --candidates 50
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from dateutil.parser import isoparse
+
+from utils.intervals import BusyIntervals
+
+TZ = "US/Eastern"
+
+
+def old_find_conflict(possible_times, user_events, Timezone):
+    """ The previous implementation: re-parse every event for every candidate """
+    user_tz = pytz.timezone(Timezone)
+    for time_str in possible_times:
+        time_start = isoparse(time_str)
+        if time_start.tzinfo is None:
+            time_start = user_tz.localize(time_start)
+        time_end = time_start + timedelta(hours=1)
+        conflict = False
+        for unavailable_start, unavailable_end, event in user_events:
+            event_start = isoparse(unavailable_start)
+            event_end = isoparse(unavailable_end)
+            if event_start.tzinfo is None:
+                event_start = user_tz.localize(event_start)
+            if event_end.tzinfo is None:
+                event_end = user_tz.localize(event_end)
+            if time_start < event_end and time_end > event_start:
+                conflict = True
+                break
+        if not conflict:
+            return time_start
+    return None
+
+
+def make_calendar(count, rng):
+    tz = pytz.timezone(TZ)
+    origin = tz.localize(datetime(2026, 1, 1))
+    events = []
+    for i in range(count):
+        start = origin + timedelta(minutes=rng.randrange(0, 365 * 24 * 60, 15))
+        events.append((start.isoformat(), (start + timedelta(minutes=rng.choice([15, 30, 60, 90, 120]))).isoformat(), f"event {i}"))
+    events.sort()
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    events = make_calendar(args.events, rng)
+    origin = pytz.timezone(TZ).localize(datetime(2026, 1, 1))
+    # Mostly busy times so the search has to look at every candidate
+    busy_starts = [isoparse(start) for start, _, _ in events]
+    candidates = [rng.choice(busy_starts).replace(tzinfo=None).isoformat() for _ in range(args.candidates - 1)]
+    candidates.append((origin + timedelta(days=400)).replace(tzinfo=None).isoformat())
+
+    start = time.perf_counter()
+    old = old_find_conflict(candidates, events, TZ)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    busy = BusyIntervals.from_events(events, TZ)
+    parse_time = time.perf_counter() - start
+    start = time.perf_counter()
+    new = busy.first_free(candidates)
+    query_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    windows = busy.free_windows(origin, origin + timedelta(days=365), timedelta(minutes=30))
+    windows_time = time.perf_counter() - start
+    worked = BusyIntervals.from_events(events, TZ, {"start": "09:00", "end": "17:00"})
+    start = time.perf_counter()
+    work_windows = worked.free_windows(origin, origin + timedelta(days=365), timedelta(minutes=30))
+    work_windows_time = time.perf_counter() - start
+
+    assert old == new, (old, new)
+    print(f"{args.events} events ({len(busy)} merged busy blocks), {args.candidates} candidates; both chose {new}")
+    print(f"  nested loop:     {old_time * 1000:9.1f} ms")
+    print(f"  interval engine: {(parse_time + query_time) * 1000:9.1f} ms (parse {parse_time * 1000:.1f} ms, query {query_time * 1000:.2f} ms)")
+    print(f"  speedup: {old_time / (parse_time + query_time):.0f}x")
+    print(f"  free windows over a year: {len(windows)} in {windows_time * 1000:.1f} ms, {len(work_windows)} within work hours in {work_windows_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare the old per-message full fetch with batched, metadata-first fetching in check_new_emails.
+
+Each mailbox gets a mix of scheduling and non-scheduling emails. Reports HTTP round-trips,
+response bytes and wall time with a simulated per-request latency.
+
+    python -m benchmarks.bench_gmail_fetch --emails 5 --latency 0.08
+"""
+import argparse
+import random
+import time
+
+from benchmarks.fakes import FakeGmail
+from utils.gmail import check_new_emails
+
+SCHEDULING = [
+    ("Coffee next week?", "Hey! Are you free Tuesday at 3pm for coffee? Let me know what works."),
+    ("Project sync", "Can we schedule a call tomorrow to go over the draft?"),
+    ("Interview availability", "Please share your availability for a 30 minute interview next week."),
+]
+OTHER = [
+    ("Your receipt", "Thanks for your order. Your package has shipped and will arrive soon."),
+    ("Newsletter", "Here are the top stories from around campus, plus photos from the game."),
+    ("Password changed", "The password for your account was changed. If this was not you, reset it."),
+    ("Shared document", "A document was shared with you. Open it to see the latest edits."),
+]
+
+
+def old_check_new_emails(service):
+    """ The previous fetch path: list, then one format='full' get per message """
+    messages = service.users().messages().list(userId='me', labelIds=["INBOX"], maxResults=5).execute().get('messages', [])
+    return [service.users().messages().get(userId='me', id=msg['id'], format='full').execute() for msg in messages]
+
+
+def mailbox(args, rng):
+    gmail = FakeGmail(latency=args.latency)
+    for _ in range(args.emails):
+        subject, body = rng.choice(SCHEDULING if rng.random() < args.scheduling_rate else OTHER)
+        gmail.add_message(subject, body * args.body_repeat, html_body=f"<p>{body * args.body_repeat}</p>")
+    return gmail
+
+
+def measure(name, fn, args):
+    rng = random.Random(args.seed)
+    trips = size = 0
+    start = time.perf_counter()
+    for _ in range(args.users):
+        gmail = mailbox(args, rng)
+        fn(gmail)
+        trips += gmail.round_trips
+        size += gmail.bytes
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<10} {trips / args.users:5.1f} round-trips/user  {size / args.users / 1024:7.1f} KiB/user  {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--emails", type=int, default=5, help="New emails per mailbox (check_new_emails lists at most 5)")
+    parser.add_argument("--scheduling-rate", type=float, default=0.2)
+    parser.add_argument("--body-repeat", type=int, default=20, help="Repeat the body text to mimic longer emails")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per HTTP round-trip")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.users} users, {args.emails} new emails each, {args.scheduling_rate:.0%} about scheduling")
+    measure("per-get", old_check_new_emails, args)
+    measure("batched", lambda gmail: check_new_emails(gmail, "user@example.com"), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare building Google API clients per call with reusing them from the service pool.
+
+Runs offline: the credentials are dummies and no request is executed, so this measures only
+discovery parsing, credential construction and client assembly.
+
+    python -m benchmarks.bench_google_services --users 50 --calls 20
+"""
+import argparse
+import time
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from utils.google_services import GoogleServicePool
+
+
+def fake_token(i):
+    return {
+        "token": f"token-{i}",
+        "refresh_token": f"refresh-{i}",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "client",
+        "client_secret": "secret",
+        "scopes": ["https://www.googleapis.com/auth/calendar"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=20, help="Calendar/Gmail calls per user")
+    args = parser.parse_args()
+
+    tokens = [fake_token(i) for i in range(args.users)]
+    total = args.users * args.calls
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        for creds in tokens:
+            build("calendar", "v3", credentials=Credentials(**creds))
+    rebuild = time.perf_counter() - start
+
+    pool = GoogleServicePool()
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        for i, creds in enumerate(tokens):
+            pool.service(creds, "calendar", "v3", owner=f"+1{i:010d}")
+    pooled = time.perf_counter() - start
+
+    print(f"{total} service lookups for {args.users} users")
+    print(f"  build per call: {rebuild:.3f}s ({rebuild / total * 1000:.2f} ms each)")
+    print(f"  service pool:   {pooled:.3f}s ({pooled / total * 1000:.2f} ms each), {pool.stats()}")
+    print(f"  speedup: {rebuild / pooled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
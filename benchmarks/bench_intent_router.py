@@ -0,0 +1,82 @@
+"""
+Score the local intent router against the labeled corpus and estimate the latency it saves.
+
+Messages the router answers skip the create_response round-trip. Model latency is drawn from a
+log-normal with the given median and p99, since real latencies are right-skewed.
+
+    python -m benchmarks.bench_intent_router --llm-p50 1.2 --llm-p99 4.0
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import time
+
+from utils.intent_router import route
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "intent_corpus.jsonl")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--llm-p50", type=float, default=1.2, help="Median create_response latency in seconds")
+    parser.add_argument("--llm-p99", type=float, default=4.0, help="p99 create_response latency in seconds")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    routed = correct = wrong = 0
+    for item in corpus:
+        result = route(item["text"])
+        if result is None:
+            continue
+        routed += 1
+        if result.tool_name == item["intent"]:
+            correct += 1
+        else:
+            wrong += 1
+            print(f"misrouted: {item['text']!r} -> {result.tool_name} (expected {item['intent']})")
+    routable = sum(1 for item in corpus if item["intent"] in ("list_reminders", "list_calendar_events", "user_timezone", "link_calendar_gmail"))
+
+    # Router cost per message
+    router_times = []
+    for _ in range(args.repeat):
+        for item in corpus:
+            start = time.perf_counter()
+            route(item["text"])
+            router_times.append(time.perf_counter() - start)
+
+    # Simulated end-to-end classification latency with and without the router
+    rng = random.Random(args.seed)
+    mu = math.log(args.llm_p50)
+    sigma = (math.log(args.llm_p99) - mu) / 2.326
+    baseline, with_router = [], []
+    for _ in range(args.repeat):
+        for item in corpus:
+            llm = rng.lognormvariate(mu, sigma)
+            baseline.append(llm)
+            with_router.append(statistics.mean(router_times) if route(item["text"]) else llm)
+
+    print(f"messages:            {len(corpus)}")
+    print(f"hit rate:            {routed / len(corpus):.1%} of all messages, {correct / max(routable, 1):.1%} of routable intents")
+    print(f"precision:           {correct / max(routed, 1):.1%} ({wrong} misrouted)")
+    print(f"router latency:      p50 {percentile(router_times, 50) * 1e6:.1f}us  p99 {percentile(router_times, 99) * 1e6:.1f}us")
+    for p in (50, 99):
+        before, after = percentile(baseline, p), percentile(with_router, p)
+        print(f"p{p} latency:         {before:.3f}s -> {after:.3f}s (saved {before - after:.3f}s)")
+    print(f"mean latency saved:  {statistics.mean(baseline) - statistics.mean(with_router):.3f}s per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the model round-trip in convert_list_to_text with local list rendering.
+
+The fake model answers after --first-token seconds plus --token seconds per ~4 characters of
+output, roughly gpt-4.1's pace; tokens are estimated at 4 characters each.
+
+    python -m benchmarks.bench_list_render --reminders 25
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.fakes import FakeOpenAI
+from utils.list_render import render_events, render_reminders
+from utils.sms_stream import segment_count
+from utils.tools_instructions import list_to_text_instructions
+
+TZ = "US/Eastern"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=25)
+    parser.add_argument("--events", type=int, default=7)
+    parser.add_argument("--first-token", type=float, default=0.5)
+    parser.add_argument("--token", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    tz = pytz.timezone(TZ)
+    now = datetime.now(tz).replace(minute=0, second=0, microsecond=0)
+    reminders = [(f"Review lecture notes for class {i}", (now + timedelta(hours=7 * i + 1)).isoformat()) for i in range(args.reminders)]
+    events = [((now + timedelta(hours=20 * i + 2)).isoformat(), (now + timedelta(hours=20 * i + 3)).isoformat(), f"Meeting {i}") for i in range(args.events)]
+
+    for name, schedule, r, render in (("reminders", reminders, 0, lambda: render_reminders(reminders, TZ)),
+                                      ("calendar", events, 1, lambda: render_events(events, TZ))):
+        text = render()
+        client = FakeOpenAI(latency=args.first_token, token_latency=args.token, reply=lambda **kwargs: text)
+        start = time.perf_counter()
+        client.responses.create(model="gpt-4.1", input=f"{schedule}", instructions=list_to_text_instructions(r))
+        llm_time = time.perf_counter() - start
+        tokens = (len(f"{schedule}") + len(list_to_text_instructions(r)) + len(text)) // 4
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            render()
+        render_time = (time.perf_counter() - start) / args.repeat
+        print(f"{name}: {len(schedule)} items, {segment_count(text)} segments")
+        print(f"  model:  {llm_time * 1000:8.0f} ms, ~{tokens} tokens")
+        print(f"  render: {render_time * 1000:8.2f} ms, 0 tokens")
+    print()
+    print(render_reminders(reminders, TZ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Model calls and wall time for a burst of repetitive LLM requests, with and without the response cache.
+
+The workload mixes the calls that repeat across users: recurrence parsing of common phrasings
+and confirmation messages, drawn with a skewed (Zipf-like) distribution and issued from a
+thread pool, as concurrent webhooks would. The SQLite tier is checked by rerunning the workload
+against a fresh cache on the same file, as after a restart.
+
+    python -m benchmarks.bench_llm_cache --requests 2000 --workers 32 --latency 0.3
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeOpenAI
+from utils.llm_cache import CachedClient, ResponseCache
+from utils.prompt import build_request
+from utils.tools_instructions import recurrence_instructions, recurring_tools
+
+PHRASES = ["every day", "every morning", "daily", "every week", "weekly on mondays", "every monday and wednesday",
+           "every other week", "every month", "monthly", "every hour", "every 2 hours", "every weekday",
+           "every tuesday and thursday", "every 3 days", "every weekend", "twice a week", "every friday",
+           "every sunday night", "every 6 hours", "on the first of every month"]
+CONFIRM = "You create friendly automatic responses to confirm users' reminder requests."
+
+
+def workload(count, rng):
+    kinds = []
+    for phrase in PHRASES:
+        kinds.append(build_request(recurrence_instructions, "developer", f"remind me to take my vitamins {phrase}", recurring_tools))
+        kinds.append(build_request(CONFIRM, "developer", f"remind me to call mom {phrase}"))
+    weights = [1 / (rank + 1) for rank in range(len(kinds))]
+    return rng.choices(kinds, weights, k=count)
+
+
+def run(client, requests, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = list(pool.map(lambda request: client.responses.create(**request).output_text, requests))
+    return time.perf_counter() - start, texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    requests = workload(args.requests, random.Random(args.seed))
+    reply = lambda **kwargs: f"ok: {kwargs['input'][-1]['content']}"
+    print(f"{args.requests} requests, {len({str(r) for r in requests})} distinct, {args.workers} workers, {args.latency * 1000:.0f} ms per model call")
+
+    fake = FakeOpenAI(latency=args.latency, reply=reply)
+    elapsed, expected = run(fake, requests, args.workers)
+    print(f"  no cache:       {elapsed:6.2f}s  model calls={fake.calls}")
+
+    fake = FakeOpenAI(latency=args.latency, reply=reply)
+    cache = ResponseCache()
+    elapsed, texts = run(CachedClient(fake, cache), requests, args.workers)
+    print(f"  memory cache:   {elapsed:6.2f}s  model calls={fake.calls}  same replies={texts == expected}  {cache.stats()}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.sqlite")
+        fake = FakeOpenAI(latency=args.latency, reply=reply)
+        run(CachedClient(fake, ResponseCache(path=path)), requests, args.workers)
+        cache = ResponseCache(path=path) # After a restart
+        fake = FakeOpenAI(latency=args.latency, reply=reply)
+        elapsed, texts = run(CachedClient(fake, cache), requests, args.workers)
+        print(f"  after restart:  {elapsed:6.2f}s  model calls={fake.calls}  same replies={texts == expected}  {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
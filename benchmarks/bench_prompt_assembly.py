@@ -0,0 +1,73 @@
+"""
+Tokens sent per conversation turn, and how much of each request is a prefix shared with the
+previous one (what the provider's prompt cache can reuse), before and after prompt assembly.
+
+Before: every tool, with the date and time baked into tool descriptions and instructions.
+After: static tools and instructions, the tool subset for the user's state, and the date as a
+short message after them. Tokens are estimated at 4 characters each.
+
+    python -m benchmarks.bench_prompt_assembly
+"""
+import argparse
+import copy
+import json
+from datetime import datetime, timedelta
+
+import pytz
+
+from utils.prompt import build_request, request_context, tools_for
+from utils.tools_instructions import assistant_instructions, tools
+
+NOW = datetime(2026, 10, 17, 15, 30, tzinfo=pytz.UTC)
+MESSAGE = "remind me to call mom tomorrow at 6"
+# Prompt caching only applies once the shared prefix reaches this many tokens
+MIN_CACHED = 1024
+
+
+def old_request(now, message):
+    """ The request as it was built before: dates in the tool schemas and instructions """
+    local = now.astimezone(pytz.timezone("US/Eastern"))
+    stamp = f" Today's date is {local.strftime('%Y-%m-%d')}, weekday {local.isoweekday()}, time {local.strftime('%H:%M')}."
+    old_tools = copy.deepcopy(tools)
+    for tool in old_tools:
+        for name, prop in tool.get("parameters", {}).get("properties", {}).items():
+            if name in ("date", "time", "start_time"):
+                prop["description"] += stamp
+    return dict(instructions=assistant_instructions + stamp, model="gpt-4.1", input=[{"role": "user", "content": message}], tools=old_tools)
+
+
+def serialize(request):
+    """ Roughly the order the provider lays a request out in: tools, instructions, then input """
+    return json.dumps(request.get("tools")) + (request.get("instructions") or "") + json.dumps(request.get("input"))
+
+
+def shared_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes-apart", type=int, default=1)
+    args = parser.parse_args()
+
+    later = NOW + timedelta(minutes=args.minutes_apart)
+    print(f"two turns {args.minutes_apart} minute(s) apart")
+    for state, profile in (("linked", {"googleConnected": True, "timezone": "US/Eastern"}), ("not linked", {"googleConnected": False, "timezone": "US/Pacific"})):
+        first, second = serialize(old_request(NOW, MESSAGE)), serialize(old_request(later, MESSAGE))
+        before_tokens, before_shared = len(second) // 4, shared_prefix(first, second) // 4
+        new = lambda now: build_request(assistant_instructions, "user", MESSAGE, tools_for(profile), request_context(profile, now))
+        first, second = serialize(new(NOW)), serialize(new(later))
+        after_tokens, after_shared = len(second) // 4, shared_prefix(first, second) // 4
+        print(f"{state}:")
+        for name, total, shared in (("before", before_tokens, before_shared), ("after", after_tokens, after_shared)):
+            cacheable = shared if shared >= MIN_CACHED else 0
+            print(f"  {name:>6}: ~{total:5d} tokens sent, shared prefix ~{shared:5d}, cacheable ~{cacheable:5d}, uncached ~{total - cacheable:5d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compare the old timedelta-based /update_recurring sweep with the RRULE engine.
+
+Recurring reminders of every kind are seeded a few weeks in the past, straddling the November
+DST change, and both sweeps advance them. Each result is checked against what the reminder
+asked for: the same local time of day, a day of the week it repeats on, the same day of the
+month (or the month's last day), and a time after now.
+
+    python -m benchmarks.bench_recurrence --reminders 2000 --firestore-latency 0.02
+"""
+import argparse
+import calendar
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from benchmarks.fakes import FakeFirestore
+from utils.reminder_store import time_fields
+from utils.reminder_utils import update_recurring_reminders
+
+TZ = "US/Eastern"
+NOW = datetime(2026, 11, 20, 12, 0, tzinfo=pytz.UTC)
+
+
+def old_sweep(db, now):
+    """ The previous update_recurring_reminders: one step of timedelta arithmetic and one write per reminder """
+    reminders = db.collection("Reminders").where(filter=FieldFilter("status", "==", "Pending")).where(filter=FieldFilter("recurring", "==", True)).where(filter=FieldFilter("time", "<", now.isoformat())).stream()
+    for event in reminders:
+        d = event.to_dict()
+        time_ = datetime.fromisoformat(d["time"])
+        unit, how_often, days = d["frequency"]["time_unit"], d["frequency"]["how_often"], d["frequency"].get("days_of_week")
+        if unit == "hourly":
+            time_new = time_ + timedelta(hours=how_often)
+        elif unit == "daily":
+            time_new = time_ + timedelta(days=how_often)
+        elif unit == "weekly":
+            if days is None:
+                time_new = time_ + timedelta(weeks=how_often)
+            elif len(days) in (1, 7):
+                time_new = time_ + timedelta(weeks=1)
+            else:
+                weekday = (now.weekday() + 1) % 7
+                difference = days[0] - weekday + 7
+                for w in days:
+                    if w > weekday:
+                        difference = w - weekday
+                        break
+                time_new = time_ + timedelta(days=difference)
+        else:
+            time_new = time_ + timedelta(weeks=4 * how_often)
+        db.collection("Reminders").document(event.id).update({"time": time_new.isoformat()})
+
+
+FREQUENCIES = [
+    {"time_unit": "hourly", "how_often": 6},
+    {"time_unit": "daily", "how_often": 1},
+    {"time_unit": "daily", "how_often": 2},
+    {"time_unit": "weekly", "how_often": 1},
+    {"time_unit": "weekly", "how_often": 2, "days_of_week": [1, 3]},
+    {"time_unit": "weekly", "how_often": 3, "days_of_week": [2, 4, 6]},
+    {"time_unit": "monthly", "how_often": 1},
+]
+
+
+def seed(db, count, rng):
+    tz = pytz.timezone(TZ)
+    originals = {}
+    for i in range(count):
+        frequency = FREQUENCIES[i % len(FREQUENCIES)]
+        local = tz.localize(datetime(2026, 10, 1) + timedelta(days=rng.randrange(0, 45), hours=rng.randrange(7, 21)))
+        if frequency.get("days_of_week"): # Start on one of the rule's days, as a user would set it up
+            while (local.weekday() + 1) % 7 not in frequency["days_of_week"]:
+                local = tz.localize(local.replace(tzinfo=None) + timedelta(days=1))
+        time_str = local.astimezone(pytz.UTC).isoformat()
+        doc = {"user_number": f"+1555{i % 50:07d}", "task": f"task {i}", **time_fields(time_str), "recurring": True,
+               "frequency": frequency, "status": "Pending"}
+        if i % 3: # The rest predate stored timezones and fall back to the user's profile
+            doc["timezone"] = TZ
+        db.collection("Reminders").document(f"r{i:05d}").set(doc)
+        originals[f"r{i:05d}"] = (local, frequency)
+    for u in range(50):
+        db.collection("Users").document(f"+1555{u:07d}").set({"profile": {"timezone": TZ}})
+    return originals
+
+
+def check(db, originals, now):
+    tz = pytz.timezone(TZ)
+    errors = {"wrong local time": 0, "wrong weekday": 0, "wrong day of month": 0, "still past due": 0}
+    for reminder_id, (local, frequency) in originals.items():
+        new = datetime.fromisoformat(db.collection("Reminders").document(reminder_id).get().to_dict()["time"]).astimezone(tz)
+        unit = frequency["time_unit"]
+        if unit != "hourly" and (new.hour, new.minute) != (local.hour, local.minute):
+            errors["wrong local time"] += 1
+        if frequency.get("days_of_week") and (new.weekday() + 1) % 7 not in frequency["days_of_week"]:
+            errors["wrong weekday"] += 1
+        if unit == "monthly" and new.day != min(local.day, calendar.monthrange(new.year, new.month)[1]):
+            errors["wrong day of month"] += 1
+        if new <= now:
+            errors["still past due"] += 1
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=2000)
+    parser.add_argument("--firestore-latency", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.reminders} recurring reminders, {args.firestore_latency * 1000:.0f} ms per Firestore call, sweep at {NOW.isoformat()}")
+    for name in ("timedelta", "rrule"):
+        db = FakeFirestore(read_latency=args.firestore_latency, write_latency=args.firestore_latency)
+        originals = seed(db, args.reminders, random.Random(args.seed))
+        db.reads = db.writes = db.commits = 0
+        start = time.perf_counter()
+        if name == "timedelta":
+            old_sweep(db, NOW)
+        else:
+            update_recurring_reminders(db, now=NOW)
+        elapsed = time.perf_counter() - start
+        writes, commits = db.writes, db.commits
+        print(f"{name:>10}: {elapsed:6.2f}s  writes={writes}  batch commits={commits}  {check(db, originals, NOW)}")
+
+
+if __name__ == "__main__":
+    main()
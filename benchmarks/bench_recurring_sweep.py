@@ -0,0 +1,92 @@
+"""
+Measure the paged, checkpointed recurring-reminder sweep as the population and backlog grow.
+
+Each run seeds recurring reminders of every kind that are up to --behind-days past due (an
+hourly reminder a year behind has ~8,760 missed occurrences) and advances them all. The sweep
+is then repeated on a fresh copy with a zero time budget, so it stops after every page and
+resumes from its checkpoint, and both results are compared.
+
+The fake's queries filter and sort the whole collection on every page, where Firestore reads
+the page straight from an index, so query time is reported separately from the sweep's own.
+
+    python -m benchmarks.bench_recurring_sweep --sizes 1000 4000 16000 --behind-days 365
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.fakes import FakeFirestore, FakeQuery
+from utils.reminder_store import time_fields
+from utils.reminder_utils import update_recurring_reminders
+
+NOW = datetime(2026, 11, 20, 12, 0, tzinfo=pytz.UTC)
+FREQUENCIES = [
+    {"time_unit": "hourly", "how_often": 1},
+    {"time_unit": "daily", "how_often": 1},
+    {"time_unit": "weekly", "how_often": 2},
+    {"time_unit": "weekly", "how_often": 2, "days_of_week": [1, 3, 5]},
+    {"time_unit": "monthly", "how_often": 1},
+]
+
+
+def seed(count, behind_days, rng):
+    db = FakeFirestore()
+    for i in range(count):
+        fire_at = NOW - timedelta(minutes=rng.randrange(1, behind_days * 24 * 60))
+        db.collection("Reminders").document(f"r{i:06d}").set({
+            "user_number": f"+1555{i % 100:07d}", "task": f"task {i}", **time_fields(fire_at.isoformat()),
+            "recurring": True, "frequency": FREQUENCIES[i % len(FREQUENCIES)], "timezone": "US/Eastern", "status": "Pending"})
+    return db
+
+
+query_seconds = 0.0
+_stream = FakeQuery.stream
+
+
+def timed_stream(self):
+    global query_seconds
+    start = time.perf_counter()
+    snapshots = list(_stream(self))
+    query_seconds += time.perf_counter() - start
+    return iter(snapshots)
+
+
+FakeQuery.stream = timed_stream
+
+
+def times(db):
+    return {path: doc["time"] for path, doc in db._docs.items() if path.startswith("Reminders/")}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--behind-days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Reminders up to {args.behind_days} days past due, swept at {NOW.isoformat()}")
+    global query_seconds
+    for size in args.sizes:
+        db = seed(size, args.behind_days, random.Random(args.seed))
+        db.commits = 0
+        query_seconds = 0.0
+        start = time.perf_counter()
+        stats = update_recurring_reminders(db, now=NOW)
+        elapsed = time.perf_counter() - start - query_seconds
+        left = sum(1 for t in times(db).values() if datetime.fromisoformat(t) <= NOW)
+
+        resumed = seed(size, args.behind_days, random.Random(args.seed))
+        runs = 0
+        while not update_recurring_reminders(resumed, now=NOW, max_seconds=0)["finished"]:
+            runs += 1
+        same = times(resumed) == times(db)
+        print(f"  {size:>6} reminders: {elapsed:6.2f}s excluding fake queries ({elapsed / size * 1e6:4.0f} us each), {stats['pages']} pages, "
+              f"{db.commits} commits, {left} still past due; resumed over {runs} runs: {'identical' if same else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Check the bucketed reminder layout against the old ISO-string range queries.
+
+Reminders are seeded with the time strings found in older documents ("+00:00", "Z", naive
+and local offsets), migrated with migrate_reminders (paused after every page to exercise the
+checkpoint), and then the scheduler's window is read both ways and compared with the
+reminders that really fire in it.
+
+    python -m benchmarks.bench_reminder_layout --reminders 5000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from benchmarks.fakes import FakeFirestore
+from utils.reminder_store import migrate_reminders, pending_in_window
+
+NOW = datetime(2026, 10, 17, 15, 30, tzinfo=pytz.UTC)
+FORMATS = [
+    lambda dt: dt.isoformat(),                                               # standardize_time
+    lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    lambda dt: dt.replace(tzinfo=None).isoformat(),                          # naive UTC
+    lambda dt: dt.astimezone(pytz.timezone("US/Eastern")).isoformat(),     # stored with a local offset
+]
+
+
+def old_window(db, start, end):
+    return db.collection("Reminders").where(filter=FieldFilter("status", "==", "Pending")).where(filter=FieldFilter("time", ">=", start.isoformat())).where(filter=FieldFilter("time", "<", end.isoformat())).get()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = FakeFirestore()
+    start, end = NOW - timedelta(hours=6), NOW + timedelta(minutes=15)
+    expected = set()
+    for i in range(args.reminders):
+        fire_at = NOW + timedelta(minutes=rng.randrange(-3 * 24 * 60, 3 * 24 * 60))
+        db.collection("Reminders").document(f"r{i:06d}").set({"time": rng.choice(FORMATS)(fire_at), "status": "Pending", "recurring": False})
+        if start <= fire_at < end:
+            expected.add(f"r{i:06d}")
+
+    runs, migrate_time = 0, 0.0
+    while True:
+        t = time.perf_counter()
+        stats = migrate_reminders(db, page_size=args.page_size, max_seconds=0)
+        migrate_time += time.perf_counter() - t
+        runs += 1
+        if stats["finished"]:
+            break
+    again = migrate_reminders(db, page_size=args.page_size)
+
+    db.reads = 0
+    old = {s.id for s in old_window(db, start, end)}
+    old_reads = db.reads
+    db.reads = 0
+    new = {s.id for s in pending_in_window(db, start, end)}
+    new_reads = db.reads
+
+    print(f"{args.reminders} reminders, {len(expected)} due in the scheduler's window")
+    print(f"  migration: {runs} resumed runs, {stats['migrated']} documents updated in {migrate_time:.2f}s; rerun updated {again['migrated']}")
+    print(f"  string range on time: found {len(old & expected)}, missed {len(expected - old)}, wrongly included {len(old - expected)}, {old_reads} documents read")
+    print(f"  bucketed fire_at:     found {len(new & expected)}, missed {len(expected - new)}, wrongly included {len(new - expected)}, {new_reads} documents read")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare the old one-reminder-at-a-time fan-out with the batched reminder pipeline.
+
+    python -m benchmarks.bench_reminder_pipeline --reminders 2000
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeFirestore, FakeOpenAI, FakeTwilio
+from utils.reminder_pipeline import ReminderPipeline
+from utils.reminder_text import ReminderTextEngine
+
+
+def seed(db, reminders, users):
+    for u in range(users):
+        db.collection("Users").document(f"+1555{u:07d}").set({"twilio_ID": f"CH{u}"})
+    for r in range(reminders):
+        db.collection("Reminders").document(f"r{r}").set({
+            "user_number": f"+1555{r % users:07d}",
+            "task": f"task {r % 50}",
+            "time": "2025-01-01T15:00:00+00:00",
+            "recurring": r % 4 == 0,
+            "status": "Pending",
+        })
+    return list(db.collection("Reminders").stream())
+
+
+def sequential(events, db, openai_client, twilio_client):
+    """ The previous handle_reminders flow: per-reminder OpenAI call, user get, send and update """
+    def handle(event):
+        d = event.to_dict()
+        body = openai_client.responses.create(model="gpt-4o-mini", input=d["task"]).output_text
+        user = db.collection("Users").document(d["user_number"]).get()
+        if user.exists:
+            twilio_client.conversations.v1.conversations(user.to_dict()["twilio_ID"]).messages.create(body=body)
+        if d.get("recurring") == False:
+            db.collection("Reminders").document(event.id).update({"status": "Completed"})
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        list(executor.map(handle, events))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=800)
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--twilio-latency", type=float, default=0.1)
+    parser.add_argument("--firestore-latency", type=float, default=0.02)
+    parser.add_argument("--llm", action="store_true", help="Use the LLM fallback for reminder text instead of templates")
+    args = parser.parse_args()
+
+    for name in ("sequential", "pipeline"):
+        db = FakeFirestore(read_latency=args.firestore_latency, write_latency=args.firestore_latency)
+        events = seed(db, args.reminders, args.users)
+        db.reads = db.writes = db.commits = 0
+        openai_client = FakeOpenAI(latency=args.openai_latency)
+        twilio_client = FakeTwilio(latency=args.twilio_latency)
+
+        start = time.perf_counter()
+        if name == "sequential":
+            sequential(events, db, openai_client, twilio_client)
+            stats = None
+        else:
+            text_engine = ReminderTextEngine(openai_client, use_llm=args.llm)
+            pipeline = ReminderPipeline(db, openai_client, twilio_client, text_engine=text_engine)
+            pipeline.run(events)
+            stats = pipeline.snapshot_stats()
+        elapsed = time.perf_counter() - start
+
+        print(f"{name:>10}: {elapsed:7.2f}s  sent={len(twilio_client.sent)}  openai_calls={openai_client.calls}  reads={db.reads}  writes={db.writes}  commits={db.commits}")
+        if stats:
+            for stage, counters in stats.items():
+                print(f"{'':>12}{stage:<8} {counters}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Time to first text for long replies: waiting for the whole completion versus streaming it into
+SMS-sized messages.
+
+The fake model takes --first-token seconds before its first token and --token seconds per
+token after that (about 4 characters each); each Twilio send takes --send seconds. The reply
+is a two-week reminder list of the kind list_reminders produces, once in plain GSM-7 text and
+once with an emoji, which forces UCS-2.
+
+    python -m benchmarks.bench_streaming_sms --days 14 --first-token 0.5 --token 0.02
+"""
+import argparse
+import time
+
+from benchmarks.fakes import FakeOpenAI, FakeTwilio
+from utils.sms_stream import SegmentSplitter, segment_count, stream_reply
+
+
+def reminder_list(days, emoji):
+    lines = ["Here's what's on your plate!" + (" 📚" if emoji else "")]
+    for d in range(1, days + 1):
+        lines.append(f"10/{d:02d}/26")
+        lines.append(f"    09:00: Review lecture notes for CS 330, week {d}")
+        lines.append(f"    17:30: Swim practice at the pool")
+    return "\n".join(lines)
+
+
+def run(text, args, streaming):
+    openai_client = FakeOpenAI(latency=args.first_token, token_latency=args.token, reply=lambda **kwargs: text)
+    twilio_client = FakeTwilio(latency=args.send)
+    sent_at = []
+
+    def send(body):
+        twilio_client.conversations.v1.conversations("CH1").messages.create(body=body)
+        sent_at.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if streaming:
+        stream_reply(openai_client, send, SegmentSplitter(segments=args.segments), model="gpt-4.1", input=[])
+    else:
+        send(openai_client.responses.create(model="gpt-4.1", input=[]).output_text)
+    bodies = [body for _, body in twilio_client.sent]
+    return sent_at[0], sent_at[-1], len(bodies), sum(segment_count(body) for body in bodies), bodies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--first-token", type=float, default=0.5)
+    parser.add_argument("--token", type=float, default=0.02)
+    parser.add_argument("--send", type=float, default=0.15)
+    parser.add_argument("--segments", type=int, default=4, help="Segments per message after the first")
+    args = parser.parse_args()
+
+    for emoji in (False, True):
+        text = reminder_list(args.days, emoji)
+        print(f"{len(text)} characters, {segment_count(text)} segments as one {'UCS-2' if emoji else 'GSM-7'} message")
+        for name, streaming in (("full completion", False), ("streamed", True)):
+            first, last, messages, segments, bodies = run(text, args, streaming)
+            intact = " ".join(" ".join(bodies).split()) == " ".join(text.split())
+            print(f"  {name:<16} first text {first:5.2f}s, last {last:5.2f}s, {messages} messages, {segments} segments{'' if intact else ', TEXT CHANGED'}")
+
+
+if __name__ == "__main__":
+    main()
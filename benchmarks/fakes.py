@@ -0,0 +1,667 @@
+"""
+In-memory stand-ins for the Firestore, OpenAI, Twilio, Gmail and Calendar clients, used by the benchmarks.
+
+Only the parts of each client API that the app calls are implemented. Latency knobs simulate
+network round-trips with time.sleep so thread pools behave as they would in production.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = None if data is None else dict(data)
+        self.exists = data is not None
+        self.update_time = reference._version
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field):
+        value = self._data
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+
+def _set_path(data, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    if type(value).__name__ == "ArrayUnion":
+        current = list(data.get(parts[-1]) or [])
+        value = current + [v for v in value.values if v not in current]
+    elif type(value).__name__ == "ArrayRemove":
+        value = [v for v in data.get(parts[-1]) or [] if v not in value.values]
+    data[parts[-1]] = value
+
+
+def _get_path(data, path):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _deep_merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    @property
+    def _version(self):
+        return self._db._versions.get(self.path)
+
+    def get(self):
+        self._db._sleep(self._db.read_latency)
+        self._db.reads += 1
+        with self._db._lock:
+            return FakeSnapshot(self, self._db._docs.get(self.path))
+
+    def set(self, data, merge=False):
+        self._db._sleep(self._db.write_latency)
+        self._db._apply_set(self, data, merge)
+
+    def update(self, data, option=None):
+        self._db._sleep(self._db.write_latency)
+        self._db._apply_update(self, data, option)
+
+    def create(self, data):
+        from google.api_core.exceptions import AlreadyExists
+
+        self._db._sleep(self._db.write_latency)
+        with self._db._lock:
+            if self.path in self._db._docs:
+                raise AlreadyExists(f"Document already exists: {self.path}")
+            self._db._docs[self.path] = {}
+        self._db._apply_set(self, data, merge=False)
+
+    def delete(self):
+        self._db._sleep(self._db.write_latency)
+        with self._db._lock:
+            self._db._docs.pop(self.path, None)
+            self._db._versions.pop(self.path, None)
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+
+class FakeQuery:
+    OPS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+        "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    }
+
+    def __init__(self, collection, filters=(), order=(), limit=None, start_after=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = list(order)
+        self._limit = limit
+        self._start_after = start_after
+
+    def _copy(self, **changes):
+        args = dict(filters=self._filters, order=self._order, limit=self._limit, start_after=self._start_after)
+        args.update(changes)
+        return FakeQuery(self._collection, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(order=self._order + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start_after=document_fields_or_snapshot)
+
+    def _sort_key(self, field_path, snapshot):
+        if field_path == "__name__":
+            return snapshot.id
+        return _get_path(snapshot._data, field_path)
+
+    def stream(self):
+        db = self._collection._db
+        db._sleep(db.read_latency)
+        prefix = self._collection.path + "/"
+        with db._lock:
+            snapshots = [
+                FakeSnapshot(FakeDocumentReference(db, self._collection.path, path[len(prefix):]), data)
+                for path, data in db._docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+        for field_path, op_string, value in self._filters:
+            snapshots = [s for s in snapshots if self.OPS[op_string](_get_path(s._data, field_path), value)]
+        order = self._order or [("__name__", "ASCENDING")]
+        for field_path, direction in reversed(order):
+            snapshots.sort(key=lambda s: (self._sort_key(field_path, s) is None, self._sort_key(field_path, s)), reverse=direction == "DESCENDING")
+        if self._start_after is not None:
+            cursor = self._start_after
+            if isinstance(cursor, FakeSnapshot):
+                keys = [(cursor.id if f == "__name__" else _get_path(cursor._data, f)) for f, _ in order]
+            elif isinstance(cursor, dict):
+                keys = [cursor.get(f) for f, _ in order]
+            else:
+                keys = [cursor]
+            snapshots = [s for s in snapshots if [self._sort_key(f, s) for f, _ in order] > keys]
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        db.reads += max(1, len(snapshots))
+        return iter(snapshots)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    _ids = itertools.count()
+
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = f"auto{next(self._ids):012d}"
+        return FakeDocumentReference(self._db, self.path, doc_id)
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(("set", reference, data, merge))
+
+    def update(self, reference, data):
+        self._writes.append(("update", reference, data, None))
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, None))
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("A write batch cannot contain more than 500 writes")
+        self._db._sleep(self._db.write_latency)
+        self._db.commits += 1
+        for kind, reference, data, merge in self._writes:
+            if kind == "set":
+                self._db._apply_set(reference, data, merge)
+            elif kind == "update":
+                self._db._apply_update(reference, data, None)
+            else:
+                with self._db._lock:
+                    self._db._docs.pop(reference.path, None)
+        self._writes = []
+
+
+class FakePrecondition:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class FakeFirestore:
+    """ Dict-backed Firestore client. Counts reads, writes and commits """
+
+    def __init__(self, read_latency=0.0, write_latency=0.0):
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self._docs = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._clock = itertools.count(1)
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    @staticmethod
+    def _sleep(seconds):
+        if seconds:
+            time.sleep(seconds)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def document(self, path):
+        collection, doc_id = path.rsplit("/", 1)
+        return FakeDocumentReference(self, collection, doc_id)
+
+    def get_all(self, references):
+        self._sleep(self.read_latency)
+        with self._lock:
+            snapshots = [FakeSnapshot(ref, self._docs.get(ref.path)) for ref in references]
+        self.reads += len(snapshots)
+        return iter(snapshots)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def write_option(self, last_update_time=None, **kwargs):
+        return FakePrecondition(last_update_time)
+
+    def _apply_set(self, reference, data, merge):
+        with self._lock:
+            if merge and reference.path in self._docs:
+                _deep_merge(self._docs[reference.path], data)
+            else:
+                self._docs[reference.path] = {}
+                _deep_merge(self._docs[reference.path], data)
+            self._versions[reference.path] = next(self._clock)
+            self.writes += 1
+
+    def _apply_update(self, reference, data, option):
+        from google.api_core.exceptions import FailedPrecondition, NotFound
+
+        with self._lock:
+            if reference.path not in self._docs:
+                raise NotFound(f"No document to update: {reference.path}")
+            if option is not None and self._versions.get(reference.path) != option.last_update_time:
+                raise FailedPrecondition(f"Document {reference.path} was modified")
+            for path, value in data.items():
+                _set_path(self._docs[reference.path], path, value)
+            self._versions[reference.path] = next(self._clock)
+            self.writes += 1
+
+
+class FakeOpenAI:
+    """
+    Responses API stand-in. `reply` maps the request kwargs to the output text.
+    With stream=True the text arrives as output_text.delta events of `token_chars` characters,
+    the first after `latency` and each next after `token_latency`, then response.completed.
+    Non-streamed calls take as long as the whole stream would.
+    """
+
+    def __init__(self, latency=0.0, reply=None, token_latency=0.0, token_chars=4):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.token_chars = token_chars
+        self.reply = reply or (lambda **kwargs: f"Reminder: {kwargs.get('input')}")
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self.responses = SimpleNamespace(create=self._create)
+
+    def _create(self, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        text = self.reply(**kwargs)
+        response = SimpleNamespace(output_text=text, output=[])
+        if stream:
+            return self._stream(text, response)
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.latency or self.token_latency:
+                time.sleep(self.latency + self.token_latency * -(-len(text) // self.token_chars))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return response
+
+    def _stream(self, text, response):
+        if self.latency:
+            time.sleep(self.latency)
+        for i in range(0, len(text), self.token_chars):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield SimpleNamespace(type="response.output_text.delta", delta=text[i:i + self.token_chars])
+        yield SimpleNamespace(type="response.completed", response=response)
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """ AsyncOpenAI stand-in: responses.create is a coroutine that waits with asyncio.sleep """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.responses = SimpleNamespace(create=self._create_async)
+
+    async def _create_async(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            text = self.reply(**kwargs)
+            await asyncio.sleep(self.latency + self.token_latency * -(-len(text) // self.token_chars))
+            return SimpleNamespace(output_text=text, output=[])
+        finally:
+            self.in_flight -= 1
+
+
+class FakeTwilio:
+    """ Conversations API stand-in. Records every message sent and lists them back """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = []
+        self.history = {}  # conversation sid -> list of message records, oldest first
+        self._lock = threading.Lock()
+        self.conversations = SimpleNamespace(v1=SimpleNamespace(conversations=self._conversation))
+
+    def add_message(self, sid, body, author="user"):
+        with self._lock:
+            records = self.history.setdefault(sid, [])
+            records.append(SimpleNamespace(sid=f"IM{sid}{len(records)}", index=len(records), body=body, author=author))
+
+    def _conversation(self, sid):
+        def create(body=None, **kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                self.sent.append((sid, body))
+            self.add_message(sid, body, author="system")
+            return SimpleNamespace(sid=f"IM{len(self.sent)}", body=body)
+
+        def list_messages(order="asc", limit=None, **kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                records = list(self.history.get(sid, []))
+            if order == "desc":
+                records.reverse()
+            return records[:limit] if limit else records
+        async def create_async(body=None, **kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            with self._lock:
+                self.sent.append((sid, body))
+            self.add_message(sid, body, author="system")
+            return SimpleNamespace(sid=f"IM{len(self.sent)}", body=body)
+        async def list_async(order="asc", limit=None, **kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            with self._lock:
+                records = list(self.history.get(sid, []))
+            if order == "desc":
+                records.reverse()
+            return records[:limit] if limit else records
+        return SimpleNamespace(messages=SimpleNamespace(create=create, create_async=create_async, list=list_messages, list_async=list_async))
+
+
+class FakeRequest:
+    def __init__(self, owner, fn):
+        self._owner = owner
+        self._fn = fn
+
+    def execute(self):
+        self._owner._round_trip()
+        return self._owner._measure(self._fn())
+
+
+class FakeBatch:
+    def __init__(self, owner, callback=None):
+        self._owner = owner
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request, callback or self._callback, request_id or str(len(self._requests) + 1)))
+
+    def execute(self):
+        self._owner._round_trip()
+        for request, callback, request_id in self._requests:
+            try:
+                response, exception = self._owner._measure(request._fn()), None
+            except Exception as e:
+                response, exception = None, e
+            if callback is not None:
+                callback(request_id, response, exception)
+
+
+class FakeGmail:
+    """
+    Gmail API stand-in for one mailbox. Counts HTTP round-trips and response bytes.
+    Messages are added with add_message and listed newest first. Every added message is a
+    history record; expire_history drops old records so stale history IDs get a 404.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = {}  # id -> message resource
+        self.drafts = []
+        self.history = []  # (history id, message id)
+        self.history_id = 1000
+        self.oldest_history_id = 1000
+        self.round_trips = 0
+        self.bytes = 0
+        self.failing = set()  # message IDs whose get fails with a 503
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.round_trips += 1
+
+    def _measure(self, response):
+        with self._lock:
+            self.bytes += len(json.dumps(response))
+        return response
+
+    def add_message(self, subject, body, sender="friend@example.com", html_body=None, labels=("INBOX", "UNREAD")):
+        msg_id = f"m{next(self._ids):06d}"
+        encode = lambda text: base64.urlsafe_b64encode(text.encode()).decode()
+        parts = [{"mimeType": "text/plain", "body": {"data": encode(body), "size": len(body)}}]
+        if html_body is not None:
+            parts.append({"mimeType": "text/html", "body": {"data": encode(html_body), "size": len(html_body)}})
+        headers = [{"name": "Subject", "value": subject}, {"name": "From", "value": sender},
+                   {"name": "Message-ID", "value": f"<{msg_id}@example.com>"}, {"name": "To", "value": "user@example.com"}]
+        with self._lock:
+            self.history_id += 1
+            self.history.append((self.history_id, msg_id))
+        self.messages[msg_id] = {
+            "id": msg_id,
+            "threadId": f"t{msg_id}",
+            "labelIds": list(labels),
+            "internalDate": str(int(time.time() * 1000)),
+            "snippet": body[:200],
+            "payload": {"mimeType": "multipart/alternative", "headers": headers,
+                        "parts": [{"mimeType": "multipart/alternative", "parts": parts}]},
+        }
+        return msg_id
+
+    def _get(self, id, format="full", metadataHeaders=None, **kwargs):
+        from googleapiclient.errors import HttpError
+        import httplib2
+
+        if id in self.failing:
+            raise HttpError(httplib2.Response({"status": 503}), b"Backend Error")
+        if id not in self.messages:
+            raise HttpError(httplib2.Response({"status": 404}), b"Requested entity was not found.")
+        message = self.messages[id]
+        if format == "metadata":
+            wanted = {h.lower() for h in metadataHeaders or []}
+            headers = [h for h in message["payload"]["headers"] if not wanted or h["name"].lower() in wanted]
+            return {**{k: v for k, v in message.items() if k != "payload"}, "payload": {"headers": headers}}
+        return message
+
+    def expire_history(self):
+        """ Forget all history so far, as Gmail does after about a week """
+        with self._lock:
+            self.history = []
+            self.oldest_history_id = self.history_id
+
+    def _list(self, labelIds=None, maxResults=100, q="", **kwargs):
+        after = re.search(r"after:(\d+)", q or "")
+        ids = [m["id"] for m in reversed(list(self.messages.values()))
+               if all(l in m["labelIds"] for l in labelIds or [])
+               and ("is:unread" not in (q or "") or "UNREAD" in m["labelIds"])
+               and (after is None or int(m["internalDate"]) // 1000 > int(after.group(1)))]
+        return {"messages": [{"id": i, "threadId": self.messages[i]["threadId"]} for i in ids[:maxResults]]}
+
+    def _history(self, startHistoryId, labelId=None, pageToken=None, maxResults=100, **kwargs):
+        from googleapiclient.errors import HttpError
+        import httplib2
+
+        start = int(startHistoryId)
+        if start < self.oldest_history_id:
+            raise HttpError(httplib2.Response({"status": 404}), b"Requested entity was not found.")
+        with self._lock:
+            records = [(h, m) for h, m in self.history if h > start]
+        offset = int(pageToken or 0)
+        page = records[offset:offset + maxResults]
+        history = [{"id": str(h), "messagesAdded": [{"message": {"id": m, "threadId": self.messages[m]["threadId"], "labelIds": list(self.messages[m]["labelIds"])}}]}
+                   for h, m in page if labelId is None or labelId in self.messages[m]["labelIds"]]
+        response = {"history": history, "historyId": str(self.history_id)}
+        if offset + maxResults < len(records):
+            response["nextPageToken"] = str(offset + maxResults)
+        return response
+
+    def users(self):
+        history = SimpleNamespace(list=lambda userId="me", **kwargs: FakeRequest(self, lambda: self._history(**kwargs)))
+        messages = SimpleNamespace(
+            list=lambda userId="me", **kwargs: FakeRequest(self, lambda: self._list(**kwargs)),
+            get=lambda userId="me", **kwargs: FakeRequest(self, lambda: self._get(**kwargs)),
+        )
+        drafts = SimpleNamespace(create=lambda userId="me", body=None: FakeRequest(self, lambda: self._create_draft(body)))
+        return SimpleNamespace(
+            messages=lambda: messages,
+            drafts=lambda: drafts,
+            history=lambda: history,
+            getProfile=lambda userId="me": FakeRequest(self, lambda: {"historyId": str(self.history_id)}),
+        )
+
+    def _create_draft(self, body):
+        self.drafts.append(body)
+        return {"id": f"d{len(self.drafts)}", "message": body["message"]}
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+
+class FakeCalendar:
+    """
+    Calendar API stand-in for one primary calendar, supporting sync tokens.
+    Counts HTTP round-trips; expire_sync_tokens makes old tokens fail with 410.
+    """
+
+    def __init__(self, latency=0.0, timezone="US/Eastern"):
+        self.latency = latency
+        self.timezone = timezone
+        self.stored = {}  # id -> event resource
+        self.changes = []  # event IDs in change order; a sync token is an index into it
+        self.oldest_token = 0
+        self.round_trips = 0
+        self.items_sent = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.round_trips += 1
+
+    def _measure(self, response):
+        with self._lock:
+            self.items_sent += len(response.get("items", [])) if "items" in response else 1
+        return response
+
+    def add_event(self, start, end, summary="event", **fields):
+        """ Add an event directly, as if made in the Calendar app """
+        event_id = fields.pop("id", None) or f"ev{next(self._ids):06d}"
+        event = {"id": event_id, "status": "confirmed", "summary": summary,
+                 "start": {"dateTime": start}, "end": {"dateTime": end}, **fields}
+        with self._lock:
+            self.stored[event_id] = event
+            self.changes.append(event_id)
+        return dict(event)
+
+    def delete_event(self, event_id):
+        with self._lock:
+            self.stored[event_id]["status"] = "cancelled"
+            self.changes.append(event_id)
+
+    def expire_sync_tokens(self):
+        with self._lock:
+            self.oldest_token = len(self.changes)
+
+    def _list(self, syncToken=None, pageToken=None, maxResults=250, timeMin=None, timeMax=None, **kwargs):
+        from googleapiclient.errors import HttpError
+        import httplib2
+
+        with self._lock:
+            if syncToken is not None:
+                if int(syncToken) < self.oldest_token:
+                    raise HttpError(httplib2.Response({"status": 410}), b"Sync token is no longer valid")
+                items = [dict(self.stored[i]) for i in dict.fromkeys(self.changes[int(syncToken):])]
+            else:
+                items = [dict(e) for e in self.stored.values() if e["status"] != "cancelled"
+                         and (timeMin is None or e["end"]["dateTime"] > timeMin)
+                         and (timeMax is None or e["start"]["dateTime"] < timeMax)]
+                items.sort(key=lambda e: e["start"]["dateTime"])
+            token = str(len(self.changes))
+        offset = int(pageToken or 0)
+        response = {"items": items[offset:offset + maxResults], "timeZone": self.timezone}
+        if offset + maxResults < len(items):
+            response["nextPageToken"] = str(offset + maxResults)
+        else:
+            response["nextSyncToken"] = token
+        return response
+
+    def _insert(self, calendarId="primary", body=None, **kwargs):
+        from googleapiclient.errors import HttpError
+        import httplib2
+
+        if body.get("id") in self.stored: # IDs stay taken after deletion, as in the real API
+            raise HttpError(httplib2.Response({"status": 409}), b"The requested identifier already exists.")
+        return self.add_event(body["start"]["dateTime"], body["end"]["dateTime"], body.get("summary", ""),
+                              **{k: v for k, v in body.items() if k not in ("start", "end", "summary")})
+
+    def _get(self, calendarId="primary", eventId=None, **kwargs):
+        from googleapiclient.errors import HttpError
+        import httplib2
+
+        if eventId not in self.stored:
+            raise HttpError(httplib2.Response({"status": 404}), b"Not Found")
+        return dict(self.stored[eventId])
+
+    def _update(self, calendarId="primary", eventId=None, body=None, **kwargs):
+        event = {**self._get(eventId=eventId), **body, "id": eventId}
+        with self._lock:
+            self.stored[eventId] = event
+            self.changes.append(eventId)
+        return dict(event)
+
+    def events(self):
+        return SimpleNamespace(
+            list=lambda calendarId="primary", **kwargs: FakeRequest(self, lambda: self._list(**kwargs)),
+            insert=lambda **kwargs: FakeRequest(self, lambda: self._insert(**kwargs)),
+            get=lambda **kwargs: FakeRequest(self, lambda: self._get(**kwargs)),
+            update=lambda **kwargs: FakeRequest(self, lambda: self._update(**kwargs)),
+        )
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
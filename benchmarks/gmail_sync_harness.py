@@ -0,0 +1,104 @@
+"""
+Run Gmail checks through GmailSync.check against a fake mailbox and check that no email is lost
+when part of a check fails.
+
+    fetch failure  - one message's get fails with a 503 during a check. It must stay pending,
+                     not be marked processed, and be handled on the next check
+    prefilter      - a message the prefilter rejects is marked processed and never handled
+    model failure  - the classifier's model call fails during a check. The message must stay
+                     pending with no cached verdict, and be classified on the next check
+
+Exits non-zero if a scenario fails.
+
+    python -m benchmarks.gmail_sync_harness
+"""
+import sys
+
+from benchmarks.fakes import FakeFirestore, FakeGmail
+from utils.email_classifier import EmailClassifier
+from utils.gmail_sync import GmailSync
+from utils.user_cache import UserCache
+
+USER = "+15550000001"
+
+
+def setup():
+    db = FakeFirestore()
+    db.collection("Users").document(USER).set({"gmail_sync": {}})
+    users = UserCache(db, listen=False)
+    gmail = FakeGmail()
+    sync = GmailSync(users)
+    sync.commit(USER, sync.sync(gmail, None)[1], []) # First sync: start from the mailbox's current history
+    return users, gmail, sync
+
+
+def state(users):
+    return users.get(USER)["gmail_sync"]
+
+
+def check(name, ok, detail):
+    print(f"  {'ok  ' if ok else 'FAIL'} {name}: {detail}")
+    return ok
+
+
+def fetch_failure() -> bool:
+    users, gmail, sync = setup()
+    first = gmail.add_message("Coffee next week?", "Are you free Tuesday at 3pm for coffee?")
+    second = gmail.add_message("Project sync", "Can we schedule a call tomorrow at 10am?")
+    handled = []
+    gmail.failing.add(second)
+    sync.check(USER, gmail, state(users), lambda email: handled.append(email[0]))
+    results = [
+        check("handled the message that was fetched", handled == [first], handled),
+        check("failed message left pending", second in state(users)["pending"] and second not in state(users)["processed"], state(users)),
+    ]
+    gmail.failing.clear()
+    sync.check(USER, gmail, state(users), lambda email: handled.append(email[0]))
+    results.append(check("failed message handled on the next check", handled == [first, second] and not state(users)["pending"], handled))
+    return all(results)
+
+
+def prefilter() -> bool:
+    users, gmail, sync = setup()
+    receipt = gmail.add_message("Your receipt", "Thanks for your order. Your package has shipped.")
+    handled = []
+    sync.check(USER, gmail, state(users), lambda email: handled.append(email[0]))
+    return check("rejected message marked processed", not handled and receipt in state(users)["processed"] and not state(users)["pending"], state(users))
+
+
+def model_failure() -> bool:
+    users, gmail, sync = setup()
+    invite = gmail.add_message("Coffee next week?", "Are you free Tuesday at 3pm for coffee?")
+    calls = []
+
+    def llm(subject, body, timezone=None):
+        calls.append(subject)
+        if len(calls) == 1:
+            raise RuntimeError("Email classification call failed")
+        return {"scheduling": True, "event": "Coffee"}
+
+    classifier = EmailClassifier(llm)
+    scheduled = []
+
+    def handle(email):
+        msg_id, body, sender, subject, message_id, thread_id = email
+        if classifier.classify(subject, body, sender, message_id).scheduling:
+            scheduled.append(msg_id)
+
+    sync.check(USER, gmail, state(users), handle)
+    results = [check("message left pending after the failed call", invite in state(users)["pending"] and invite not in state(users)["processed"] and not classifier._verdicts, state(users))]
+    sync.check(USER, gmail, state(users), handle)
+    results.append(check("classified and handled on the next check", scheduled == [invite] and len(calls) == 2 and invite in state(users)["processed"], f"calls={len(calls)} scheduled={scheduled}"))
+    return all(results)
+
+
+def main():
+    passed = True
+    for name, scenario in (("fetch failure", fetch_failure), ("prefilter", prefilter), ("model failure", model_failure)):
+        print(f"{name}:")
+        passed = scenario() and passed
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
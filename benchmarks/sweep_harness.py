@@ -0,0 +1,147 @@
+"""
+Run several email sweep workers against one database and check that every user is processed.
+
+Workers crash at random mid-shard (without releasing their lease) and are restarted under a
+new worker ID, so abandoned shards have to be picked up from their cursor once the lease
+runs out. Reports coverage, repeats caused by crashes and wall time per round.
+
+With FIRESTORE_EMULATOR_HOST set and --emulator, each worker is a separate process using a
+real Firestore client against the emulator. Otherwise the workers are threads sharing the
+in-memory FakeFirestore, which can't be shared across processes.
+
+    python -m benchmarks.sweep_harness --users 2000 --workers 4 --crash-rate 0.002
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.sweep_harness --emulator
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from utils.email_sweep import EmailSweep
+
+
+class WorkerCrash(BaseException):
+    """ Escapes the sweep's per-user error handling, like the instance dying """
+
+
+def seed_users(db, count):
+    batch = db.batch()
+    for i in range(count):
+        batch.set(db.collection("Users").document(f"+1555{i:07d}"), {
+            "profile": {"googleConnected": True, "preferences": {"checkMail": i % 10 != 0}},
+        })
+        if i % 500 == 499:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    return [f"+1555{i:07d}" for i in range(count) if i % 10 != 0]
+
+
+def make_process(report, latency, crash_rate, rng):
+    def process(user):
+        if rng.random() < crash_rate:
+            raise WorkerCrash()
+        time.sleep(latency)
+        report(user.id)
+    return process
+
+
+def worker_loop(db, report, args, seed):
+    """
+    Run sweep workers until every shard of the round is done, like repeated /check_emails calls.
+    A crashed worker is restarted under a new worker ID.
+    """
+    rng = random.Random(seed)
+    generation = 0
+    current = None
+    while True:
+        generation += 1
+        sweep = EmailSweep(db, make_process(report, args.latency, args.crash_rate, rng), lease_seconds=args.lease,
+                           page_size=args.page_size, workers=args.threads, worker_id=f"worker{seed}-{generation}")
+        if current is not None and sweep.progress(current)["done"] == sweep.shards:
+            return
+        try:
+            current = sweep.run()["round"]
+        except WorkerCrash:
+            pass
+        time.sleep(args.lease / 4) # Wait for abandoned leases to run out
+
+
+def process_main(args, seed, queue):
+    from google.cloud import firestore
+
+    db = firestore.Client(project=args.project)
+    worker_loop(db, queue.put, args, seed)
+
+
+def run_round(args, db, eligible):
+    seen = Counter()
+    lock = threading.Lock()
+
+    def report(user_id):
+        with lock:
+            seen[user_id] += 1
+
+    start = time.perf_counter()
+    if args.emulator:
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=process_main, args=(args, seed, queue)) for seed in range(args.workers)]
+        for p in processes:
+            p.start()
+        while any(p.is_alive() for p in processes) or not queue.empty():
+            try:
+                report(queue.get(timeout=0.2))
+            except Exception:
+                pass
+    else:
+        threads = [threading.Thread(target=worker_loop, args=(db, report, args, seed)) for seed in range(args.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - start
+
+    missing = [user_id for user_id in eligible if user_id not in seen]
+    repeats = sum(count - 1 for count in seen.values())
+    print(f"  {len(seen)}/{len(eligible)} users processed, {repeats} repeated after crashes, {len(missing)} missed, {elapsed:.2f}s")
+    return not missing
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent sweep workers (instances)")
+    parser.add_argument("--threads", type=int, default=10, help="Threads per worker")
+    parser.add_argument("--page-size", type=int, default=25)
+    parser.add_argument("--lease", type=float, default=0.5, help="Lease length in seconds")
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds to process one user")
+    parser.add_argument("--crash-rate", type=float, default=0.002, help="Chance a worker dies on each user")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--emulator", action="store_true", help="Use worker processes against the Firestore emulator")
+    parser.add_argument("--project", default="demo-marley")
+    args = parser.parse_args()
+
+    if args.emulator:
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            parser.error("--emulator needs FIRESTORE_EMULATOR_HOST")
+        from google.cloud import firestore
+        db = firestore.Client(project=args.project)
+    else:
+        from benchmarks.fakes import FakeFirestore
+        db = FakeFirestore()
+
+    eligible = seed_users(db, args.users)
+    print(f"{len(eligible)} users to check, {args.workers} workers, crash rate {args.crash_rate} per user")
+    ok = True
+    for i in range(args.rounds):
+        print(f"Round {i + 1}:")
+        ok = run_round(args, db, eligible) and ok
+    if not ok:
+        raise SystemExit("Some users were not processed")
+
+
+if __name__ == "__main__":
+    main()
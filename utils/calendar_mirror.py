@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pytz
+from googleapiclient.errors import HttpError
+
+from .google_services import get_service_pool
+from .intervals import to_epoch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# A mirror older than this is delta-synced before it answers
+SYNC_INTERVAL = 60
+# Users not looked up for this long are dropped
+IDLE_SECONDS = 6 * 3600
+# Full syncs start this far in the past
+HISTORY = timedelta(days=1)
+# ... and end this far ahead; delta items starting later are dropped
+HORIZON = timedelta(days=int(os.getenv("CALENDAR_HORIZON_DAYS", 90)))
+# A full sync is redone once the horizon has fallen this far behind now + HORIZON
+HORIZON_SLACK = timedelta(days=1)
+
+
+class UserCalendar:
+    """
+    One user's primary calendar, kept in step with Calendar API sync tokens.
+
+    Events are stored by ID and indexed lazily: starts sorted into a NumPy array, plus the
+    longest event duration, so the events overlapping [lo, hi) are found by searchsorted over
+    starts in [lo - longest, hi) rather than a scan of the whole calendar.
+    """
+
+    def __init__(self):
+        self.events = {}  # event ID -> (start epoch, end epoch, start, end, summary, busy)
+        self.sync_token = None
+        self.until = None  # epoch end of the mirrored horizon; None before the first full sync
+        self.synced = None  # time.monotonic() of the last sync; None forces a sync
+        self.used = time.monotonic()
+        self.timezone = "UTC"
+        self.lock = threading.Lock()
+        self._index = None  # (starts, ends, ids, longest)
+
+    def apply(self, event: dict):
+        """ Add, replace or remove one event resource """
+        self._index = None
+        if event.get("status") == "cancelled":
+            self.events.pop(event["id"], None)
+            return
+        if "start" not in event or "end" not in event:
+            return
+        tz = pytz.timezone(event["start"].get("timeZone") or self.timezone)
+        start = event["start"].get("dateTime", event["start"].get("date"))
+        end = event["end"].get("dateTime", event["end"].get("date"))
+        busy = event.get("transparency") != "transparent"
+        start_epoch = to_epoch(start, tz)
+        if self.until is not None and start_epoch >= self.until:
+            # Beyond the horizon: sync tokens report changes anywhere in the calendar
+            self.events.pop(event["id"], None)
+            return
+        self.events[event["id"]] = (start_epoch, to_epoch(end, tz), start, end, event.get("summary", ""), busy)
+
+    def _build_index(self):
+        if self._index is None:
+            ids = list(self.events)
+            starts = np.fromiter((self.events[i][0] for i in ids), dtype=np.int64, count=len(ids))
+            ends = np.fromiter((self.events[i][1] for i in ids), dtype=np.int64, count=len(ids))
+            order = np.argsort(starts, kind="stable")
+            longest = int((ends - starts).max()) if len(ids) else 0
+            self._index = (starts[order], ends[order], [ids[i] for i in order], longest)
+        return self._index
+
+    def between(self, lo: int, hi: int, busy_only: bool = False) -> List[Tuple[str, str, str]]:
+        """ Events overlapping [lo, hi) as (start, end, summary), in start order """
+        starts, ends, ids, longest = self._build_index()
+        first = np.searchsorted(starts, lo - longest, side="left")
+        last = np.searchsorted(starts, hi, side="left")
+        hits = np.flatnonzero(ends[first:last] > lo) + first
+        result = []
+        for i in hits:
+            event = self.events[ids[i]]
+            if not busy_only or event[5]:
+                result.append(event[2:5])
+        return result
+
+    def upcoming(self, now: int, count: int) -> List[Tuple[str, str, str]]:
+        """ The next `count` events that haven't ended, in start order """
+        starts, ends, ids, longest = self._build_index()
+        first = np.searchsorted(starts, now - longest, side="left")
+        result = []
+        for i in range(first, len(ids)):
+            if ends[i] > now:
+                result.append(self.events[ids[i]][2:5])
+                if len(result) == count:
+                    break
+        return result
+
+    def prune(self, before: int):
+        """ Forget events that ended before `before` """
+        stale = [event_id for event_id, event in self.events.items() if event[1] < before]
+        for event_id in stale:
+            del self.events[event_id]
+        if stale:
+            self._index = None
+
+
+class CalendarMirror:
+    """
+    Process-wide mirror of users' Google Calendars.
+
+    The first lookup for a user does a full events().list from a day ago to `horizon` ahead and
+    keeps the nextSyncToken; later lookups older than `sync_interval` fetch only the changes since
+    that token (a 410 means the token expired and triggers a full sync). Changes starting past the
+    horizon are dropped, and a full sync is redone once a day as the horizon slides, so recurring
+    events are only ever expanded over a bounded window. Lookups reaching past the horizon return
+    None for the caller to ask the API directly. Events we insert through add_to_calendar are
+    applied right away. Users idle for `idle_seconds` or beyond
+    `max_users` (least recently used first) are evicted.
+    """
+
+    def __init__(self, sync_interval: float = SYNC_INTERVAL, idle_seconds: float = IDLE_SECONDS, max_users: int = 2000, service: Optional[Callable] = None, horizon: timedelta = HORIZON):
+        self.service = service or (lambda creds, owner: get_service_pool().service(creds, "calendar", "v3", owner))
+        self.sync_interval = sync_interval
+        self.horizon = horizon
+        self.idle_seconds = idle_seconds
+        self.max_users = max_users
+        self._users = OrderedDict()  # owner -> UserCalendar
+        self._lock = threading.Lock()
+        self.stats = {"full_syncs": 0, "delta_syncs": 0, "lookups": 0, "evictions": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _calendar(self, owner: str) -> UserCalendar:
+        now = time.monotonic()
+        with self._lock:
+            calendar = self._users.get(owner)
+            if calendar is None:
+                calendar = self._users[owner] = UserCalendar()
+            calendar.used = now
+            self._users.move_to_end(owner)
+            # Least recently used first, so idle users are at the front
+            while self._users and (len(self._users) > self.max_users or next(iter(self._users.values())).used < now - self.idle_seconds):
+                self._users.popitem(last=False)
+                self.stats["evictions"] += 1
+            return calendar
+
+    def _list(self, service, calendar: UserCalendar, **kwargs):
+        page_token = None
+        while True:
+            result = service.events().list(calendarId="primary", singleEvents=True, maxResults=2500, pageToken=page_token, **kwargs).execute()
+            calendar.timezone = result.get("timeZone", calendar.timezone)
+            for event in result.get("items", []):
+                calendar.apply(event)
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return result.get("nextSyncToken")
+
+    def _sync(self, service, calendar: UserCalendar):
+        # Caller holds calendar.lock
+        if calendar.sync_token:
+            try:
+                calendar.sync_token = self._list(service, calendar, syncToken=calendar.sync_token)
+                calendar.synced = time.monotonic()
+                self._count("delta_syncs")
+                return
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                logger.info("Calendar sync token expired, doing a full sync")
+        calendar.events.clear()
+        calendar._index = None
+        now = datetime.now(pytz.UTC)
+        calendar.until = int((now + self.horizon).timestamp())
+        calendar.sync_token = self._list(service, calendar, timeMin=(now - HISTORY).isoformat(), timeMax=(now + self.horizon).isoformat())
+        calendar.synced = time.monotonic()
+        self._count("full_syncs")
+
+    def _fresh(self, creds: dict, owner: str) -> UserCalendar:
+        calendar = self._calendar(owner)
+        with calendar.lock:
+            if calendar.until is not None and calendar.until < (datetime.now(pytz.UTC) + self.horizon - HORIZON_SLACK).timestamp():
+                calendar.sync_token = None  # Slide the horizon forward
+                calendar.synced = None
+            if calendar.synced is None or time.monotonic() - calendar.synced >= self.sync_interval:
+                self._sync(self.service(creds, owner), calendar)
+                calendar.prune(int((datetime.now(pytz.UTC) - HISTORY).timestamp()))
+        self._count("lookups")
+        return calendar
+
+    def upcoming(self, creds: dict, owner: str, count: int) -> List[Tuple[str, str, str]]:
+        """ The next `count` events within the horizon """
+        calendar = self._fresh(creds, owner)
+        with calendar.lock:
+            return calendar.upcoming(int(time.time()), count)
+
+    def between(self, creds: dict, owner: str, time_min: str, time_max: str, busy_only: bool = True) -> Optional[List[Tuple[str, str, str]]]:
+        """ Events overlapping [time_min, time_max), or None when the range ends past the horizon """
+        calendar = self._fresh(creds, owner)
+        hi = to_epoch(time_max, pytz.UTC)
+        with calendar.lock:
+            if hi > calendar.until:
+                return None
+            return calendar.between(to_epoch(time_min, pytz.UTC), hi, busy_only)
+
+    def record(self, owner: Optional[str], event: dict):
+        """ Apply an event we just inserted. Recurring events are left to the next sync, which expands them """
+        if owner is None:
+            return
+        with self._lock:
+            calendar = self._users.get(owner)
+        if calendar is None:
+            return
+        with calendar.lock:
+            if event.get("recurrence"):
+                calendar.synced = None
+            else:
+                calendar.apply(event)
+
+    def evict(self, owner: str):
+        with self._lock:
+            self._users.pop(owner, None)
+
+
+_mirror = None
+
+def get_calendar_mirror() -> CalendarMirror:
+    """Initialize and return the process-wide calendar mirror"""
+    global _mirror
+    if _mirror is None:
+        _mirror = CalendarMirror(sync_interval=float(os.getenv("CALENDAR_SYNC_INTERVAL", SYNC_INTERVAL)))
+    return _mirror
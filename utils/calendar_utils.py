@@ -1,38 +1,34 @@
 from datetime import datetime, timedelta
 import pytz
+import hashlib
+import json
 import logging
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
 
 from . import time_utils
 
-# These imports are potentially heavy, so we'll import them only when needed
-# to avoid slow startup times and circular import issues
-_credentials_class = None
-_build_function = None
+from .google_services import get_service_pool
+from .calendar_mirror import get_calendar_mirror
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
-def _get_google_deps():
-    """Lazy import Google API dependencies when needed"""
-    global _credentials_class, _build_function
-    if _credentials_class is None:
-        from google.oauth2.credentials import Credentials
-        from googleapiclient.discovery import build
-        _credentials_class = Credentials
-        _build_function = build
-    return _credentials_class, _build_function
-
-def list_calendar(creds, day=7) -> List[Tuple[str, str, str]]:
+# Calendar accepts at most 50 calls per batch HTTP request
+BATCH_LIMIT = 50
+
+def list_calendar(creds, day=7, owner=None) -> List[Tuple[str, str, str]]:
     """List upcoming calendar events"""
     try:
-        # Get dependencies
-        Credentials, build = _get_google_deps()
-        
+        if owner is not None: # Answer from the synced mirror
+            schedule = get_calendar_mirror().upcoming(creds, owner, day)
+            logger.info("Found %d events", len(schedule))
+            return schedule
+
         now = datetime.now(pytz.UTC).isoformat() 
-        credential = Credentials(**creds) # '**' allows dictionary keys to become argument names, and values to be parameter values
-        service = build("calendar", "v3", credentials=credential) # Build service to interact with Gcal API
+        service = get_service_pool().service(creds, "calendar", "v3", owner) # Pooled service to interact with Gcal API
         
         events_result = (
             service.events().list(
@@ -55,59 +51,154 @@ def list_calendar(creds, day=7) -> List[Tuple[str, str, str]]:
         logger.exception("Failed to list calendar events")
         return []
 
-def add_to_calendar(creds, _event, date, _start, timezone, duration=1, _end=None, frequency=None, byday=None, interval=None) -> int:
-    """Add an event to Google Calendar"""
+def list_busy(creds, time_min: str, time_max: str, owner=None) -> List[Tuple[str, str, str]]:
+    """List every event that blocks time between time_min and time_max (UTC ISO strings)"""
     try:
-        # Get dependencies
-        Credentials, build = _get_google_deps()
-        
-        credential = Credentials(**creds)
-        service = build("calendar", "v3", credentials=credential)
+        schedule = get_calendar_mirror().between(creds, owner, time_min, time_max) if owner is not None else None
+        if schedule is not None: # Answered from the synced mirror; None when the range ends past its horizon
+            logger.info("Found %d busy events", len(schedule))
+            return schedule
+
+        service = get_service_pool().service(creds, "calendar", "v3", owner)
+        schedule, page_token = [], None
+        while True:
+            events_result = (
+                service.events().list(
+                    calendarId="primary",
+                    timeMin=time_min,
+                    timeMax=time_max,
+                    maxResults=2500,
+                    singleEvents=True,
+                    orderBy="startTime",
+                    pageToken=page_token,
+                ).execute()
+            )
+            for event in events_result.get("items", []):
+                if event.get("transparency") == "transparent" or event.get("status") == "cancelled": # Marked free
+                    continue
+                start = event["start"].get("dateTime", event["start"].get("date"))
+                end = event["end"].get("dateTime", event["end"].get("date"))
+                schedule.append((start, end, event.get("summary", "")))
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                break
+        logger.info("Found %d busy events", len(schedule))
+        return schedule
+    except Exception as e:
+        logger.exception("Failed to list busy calendar events")
+        return []
+
+def build_event(_event, date, _start, timezone, duration=1, _end=None, frequency=None, byday=None, interval=None) -> dict:
+    """Build a Calendar API event resource from parsed fields"""
+    start = time_utils.standardize_time(date, _start, timezone)
+    if type(duration) == type(None):
+        duration = 1
+    if _end:
+        end = time_utils.standardize_time(date, _end, timezone)
+    else:
+        end = datetime.isoformat(datetime.fromisoformat(start) + timedelta(hours=duration)) # Assume event is 1 hour long
         
-        start = time_utils.standardize_time(date, _start, timezone)
-        if type(duration) == type(None):
-            duration = 1
-        if _end:
-            end = time_utils.standardize_time(date, _end, timezone)
+    event = {
+        'summary': f'{_event}',
+        'start': {
+            'dateTime': f'{start}',
+            'timeZone': 'UTC',
+            },
+        'end': {
+            'dateTime': f'{end}',
+            'timeZone': 'UTC',
+            }
+        }
+    if frequency:
+        rule = f'RRULE:FREQ={frequency}'
+        if byday:
+            rule += f';BYDAY={byday}'
+        if interval:
+            rule += f';INTERVAL={interval}'
+        event['recurrence'] = [rule]
+    return event
+
+def event_id_for(owner, event: dict, idempotency_key=None) -> str:
+    """
+    Deterministic event ID, so inserting the same event twice (e.g. on a webhook retry) hits a
+    409 instead of creating a duplicate. Calendar IDs use base32hex characters; hex digits qualify.
+    """
+    key = idempotency_key or json.dumps([event.get('summary'), event['start'], event['end'], event.get('recurrence')], sort_keys=True)
+    return hashlib.sha256(f"{owner}|{key}".encode()).hexdigest()[:40]
+
+def _execute_batches(service, results: List[dict], callback, requests: dict):
+    """ Send {index: request} in batch HTTP requests of BATCH_LIMIT, reporting each response to callback under its index """
+    indexes = list(requests)
+    for offset in range(0, len(indexes), BATCH_LIMIT):
+        chunk = indexes[offset:offset + BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=callback)
+        for i in chunk:
+            batch.add(requests[i], request_id=str(i))
+        try:
+            batch.execute()
+        except Exception as e:
+            logger.exception("Calendar batch request failed")
+            for i in chunk:
+                results[i].setdefault("error", str(e))
+
+def add_events(creds, events: List[dict], owner=None, idempotency_keys: Optional[List[str]] = None) -> List[dict]:
+    """
+    Insert several events with Calendar batch requests.
+
+    Args:
+        creds (dict): The user's google_token
+        events (list): Event resources from build_event
+        owner (str): The user's phone number, for the pooled service and calendar mirror
+        idempotency_keys (list): Optional key per event; by default the event's own fields
+
+    Returns:
+        list: Per event, {"status": "created" | "exists" | "failed", "id": event ID, "error": message if failed}
+    """
+    keys = idempotency_keys or [None] * len(events)
+    for event, key in zip(events, keys):
+        event['id'] = event_id_for(owner, event, key)
+    results = [{"status": "failed", "id": event['id']} for event in events]
+    try:
+        service = get_service_pool().service(creds, "calendar", "v3", owner)
+    except Exception as e:
+        logger.exception("Failed to build calendar service")
+        return [{**result, "error": str(e)} for result in results]
+
+    def inserted(request_id, response, exception):
+        i = int(request_id)
+        if exception is None:
+            results[i]["status"] = "created"
+            get_calendar_mirror().record(owner, response)
+        elif isinstance(exception, HttpError) and exception.resp.status == 409: # Already inserted, maybe deleted since
+            conflicts.append(i)
         else:
-            end = datetime.isoformat(datetime.fromisoformat(start) + timedelta(hours=duration)) # Assume event is 1 hour long
-            
-        if frequency:
-            rule = f'RRULE:FREQ={frequency}'
-            if byday:
-                rule += f';BYDAY={byday}'
-            if interval:
-                rule += f';INTERVAL={interval}'
-            event = {
-                'summary': f'{_event}',
-                'start': {
-                    'dateTime': f'{start}',
-                    'timeZone': 'UTC',
-                    },
-                'end': {
-                    'dateTime': f'{end}',
-                    'timeZone': 'UTC',
-                    },
-                'recurrence': [
-                    rule
-                    ],
-                }
+            results[i]["error"] = str(exception)
+            logger.warning("Failed to add event %s: %s", events[i].get('summary'), exception)
+
+    def resolved(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None:
+            results[i]["error"] = str(exception)
+            logger.warning("Failed to resolve duplicate event %s: %s", events[i]['id'], exception)
+        elif response.get('status') == 'cancelled': # The user deleted it; adding it again restores it
+            cancelled.append(i)
         else:
-            event = {
-                'summary': f'{_event}',
-                'start': {
-                    'dateTime': f'{start}',
-                    'timeZone': 'UTC',
-                    },
-                'end': {
-                    'dateTime': f'{end}',
-                    'timeZone': 'UTC',
-                    }
-                }
-            
-        event_result = service.events().insert(calendarId="primary", body=event).execute()
-        logger.info("Event added to calendar: %s", event_result.get('htmlLink'))
-        return 1
+            results[i]["status"] = "exists"
+            get_calendar_mirror().record(owner, response)
+
+    conflicts, cancelled = [], []
+    _execute_batches(service, results, inserted, {i: service.events().insert(calendarId="primary", body=event) for i, event in enumerate(events)})
+    _execute_batches(service, results, resolved, {i: service.events().get(calendarId="primary", eventId=events[i]['id']) for i in conflicts})
+    _execute_batches(service, results, inserted, {i: service.events().update(calendarId="primary", eventId=events[i]['id'], body={**events[i], 'status': 'confirmed'}) for i in cancelled})
+    logger.info("Added %d of %d events to calendar", sum(r["status"] != "failed" for r in results), len(results))
+    return results
+
+def add_to_calendar(creds, _event, date, _start, timezone, duration=1, _end=None, frequency=None, byday=None, interval=None, owner=None, idempotency_key=None) -> int:
+    """Add an event to Google Calendar"""
+    try:
+        event = build_event(_event, date, _start, timezone, duration, _end, frequency, byday, interval)
+        result = add_events(creds, [event], owner, [idempotency_key] if idempotency_key else None)[0]
+        return 0 if result["status"] == "failed" else 1
     except Exception as e:
         logger.exception("Failed to add to calendar")
         return 0
@@ -0,0 +1,58 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+import pytz
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_checkpoint(db, job: str) -> Optional[dict]:
+    """
+    Return the saved progress of an unfinished run of `job`, or None to start from the beginning.
+
+    Args:
+        db: Firestore client
+        job (str): Job name, used as the document ID in the Jobs collection
+
+    Returns:
+        dict: Fields saved with save_checkpoint, including "cursor"
+    """
+    snapshot = db.collection("Jobs").document(job).get()
+    if not snapshot.exists:
+        return None
+    checkpoint = snapshot.to_dict()
+    if checkpoint.get("status") != "running":
+        return None
+    logger.info("Resuming %s after %s", job, checkpoint.get("cursor"))
+    return checkpoint
+
+
+def save_checkpoint(db, job: str, cursor, **progress):
+    """
+    Record that everything up to and including `cursor` is done.
+
+    Args:
+        db: Firestore client
+        job (str): Job name
+        cursor: Last finished document ID (or other sort key)
+        progress: Extra counters stored alongside the cursor
+    """
+    db.collection("Jobs").document(job).set({
+        "status": "running",
+        "cursor": cursor,
+        "updated": datetime.now(pytz.UTC).isoformat(),
+        **progress
+    })
+
+
+def finish_checkpoint(db, job: str, **progress):
+    """ Mark the run finished so the next run starts from the beginning """
+    db.collection("Jobs").document(job).set({
+        "status": "done",
+        "cursor": None,
+        "updated": datetime.now(pytz.UTC).isoformat(),
+        **progress
+    })
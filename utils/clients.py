@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# One place for every external client. Sync clients are process-wide and their connection pools,
+# sized to the concurrency limit, make extra threads wait for a connection. Async clients are bound
+# to the event loop they were created on, so they are kept per loop, and coroutines wait on a
+# per-loop semaphore of the same size rather than opening unbounded sockets.
+POOL_KEEPALIVE = float(os.getenv("CLIENT_KEEPALIVE_SECONDS", 30))
+LIMITS = {
+    "openai": int(os.getenv("OPENAI_CONCURRENCY", 32)),
+    "twilio": int(os.getenv("TWILIO_CONCURRENCY", 32)),
+    "firestore": int(os.getenv("FIRESTORE_CONCURRENCY", 64)),
+}
+TWILIO_RETRIES = int(os.getenv("TWILIO_MAX_RETRIES", 2))
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "/mnt/secrets4/FIREBASE_ADMIN_AUTH")
+
+_lock = threading.Lock()
+_oclient = None
+_tclient = None
+_db = None
+_loop_state = weakref.WeakKeyDictionary()  # event loop -> {"limits": {...}, "openai": ..., "twilio": ..., "firestore": ...}
+
+
+def get_openai_client():
+    """Initialize and return the OpenAI client"""
+    global _oclient
+    with _lock:
+        if _oclient is None:
+            import httpx
+            from openai import OpenAI, DefaultHttpxClient
+            limits = httpx.Limits(max_connections=LIMITS["openai"], max_keepalive_connections=LIMITS["openai"], keepalive_expiry=POOL_KEEPALIVE)
+            _oclient = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=DefaultHttpxClient(limits=limits))
+        return _oclient
+
+
+def get_twilio_client():
+    """Initialize and return the Twilio client"""
+    global _tclient
+    with _lock:
+        if _tclient is None:
+            from requests.adapters import HTTPAdapter
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client
+            http_client = TwilioHttpClient(pool_connections=True)
+            # The default adapter keeps min(32, cpu + 4) connections and opens throwaway ones past that;
+            # size it to the concurrency limit and make extra threads wait for a connection instead
+            http_client.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=LIMITS["twilio"], pool_block=True, max_retries=TWILIO_RETRIES))
+            _tclient = Client(os.getenv("TWILIO_SID"), os.getenv("TWILIO_AUTH_TOKEN"), http_client=http_client)
+        return _tclient
+
+
+def get_firestore_client():
+    """Initialize the Firebase app if needed and return the Firestore client"""
+    global _db
+    with _lock:
+        if _db is None:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+            try:
+                firebase_admin.get_app()
+            except ValueError:
+                firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS))
+            _db = firestore.client()
+        return _db
+
+
+def _state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = _loop_state[loop] = {"limits": {}}
+    return state
+
+
+def async_limit(name: str) -> asyncio.Semaphore:
+    """ Semaphore holding coroutines on the running loop to the client's concurrency limit: async with async_limit("twilio"): ... """
+    limits = _state()["limits"]
+    if name not in limits:
+        limits[name] = asyncio.Semaphore(LIMITS[name])
+    return limits[name]
+
+
+def get_async_openai_client():
+    """Initialize and return the AsyncOpenAI client for the running event loop"""
+    state = _state()
+    if "openai" not in state:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        limits = httpx.Limits(max_connections=LIMITS["openai"], max_keepalive_connections=LIMITS["openai"], keepalive_expiry=POOL_KEEPALIVE)
+        state["openai"] = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=DefaultAsyncHttpxClient(limits=limits))
+    return state["openai"]
+
+
+def get_async_twilio_client():
+    """Initialize and return a Twilio client on AsyncTwilioHttpClient for the running event loop. Use the *_async methods"""
+    state = _state()
+    if "twilio" not in state:
+        from aiohttp import ClientSession, TCPConnector
+        from twilio.http.async_http_client import AsyncTwilioHttpClient
+        from twilio.rest import Client
+        http_client = AsyncTwilioHttpClient(pool_connections=False)
+        http_client.session = ClientSession(connector=TCPConnector(limit=LIMITS["twilio"], keepalive_timeout=POOL_KEEPALIVE))
+        state["twilio"] = Client(os.getenv("TWILIO_SID"), os.getenv("TWILIO_AUTH_TOKEN"), http_client=http_client)
+    return state["twilio"]
+
+
+def get_async_firestore_client():
+    """Initialize the Firebase app if needed and return the async Firestore client for the running event loop"""
+    state = _state()
+    if "firestore" not in state:
+        get_firestore_client() # Initializes the app
+        from firebase_admin import firestore_async
+        state["firestore"] = firestore_async.client()
+    return state["firestore"]
+
+
+async def close_async_clients():
+    """ Close the connection pools of the running loop's async clients """
+    state = _loop_state.pop(asyncio.get_running_loop(), None) or {}
+    if "openai" in state:
+        await state["openai"].close()
+    if "twilio" in state:
+        await state["twilio"].http_client.close()
+    if "firestore" in state:
+        state["firestore"].close()
+
+
+async def create_response_async(client=None, **request):
+    """
+    responses.create on the async OpenAI client, within the OpenAI concurrency limit.
+
+    Args:
+        client: AsyncOpenAI client, the running loop's by default
+        request: Arguments for responses.create
+
+    Returns:
+        The response object
+    """
+    client = client or get_async_openai_client()
+    async with async_limit("openai"):
+        return await client.responses.create(**request)
+
+
+async def send_text_async(conversation_sid: str, body: str, client=None):
+    """ Send one message to a Twilio conversation, within the Twilio concurrency limit """
+    client = client or get_async_twilio_client()
+    async with async_limit("twilio"):
+        return await client.conversations.v1.conversations(conversation_sid).messages.create_async(body=body)
+
+
+def run_async(coroutine):
+    """ Run a coroutine on a new event loop from synchronous code, closing that loop's async clients when it finishes """
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await close_async_clients()
+    return asyncio.run(main())
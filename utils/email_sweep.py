@@ -0,0 +1,288 @@
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+COLLECTION = "EmailSweep"
+ROUND_DOC = "round"
+# Users document field holding the user's shard
+SHARD_FIELD = "emailShard"
+# Fixed shard count. Changing it requires re-running backfill with reassign=True
+NUM_SHARDS = 32
+# A shard whose worker hasn't sent a heartbeat for this long is handed to another worker
+LEASE_SECONDS = 120
+# Heartbeats per lease period while a page is being processed
+RENEWALS_PER_LEASE = 3
+
+
+def shard_for(phone: str, shards: int = NUM_SHARDS) -> int:
+    """ Stable shard of a user, from a hash of their phone number """
+    return int(hashlib.sha1(phone.encode()).hexdigest()[:8], 16) % shards
+
+
+def _shard_id(shard: int) -> str:
+    return f"shard-{shard:03d}"
+
+
+class _LeaseKeeper:
+    """ Renews a lease from a background thread while a page of users is processed """
+
+    def __init__(self, sweep, lease: dict):
+        self.sweep = sweep
+        self.lease = lease
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{lease['shard']}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.sweep.lease_seconds / RENEWALS_PER_LEASE):
+            try:
+                renewed = self.sweep.heartbeat(self.lease)
+            except Exception as e:
+                logger.exception("Failed to renew lease on shard %d", self.lease["shard"])
+                renewed = False
+            if not renewed: # Another worker may take the shard; stop before it repeats our users
+                self.lost.set()
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excinfo):
+        self._stop.set()
+        self._thread.join()
+
+
+class EmailSweep:
+    """
+    Sharded, resumable sweep over the users whose email Marley checks.
+
+    Users are split into NUM_SHARDS shards by a hash of their phone number (stored in the
+    emailShard field). Every /check_emails call joins the current round, or starts a new
+    one when the previous round has finished, then leases shards from the EmailSweep
+    collection one at a time. A lease is taken with a conditional write, so two workers can
+    never hold the same shard. While working a shard the worker processes a page of users,
+    then heartbeats: it extends the lease and saves the last user ID as the shard's cursor.
+    A background thread also extends the lease while a page runs; if that fails, the rest
+    of the page is skipped, since another worker may already be redoing it.
+    When a worker crashes its lease runs out and the next worker resumes after the cursor.
+
+    Shard documents: {"round", "status": pending | leased | done, "owner", "lease_expires",
+    "cursor", "processed", "updated"}.
+    """
+
+    def __init__(self, db, process: Callable, shards: int = NUM_SHARDS, lease_seconds: float = LEASE_SECONDS, page_size: int = 50, workers: int = 10, worker_id: Optional[str] = None):
+        self.db = db
+        self.process = process
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self.page_size = page_size
+        self.workers = workers
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.stats = {"shards": 0, "users": 0, "failed": 0, "lost_leases": 0}
+        self._lock = threading.Lock()
+
+    def _ref(self, doc_id: str):
+        return self.db.collection(COLLECTION).document(doc_id)
+
+    def _count(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def backfill(self, reassign: bool = False) -> int:
+        """ Give every user with Gmail connected an emailShard. Returns the number of users updated """
+        users = self.db.collection("Users").where(filter=FieldFilter("profile.googleConnected", "==", True)).stream()
+        batch, pending, updated = self.db.batch(), 0, 0
+        for user in users:
+            shard = shard_for(user.id, self.shards)
+            if not reassign and user.to_dict().get(SHARD_FIELD) is not None:
+                continue
+            batch.update(user.reference, {SHARD_FIELD: shard})
+            pending += 1
+            updated += 1
+            if pending == 500: # Firestore limits a WriteBatch to 500 writes
+                batch.commit()
+                batch, pending = self.db.batch(), 0
+        if pending:
+            batch.commit()
+        logger.info("Assigned email shards to %d users", updated)
+        return updated
+
+    def _ensure_round(self) -> int:
+        """ The current round, starting the next one if every shard finished the current round """
+        ref = self._ref(ROUND_DOC)
+        snapshot = ref.get()
+        if not snapshot.exists: # First sweep: shard the existing users
+            self.backfill()
+            try:
+                ref.create({"round": 0, "started": time.time(), "shards": self.shards})
+            except AlreadyExists:
+                pass
+            snapshot = ref.get()
+        current = snapshot.to_dict()["round"]
+
+        shards = self.db.get_all([self._ref(_shard_id(shard)) for shard in range(self.shards)])
+        if all(s.exists and s.to_dict().get("round") == current and s.to_dict().get("status") == "done" for s in shards) or current == 0:
+            try:
+                ref.update({"round": current + 1, "started": time.time()}, option=self.db.write_option(last_update_time=snapshot.update_time))
+                logger.info("Started email sweep round %d", current + 1)
+                return current + 1
+            except FailedPrecondition:
+                return ref.get().to_dict()["round"] # Another worker started it
+        return current
+
+    def progress(self, current: int) -> dict:
+        """ Number of shards in each status for a round """
+        counts = {"done": 0, "leased": 0, "pending": 0}
+        for snapshot in self.db.get_all([self._ref(_shard_id(shard)) for shard in range(self.shards)]):
+            d = snapshot.to_dict() if snapshot.exists else {}
+            status = d.get("status") if d.get("round") == current else "pending"
+            counts[status if status in counts else "pending"] += 1
+        return counts
+
+    def _claimable(self, snapshot, current: int, now: float) -> bool:
+        if not snapshot.exists:
+            return True
+        d = snapshot.to_dict()
+        if d.get("round", 0) < current:
+            return True
+        if d.get("round") != current:
+            return False
+        return d.get("status") == "pending" or (d.get("status") == "leased" and d.get("lease_expires", 0) < now)
+
+    def claim(self, current: int) -> Optional[dict]:
+        """ Lease a shard that is unstarted, released or abandoned in this round """
+        now = time.time()
+        order = list(range(self.shards))
+        offset = shard_for(self.worker_id, self.shards) # Workers start at different shards to avoid contention
+        for shard in order[offset:] + order[:offset]:
+            ref = self._ref(_shard_id(shard))
+            snapshot = ref.get()
+            if not self._claimable(snapshot, current, now):
+                continue
+            d = snapshot.to_dict() if snapshot.exists else {}
+            resume = d.get("round") == current
+            lease = {
+                "round": current,
+                "status": "leased",
+                "owner": self.worker_id,
+                "lease_expires": now + self.lease_seconds,
+                "cursor": d.get("cursor") if resume else None,
+                "processed": d.get("processed", 0) if resume else 0,
+                "updated": now,
+            }
+            try:
+                if snapshot.exists:
+                    ref.update(lease, option=self.db.write_option(last_update_time=snapshot.update_time))
+                else:
+                    ref.create(lease)
+            except (FailedPrecondition, AlreadyExists):
+                continue # Another worker took it
+            if resume and lease["cursor"]:
+                logger.info("Resuming shard %d after %s", shard, lease["cursor"])
+            return {"shard": shard, **lease}
+        return None
+
+    def heartbeat(self, lease: dict, status: str = "leased") -> bool:
+        """ Save the lease's cursor and extend it. False if the lease was lost to another worker """
+        ref = self._ref(_shard_id(lease["shard"]))
+        snapshot = ref.get()
+        d = snapshot.to_dict() or {}
+        if d.get("owner") != self.worker_id or d.get("round") != lease["round"] or d.get("status") != "leased":
+            return False
+        now = time.time()
+        try:
+            ref.update({
+                "status": status,
+                "lease_expires": now + self.lease_seconds,
+                "cursor": lease["cursor"],
+                "processed": lease["processed"],
+                "updated": now,
+            }, option=self.db.write_option(last_update_time=snapshot.update_time))
+        except FailedPrecondition:
+            return False
+        return True
+
+    def _page(self, shard: int, cursor: Optional[str]):
+        query = (
+            self.db.collection("Users")
+            .where(filter=FieldFilter(SHARD_FIELD, "==", shard))
+            .where(filter=FieldFilter("profile.googleConnected", "==", True))
+            .where(filter=FieldFilter("profile.preferences.checkMail", "==", True))
+            .order_by("__name__")
+        )
+        if cursor:
+            query = query.start_after({"__name__": cursor})
+        return list(query.limit(self.page_size).stream())
+
+    def _process(self, user, lost: Optional[threading.Event] = None):
+        if lost is not None and lost.is_set():
+            return None # Skipped: the lease is gone
+        try:
+            self.process(user)
+            return True
+        except Exception as e:
+            logger.exception("Error in processing email for user %s", user.id)
+            return False
+
+    def work_shard(self, lease: dict, deadline: Optional[float] = None) -> bool:
+        """ Process a leased shard page by page. True when the shard is finished """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                users = self._page(lease["shard"], lease["cursor"])
+                if not users:
+                    if self.heartbeat(lease, status="done"):
+                        self._count(shards=1)
+                        return True
+                    self._count(lost_leases=1)
+                    return False
+                with _LeaseKeeper(self, lease) as keeper:
+                    results = list(executor.map(lambda user: self._process(user, keeper.lost), users))
+                self._count(users=results.count(True), failed=results.count(False))
+                if keeper.lost.is_set():
+                    logger.warning("Lost lease on shard %d during a page, skipped %d users", lease["shard"], results.count(None))
+                    self._count(lost_leases=1)
+                    return False
+                lease["cursor"] = users[-1].id
+                lease["processed"] += len(users)
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.heartbeat(lease, status="pending") # Hand the rest to another worker now
+                    return False
+                if not self.heartbeat(lease):
+                    logger.warning("Lost lease on shard %d", lease["shard"])
+                    self._count(lost_leases=1)
+                    return False
+
+    def run(self, max_seconds: Optional[float] = None) -> dict:
+        """
+        Work shards of the current round until none are left or the time budget runs out.
+
+        Args:
+            max_seconds (float): Stop claiming shards after this long; a shard in progress is released
+
+        Returns:
+            dict: Counters for this worker, with the round it worked on
+        """
+        deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+        current = self._ensure_round()
+        while deadline is None or time.monotonic() < deadline:
+            lease = self.claim(current)
+            if lease is None:
+                break
+            self.work_shard(lease, deadline)
+        logger.info("Email sweep worker %s finished round %d: %s", self.worker_id, current, self.stats)
+        return {**self.stats, "round": current}
@@ -5,79 +5,158 @@ from googleapiclient.errors import HttpError
 from datetime import datetime
 import pytz
 import html
-from typing import List, Tuple
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .google_services import get_service_pool
+from .email_classifier import METADATA_HEADERS, plausible_scheduling
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
-_credentials_class = None
-_build_function = None
-def _get_google_deps():
-    """Lazy import Google API dependencies when needed"""
-    global _credentials_class, _build_function
-    if _credentials_class is None:
-        from google.oauth2.credentials import Credentials
-        from googleapiclient.discovery import build
-        _credentials_class = Credentials
-        _build_function = build
-    return _credentials_class, _build_function
-
-def build_gmail_service(creds):
+def build_gmail_service(creds, owner=None):
     try:
-        # Get dependencies
-        Credentials, build = _get_google_deps()
-        credential = Credentials(**creds)
-        return build("gmail", "v1", credentials=credential)
+        return get_service_pool().service(creds, "gmail", "v1", owner)
     except Exception as e:
         logger.exception("Failed to build Gmail service")
 
-def check_new_emails(service, email_address) -> List[Tuple[str, str, str, str, str, str]]:
-    try:
-        ten_minutes_ago = int(datetime.now(pytz.UTC).timestamp()) - 600 # Get time in unix time stamp 10 minutes ago
-
+# Gmail accepts at most 100 calls per batch HTTP request
+BATCH_LIMIT = 100
+
+def _header(headers, name: str):
+    name = name.lower()
+    return next((h['value'] for h in headers if h['name'].lower() == name), None)
+
+def _decode(data: str) -> str:
+    return html.unescape(base64.urlsafe_b64decode(data).decode('utf-8', errors='replace'))
+
+def _strip_html(text: str) -> str:
+    text = re.sub(r"(?is)<(script|style).*?</\1>", " ", text)
+    text = re.sub(r"(?i)<br\s*/?>|</p>|</div>", "\n", text)
+    return html.unescape(re.sub(r"<[^>]+>", " ", text))
+
+def extract_body(payload: dict) -> str:
+    """ Text of a message payload, walking nested multipart parts. Prefers text/plain over text/html """
+    plain, rich = [], []
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+        if children:
+            stack.extend(reversed(children)) # Keep document order
+            continue
+        mime_type = part.get('mimeType', '')
+        data = part.get('body', {}).get('data')
+        if not data or part.get('filename'): # Skip attachments
+            continue
+        if mime_type == 'text/plain':
+            plain.append(_decode(data))
+        elif mime_type == 'text/html':
+            rich.append(data)
+    if plain:
+        return "\n".join(plain)
+    if rich:
+        return "\n".join(_strip_html(base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')) for data in rich)
+    return ""
+
+def batch_get(service, msg_ids: List[str], failed: Optional[List[str]] = None, **kwargs) -> Dict[str, dict]:
+    """
+    Fetch several messages with Gmail batch HTTP requests instead of one request per message.
+
+    Args:
+        service: Gmail API service
+        msg_ids (list): Message IDs to fetch
+        failed (list): Collects the IDs whose fetch failed (rate limits, server errors, timeouts),
+            so they can be tried again. Messages that no longer exist (404) are not included
+        kwargs: Arguments for messages().get, e.g. format='metadata'
+
+    Returns:
+        dict: {message ID: message resource} for the messages fetched successfully
+    """
+    results = {}
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+        elif isinstance(exception, HttpError) and exception.resp.status == 404:
+            logger.info("Message %s no longer exists", request_id)
+        else:
+            logger.warning("Failed to fetch message %s: %s", request_id, exception)
+            if failed is not None:
+                failed.append(request_id)
+
+    for i in range(0, len(msg_ids), BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=callback)
+        for msg_id in msg_ids[i:i + BATCH_LIMIT]:
+            batch.add(service.users().messages().get(userId='me', id=msg_id, **kwargs), request_id=msg_id)
+        batch.execute()
+    return results
+
+def fetch_emails(service, msg_ids: List[str], prefilter=plausible_scheduling, failed: Optional[List[str]] = None) -> List[Tuple[str, str, str, str, str, str]]:
+    """
+    Fetch messages in two batched passes: headers and snippet for every message, then full
+    bodies only for the messages `prefilter(headers, snippet)` accepts.
+
+    Args:
+        failed (list): Collects the IDs whose metadata or body fetch failed (see batch_get).
+            The other IDs missing from the result were rejected by the prefilter or deleted
+
+    Returns:
+        list: (msg_id, body, sender, subject, message_id, thread_id) per candidate, in msg_ids order
+    """
+    if not msg_ids:
+        return []
+    metadata = batch_get(service, msg_ids, failed, format='metadata', metadataHeaders=METADATA_HEADERS)
+    candidates = []
+    for msg_id in msg_ids:
+        msg = metadata.get(msg_id)
+        if msg is None:
+            continue
+        headers = msg.get('payload', {}).get('headers', [])
+        if prefilter is None or prefilter(headers, html.unescape(msg.get('snippet', ''))):
+            candidates.append(msg_id)
+    logger.info("%d of %d emails passed the scheduling prefilter", len(candidates), len(msg_ids))
+
+    full = batch_get(service, candidates, failed, format='full')
+    emails = []
+    for msg_id in candidates:
+        msg = full.get(msg_id)
+        if msg is None:
+            continue
+        payload = msg.get('payload', {})
+        headers = payload.get('headers', [])
+        subject = _header(headers, "Subject") or ''
+        sender = _header(headers, "From") or ''
+        emails.append((msg_id, extract_body(payload).strip(), sender, subject, _header(headers, "Message-ID"), msg.get("threadId")))
+        logger.info("Processed email from %s with subject: %s", sender, subject)
+    return emails
+
+def list_recent_ids(service, after: int, max_results: int = 5) -> List[str]:
+    """ IDs of unread primary inbox messages received after the unix timestamp `after`, newest first """
+    ids, page_token = [], None
+    while len(ids) < max_results:
         results = service.users().messages().list(
             userId='me',
             labelIds=["INBOX"],
-            q=f'is:unread category:primary after:{ten_minutes_ago}',
-            maxResults=5
+            q=f'is:unread category:primary after:{after}',
+            maxResults=min(max_results - len(ids), 500),
+            pageToken=page_token
         ).execute()
+        ids.extend(msg['id'] for msg in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return ids[:max_results]
+
+def check_new_emails(service, email_address) -> List[Tuple[str, str, str, str, str, str]]:
+    try:
+        ten_minutes_ago = int(datetime.now(pytz.UTC).timestamp()) - 600 # Get time in unix time stamp 10 minutes ago
+
+        msg_ids = list_recent_ids(service, ten_minutes_ago)
+        logger.info("Found %d unread primary inbox messages for %s", len(msg_ids), email_address)
 
-        messages = results.get('messages', [])
-        emails = []
-        logger.info("Found %d unread primary inbox messages for %s", len(emails), email_address)
-
-        for msg in messages:
-            msg_id = msg['id']
-            msg_detail = service.users().messages().get(userId='me', id=msg_id, format='full').execute() # Get full data
-
-            payload = msg_detail.get('payload', {})
-            headers = payload.get('headers', {})
-
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), '')
-            message_id = next((h["value"] for h in headers if h["name"] == "Message-ID"), None)
-            thread_id = msg_detail.get("threadId")
-            parts = payload.get('parts', [])
-            body = ""
-
-            if parts:
-                for part in parts:
-                    if part.get('mimeType') == 'text/plain' and part.get('body', {}).get('data'):
-                        data = part['body']['data']
-                        body = base64.urlsafe_b64decode(data).decode('utf-8')
-                        body = html.unescape(body)
-                        break
-            else:
-                data = payload.get('body', {}).get('data')
-                if data:
-                    body = base64.urlsafe_b64decode(data).decode('utf-8')
-                    body = html.unescape(body)
-
-            emails.append((msg_id, body.strip(), sender, subject, message_id, thread_id))
-            logger.info("Processed email from %s with subject: %s", sender, subject)
-
-        return emails
+        return fetch_emails(service, msg_ids)
     
     except Exception as e:
         logger.exception(f"Error occurred reading emails")
@@ -0,0 +1,180 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+import pytz
+from googleapiclient.errors import HttpError
+
+from .gmail import fetch_emails, list_recent_ids
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Message IDs remembered per user so a message is never classified or answered twice
+MAX_PROCESSED = 200
+# How far back a first sync looks
+FIRST_SYNC_WINDOW = timedelta(minutes=10)
+# How far back a resync after an expired historyId may look
+MAX_RESYNC_WINDOW = timedelta(days=2)
+# Resyncs start this long before the last sync; the processed set drops repeats
+RESYNC_OVERLAP = timedelta(minutes=5)
+# Most new messages handled for one user per check
+MAX_MESSAGES = 50
+
+# Gmail category labels that are not the Primary tab
+OTHER_CATEGORIES = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_UPDATES", "CATEGORY_FORUMS"}
+
+
+def _is_new_primary(labels) -> bool:
+    labels = set(labels or [])
+    return "INBOX" in labels and "UNREAD" in labels and not labels & OTHER_CATEGORIES and not labels & {"SENT", "DRAFT", "SPAM", "TRASH"}
+
+
+class GmailSync:
+    """
+    Incremental Gmail sync using users.history.list.
+
+    Each user's sync state lives in the gmail_sync map of their Users document:
+        historyId: Gmail history ID the next delta starts from
+        processed: IDs of the most recent messages already handled (newest last)
+        pending: IDs already found but not handled yet, because a check hit max_messages or
+                 failed part way; they come first in the next check
+        synced: Time of the last successful sync (ISO 8601)
+    A user without a historyId, or whose historyId Gmail no longer keeps (404), gets a full
+    resync of the unread primary inbox since the last sync. Messages in `processed` are
+    dropped either way, so a slow or repeated check never answers the same email twice.
+    """
+
+    def __init__(self, user_cache, max_processed: int = MAX_PROCESSED, max_messages: int = MAX_MESSAGES):
+        self.user_cache = user_cache
+        self.max_processed = max_processed
+        self.max_messages = max_messages
+        self.stats = {"deltas": 0, "resyncs": 0, "messages": 0, "duplicates": 0, "fetch_failures": 0, "handler_failures": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def _delta(self, service, history_id: str) -> Tuple[List[str], str]:
+        """ Messages added to the inbox since history_id and the latest history ID """
+        ids, page_token = [], None
+        latest = history_id
+        while True:
+            results = service.users().history().list(
+                userId='me',
+                startHistoryId=history_id,
+                historyTypes=["messageAdded"],
+                labelId="INBOX",
+                pageToken=page_token
+            ).execute()
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    if _is_new_primary(message.get('labelIds')) and message.get('id') not in ids:
+                        ids.append(message['id'])
+            latest = results.get('historyId', latest)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return ids, latest
+
+    def _resync(self, service, synced: Optional[str]) -> Tuple[List[str], str]:
+        """ Unread primary inbox messages since the last sync, with the history ID to continue from """
+        # Read the history ID first so nothing that arrives during the listing is skipped next time
+        history_id = service.users().getProfile(userId='me').execute()['historyId']
+        now = datetime.now(pytz.UTC)
+        since = now - FIRST_SYNC_WINDOW
+        if synced:
+            since = max(datetime.fromisoformat(synced) - RESYNC_OVERLAP, now - MAX_RESYNC_WINDOW)
+        ids = list_recent_ids(service, int(since.timestamp()), max_results=self.max_messages)
+        return list(reversed(ids)), history_id # Oldest first, like history records
+
+    def sync(self, service, state: Optional[dict]) -> Tuple[List[str], dict]:
+        """
+        Find the user's new, unprocessed messages.
+
+        Args:
+            service: Gmail API service
+            state (dict): The user's gmail_sync map, or None before the first sync
+
+        Returns:
+            tuple: (message IDs to process oldest first, state to save with commit as they are handled)
+        """
+        state = dict(state or {})
+        pending = list(state.get("pending") or [])
+        history_id = state.get("historyId")
+        ids = None
+        if history_id:
+            try:
+                ids, history_id = self._delta(service, history_id)
+                self._count(deltas=1)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                logger.warning("Gmail history %s expired, resyncing", history_id)
+        if ids is None:
+            ids, history_id = self._resync(service, state.get("synced"))
+            self._count(resyncs=1)
+
+        processed = set(state.get("processed") or [])
+        ids = pending + [msg_id for msg_id in ids if msg_id not in pending]
+        new_ids = [msg_id for msg_id in ids if msg_id not in processed]
+        self._count(duplicates=len(ids) - len(new_ids))
+        # historyId moves past every new message, so the ones over the limit are carried over, oldest first
+        new_ids, state["pending"] = new_ids[:self.max_messages], new_ids[self.max_messages:]
+        self._count(messages=len(new_ids))
+        state["historyId"] = history_id
+        return new_ids, state
+
+    def check(self, user_id: str, service, state: Optional[dict], handle: Callable[[tuple], None]) -> Tuple[int, int]:
+        """
+        One check of a user's mailbox: sync, fetch the new messages the prefilter keeps and pass
+        each to `handle` as a fetch_emails tuple.
+
+        A message is only marked processed once it was handled or the prefilter dropped it.
+        Messages whose fetch failed or whose handler raised stay pending for the next check.
+        Progress is saved even if the check stops part way.
+
+        Returns:
+            tuple: (messages marked processed, messages left pending)
+        """
+        msg_ids, state = self.sync(service, state)
+        done = set()
+        failed = []
+        try:
+            emails = fetch_emails(service, msg_ids, failed=failed)
+            fetched = {email[0] for email in emails}
+            done.update(msg_id for msg_id in msg_ids if msg_id not in fetched and msg_id not in failed) # Dropped by the prefilter, or deleted
+            for email in emails:
+                try:
+                    handle(email)
+                except Exception as e:
+                    logger.exception("Failed to handle email %s of user ID %s, retrying next check", email[0], user_id)
+                    self._count(handler_failures=1)
+                    continue
+                done.add(email[0])
+        finally:
+            self._count(fetch_failures=len(failed))
+            unhandled = [msg_id for msg_id in msg_ids if msg_id not in done]
+            self.commit(user_id, state, [msg_id for msg_id in msg_ids if msg_id in done], unhandled)
+        return len(done), len(unhandled)
+
+    def commit(self, user_id: str, state: dict, handled: List[str], unhandled: List[str] = ()):
+        """
+        Save the sync state and remember the handled message IDs.
+
+        `unhandled` are IDs from this check that were not handled (a failed fetch or handler);
+        they are kept in pending, ahead of the carried-over IDs, and tried again next check.
+        """
+        handled = list(handled)
+        processed = [msg_id for msg_id in state.get("processed") or [] if msg_id not in handled] + handled
+        pending = [msg_id for msg_id in list(unhandled) + list(state.get("pending") or []) if msg_id not in handled]
+        self.user_cache.update(user_id, {"gmail_sync": {
+            "historyId": state["historyId"],
+            "processed": processed[-self.max_processed:],
+            "pending": list(dict.fromkeys(pending))[:self.max_processed],
+            "synced": datetime.now(pytz.UTC).isoformat(),
+        }})
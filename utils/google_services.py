@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Seconds before an idle HTTP connection attempt gives up
+HTTP_TIMEOUT = 30
+
+_discovery_docs = {}
+_discovery_lock = threading.Lock()
+
+
+def _discovery_document(api: str, version: str) -> dict:
+    """ Parsed discovery document bundled with googleapiclient, loaded once per process """
+    key = (api, version)
+    with _discovery_lock:
+        if key not in _discovery_docs:
+            from googleapiclient.discovery_cache import get_static_doc
+            content = get_static_doc(api, version)
+            if content is None:
+                raise ValueError(f"No static discovery document for {api} {version}")
+            _discovery_docs[key] = json.loads(content)
+        return _discovery_docs[key]
+
+
+def _credentials_class():
+    """ Credentials that report refreshed tokens so they can be persisted once """
+    from google.oauth2.credentials import Credentials
+
+    class PersistingCredentials(Credentials):
+        def refresh(self, request):
+            super().refresh(request)
+            callback = getattr(self, "_on_refresh", None)
+            if callback is not None:
+                callback(self)
+
+    return PersistingCredentials
+
+
+class GoogleServicePool:
+    """
+    Per-user pool of Google credentials and API clients.
+
+    Credentials are built once per user and shared, so an access token is refreshed once and the
+    new token is handed to `on_refresh(owner, credentials)` to be written back to google_token.
+    API clients are built from the bundled discovery documents (parsed once per process) on an
+    AuthorizedHttp whose httplib2 connections are kept alive between calls. httplib2 is not
+    thread-safe, so clients are pooled per (user, api, thread).
+    """
+
+    def __init__(self, max_entries: int = 2000, on_refresh: Optional[Callable] = None):
+        self.max_entries = max_entries
+        self.on_refresh = on_refresh
+        self._credentials = OrderedDict()  # user key -> credentials
+        self._services = OrderedDict()  # (user key, api, version, thread) -> Resource
+        self._lock = threading.Lock()
+        self._credentials_cls = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(creds: dict, owner: Optional[str]) -> str:
+        return owner or creds.get("refresh_token") or creds.get("token")
+
+    def _persist(self, owner, credentials):
+        if owner is None or self.on_refresh is None:
+            return
+        try:
+            self.on_refresh(owner, credentials)
+            logger.info("Stored refreshed Google token for %s", owner)
+        except Exception as e:
+            logger.exception("Failed to store refreshed Google token for %s", owner)
+
+    def credentials(self, creds: dict, owner: Optional[str] = None):
+        """ Shared credentials for a user's stored google_token """
+        key = self._key(creds, owner)
+        with self._lock:
+            cached = self._credentials.get(key)
+            if cached is not None and cached.refresh_token == creds.get("refresh_token"):
+                self._credentials.move_to_end(key)
+                return cached
+            if self._credentials_cls is None:
+                self._credentials_cls = _credentials_class()
+            args = {k: v for k, v in creds.items() if k != "expiry"}
+            credential = self._credentials_cls(**args)
+            if creds.get("expiry"):
+                credential.expiry = datetime.fromisoformat(creds["expiry"]).replace(tzinfo=None) # google-auth wants naive UTC
+            credential._on_refresh = lambda c, owner=owner: self._persist(owner, c)
+            self._credentials[key] = credential
+            if cached is not None: # Reconnected with a new refresh token
+                self._drop_stale_services(key)
+            while len(self._credentials) > self.max_entries:
+                evicted, _ = self._credentials.popitem(last=False)
+                self._drop_stale_services(evicted)
+            return credential
+
+    def _drop_stale_services(self, key):
+        # Caller holds the lock
+        for service_key in [k for k in self._services if k[0] == key]:
+            del self._services[service_key]
+
+    def service(self, creds: dict, api: str, version: str, owner: Optional[str] = None):
+        """ A pooled API client for the user on the calling thread """
+        from googleapiclient.discovery import build_from_document
+        import google_auth_httplib2
+        import httplib2
+
+        credential = self.credentials(creds, owner)
+        key = (self._key(creds, owner), api, version, threading.get_ident())
+        with self._lock:
+            service = self._services.get(key)
+            if service is not None:
+                self._services.move_to_end(key)
+                self.hits += 1
+                return service
+            self.misses += 1
+        http = google_auth_httplib2.AuthorizedHttp(credential, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        service = build_from_document(_discovery_document(api, version), http=http)
+        with self._lock:
+            self._services[key] = service
+            while len(self._services) > self.max_entries:
+                self._services.popitem(last=False)
+        return service
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"credentials": len(self._credentials), "services": len(self._services), "hits": self.hits, "misses": self.misses}
+
+
+_pool = None
+
+def get_service_pool() -> GoogleServicePool:
+    """Initialize and return the process-wide Google service pool"""
+    global _pool
+    if _pool is None:
+        _pool = GoogleServicePool()
+    return _pool
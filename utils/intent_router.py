@@ -0,0 +1,159 @@
+import logging
+import re
+from typing import NamedTuple, Optional
+
+from rapidfuzz import fuzz
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Minimum whole-word rapidfuzz score (token_sort_ratio) for a listing or linking exemplar to count as a match.
+# Every word of the exemplar must also appear in the message, so near-misses like "what did i have"
+# or "what do you have" don't match "what do i have"
+MATCH_THRESHOLD = 85
+# Words at least this long may match an exemplar word with a typo ("calender")
+FUZZY_WORD_CHARS = 5
+FUZZY_WORD_SCORE = 85
+# Longer messages almost always carry details only the model can parse
+MAX_WORDS = 12
+
+# Messages answered by a timezone name alone, e.g. "EST" or "I'm on pacific time"
+TIMEZONE_WORDS = {
+    "est": "US/Eastern", "edt": "US/Eastern", "et": "US/Eastern", "eastern": "US/Eastern",
+    "cst": "US/Central", "cdt": "US/Central", "ct": "US/Central", "central": "US/Central",
+    "mst": "US/Mountain", "mdt": "US/Mountain", "mt": "US/Mountain", "mountain": "US/Mountain",
+    "pst": "US/Pacific", "pdt": "US/Pacific", "pt": "US/Pacific", "pacific": "US/Pacific",
+}
+TIMEZONE_FILLER = {"i", "im", "i'm", "am", "in", "on", "my", "timezone", "time", "zone", "is", "its", "it's", "the", "us", "standard", "daylight"}
+
+EXEMPLARS = {
+    "list_reminders": [
+        "what do i have",
+        "what do i need to do",
+        "what is on my plate",
+        "whats on my plate",
+        "what are my reminders",
+        "list my reminders",
+        "show my reminders",
+        "show me my reminders",
+        "what reminders do i have",
+        "my reminders",
+        "reminders",
+        "what is coming up",
+        "whats coming up",
+        "what do i have coming up",
+        "what is on my to do list",
+        "whats on my to do list",
+    ],
+    "list_calendar_events": [
+        "what is on my calendar",
+        "whats on my calendar",
+        "show my calendar",
+        "show me my calendar",
+        "what events do i have",
+        "list my events",
+        "list my calendar events",
+        "what meetings do i have",
+        "what does my calendar look like",
+        "what does my schedule look like",
+        "whats on my schedule",
+        "my calendar",
+    ],
+    "link_calendar_gmail": [
+        "link my calendar",
+        "link my google calendar",
+        "connect my calendar",
+        "connect my google calendar",
+        "link my gmail",
+        "connect my gmail",
+        "link calendar and gmail",
+        "connect google",
+        "link google",
+    ],
+}
+
+# Words that are dropped before matching because they don't change which listing is asked for
+FILLER = {"please", "today", "tonight", "tomorrow", "this", "week", "weekend", "next", "now", "again", "hey", "hi", "marley", "so", "up", "for", "can", "you", "could"}
+# Words that mean the message asks for a change, not a listing
+ACTION_WORDS = {"remind", "add", "delete", "remove", "stop", "cancel", "set", "create", "move", "change", "update", "dont", "don't", "email", "every"}
+# Words that turn a listing or linking phrase into its opposite ("no reminders", "dont link my calendar")
+NEGATIONS = {"no", "not", "dont", "don't", "never", "stop", "nothing", "none", "without", "cant", "can't", "wont", "won't"}
+NEGATED_LINK = re.compile(r"^(un|dis)(link|connect|sync)")
+
+_ALL = [(phrase, intent) for intent, phrases in EXEMPLARS.items() for phrase in phrases]
+
+
+class Route(NamedTuple):
+    tool_name: str
+    arguments: dict
+    score: float
+
+
+def _normalize(message: str) -> list:
+    text = (message or "").lower().replace("’", "'")
+    text = re.sub(r"what's", "whats", text)
+    return re.sub(r"[^a-z0-9'\s]", " ", text).split()
+
+
+def _core(words: list) -> list:
+    return [w for w in words if w not in FILLER]
+
+
+# Exemplars as the word lists they are matched on
+_CORES = [(_core(phrase.split()), intent) for phrase, intent in _ALL]
+
+
+def _negated(words: list) -> bool:
+    return any(w in NEGATIONS or NEGATED_LINK.match(w) for w in words)
+
+
+def _has_word(word: str, words: list) -> bool:
+    if word in words:
+        return True
+    return len(word) >= FUZZY_WORD_CHARS and any(fuzz.ratio(word, w) >= FUZZY_WORD_SCORE for w in words if len(w) >= FUZZY_WORD_CHARS)
+
+
+def _route_timezone(words: list) -> Optional[Route]:
+    zones = {TIMEZONE_WORDS[w] for w in words if w in TIMEZONE_WORDS}
+    if len(zones) != 1:
+        return None
+    if any(w not in TIMEZONE_WORDS and w not in TIMEZONE_FILLER for w in words):
+        return None
+    return Route("user_timezone", {"timezone": zones.pop()}, 100.0)
+
+
+def route(message: str) -> Optional[Route]:
+    """
+    Classify messages that don't need the model.
+
+    Returns the tool call the model would have made, or None when the message is ambiguous and
+    should go through create_response as before.
+    """
+    words = _normalize(message)
+    if not words or len(words) > MAX_WORDS:
+        return None
+
+    timezone = _route_timezone(words)
+    if timezone:
+        return timezone
+
+    if _negated(words): # Applies to link/connect phrasing too
+        return None
+    if any(w in ACTION_WORDS or w.isdigit() or w in ("am", "pm") for w in words):
+        # "link"/"connect" phrasing is allowed to mention gmail/email
+        if not any(w in ("link", "connect") for w in words):
+            return None
+    core = _core(words)
+    if not core:
+        return None
+
+    best = None
+    text = " ".join(core)
+    for exemplar, intent in _CORES:
+        if not all(_has_word(w, core) for w in exemplar):
+            continue
+        score = fuzz.token_sort_ratio(text, " ".join(exemplar))
+        if score >= MATCH_THRESHOLD and (best is None or score > best.score):
+            best = Route(intent, {}, score)
+    return best
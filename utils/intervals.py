@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pytz
+from dateutil.parser import isoparse
+
+
+def to_epoch(value: str, tz) -> int:
+    """ Seconds since the epoch for an ISO date or datetime. Naive values and all-day dates are in tz """
+    try:
+        dt = datetime.fromisoformat(value) # Much faster than isoparse for the RFC 3339 strings Google returns
+    except ValueError:
+        dt = isoparse(value)
+    if dt.tzinfo is None:
+        dt = tz.localize(dt)
+    return int(dt.timestamp())
+
+
+def _clock(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not value:
+        return None
+    hours, minutes = value.split(":")[:2]
+    return int(hours), int(minutes)
+
+
+class BusyIntervals:
+    """
+    A calendar's busy time as sorted, disjoint [start, end) intervals in epoch seconds.
+
+    Events are parsed once into NumPy int64 arrays and overlapping or touching events are
+    merged, so checking m candidate slots against n events is O((n + m) log n) with
+    searchsorted instead of re-parsing every event for every candidate.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, timezone: str = "US/Eastern", work_hours: Optional[dict] = None):
+        self.tz = pytz.timezone(timezone or "US/Eastern")
+        self.work_hours = work_hours if work_hours and work_hours.get("start") and work_hours.get("end") else None
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        if len(starts):
+            reach = np.maximum.accumulate(ends)
+            # A new block starts where an event begins after everything before it has ended
+            new_block = np.empty(len(starts), dtype=bool)
+            new_block[0] = True
+            new_block[1:] = starts[1:] > reach[:-1]
+            first = np.flatnonzero(new_block)
+            self.starts = starts[first]
+            self.ends = reach[np.append(first[1:] - 1, len(starts) - 1)]
+        else:
+            self.starts = np.empty(0, dtype=np.int64)
+            self.ends = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_events(cls, events: Iterable[Tuple[str, str, str]], timezone: str = "US/Eastern", work_hours: Optional[dict] = None) -> "BusyIntervals":
+        """
+        Args:
+            events: (start, end, summary) tuples as returned by list_calendar
+            timezone (str): The user's timezone, for naive times, all-day events and work hours
+            work_hours (dict): The profile's workHours, {"start": "HH:MM", "end": "HH:MM"}
+        """
+        tz = pytz.timezone(timezone or "US/Eastern")
+        pairs = [(to_epoch(start, tz), to_epoch(end, tz)) for start, end, *_ in events]
+        starts = np.fromiter((s for s, _ in pairs), dtype=np.int64, count=len(pairs))
+        ends = np.fromiter((e for _, e in pairs), dtype=np.int64, count=len(pairs))
+        return cls(starts, ends, timezone, work_hours)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def free_mask(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ For each [start, end) slot, whether it overlaps no busy interval """
+        n = len(self.starts)
+        if n == 0:
+            return np.ones(len(starts), dtype=bool)
+        # First busy interval ending after the slot starts; the slot is free if that one starts at or after the slot ends
+        idx = np.searchsorted(self.ends, starts, side="right")
+        return (idx >= n) | (self.starts[np.minimum(idx, n - 1)] >= ends)
+
+    def _work_window(self, day) -> Tuple[int, int]:
+        start, end = _clock(self.work_hours["start"]), _clock(self.work_hours["end"])
+        local = lambda hm: self.tz.localize(datetime(day.year, day.month, day.day, hm[0], hm[1]))
+        return int(local(start).timestamp()), int(local(end).timestamp())
+
+    def within_work_hours(self, start: int, end: int) -> bool:
+        if self.work_hours is None:
+            return True
+        day = datetime.fromtimestamp(start, self.tz).date()
+        window_start, window_end = self._work_window(day)
+        return window_start <= start and end <= window_end
+
+    def first_free(self, candidates: List[str], duration: timedelta = timedelta(hours=1)) -> Optional[datetime]:
+        """
+        The first candidate start time with `duration` free, inside work hours if the user set them.
+
+        Args:
+            candidates (list): ISO start times in order of preference; naive times are in the user's timezone
+
+        Returns:
+            datetime: The chosen start time in the user's timezone, or None if every candidate conflicts
+        """
+        if not candidates:
+            return None
+        starts = np.array([to_epoch(candidate, self.tz) for candidate in candidates], dtype=np.int64)
+        ends = starts + int(duration.total_seconds())
+        for i in np.flatnonzero(self.free_mask(starts, ends)):
+            if self.within_work_hours(int(starts[i]), int(ends[i])):
+                return datetime.fromtimestamp(int(starts[i]), self.tz)
+        return None
+
+    def _off_hours(self, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Time outside work hours between lo and hi, as intervals """
+        day = datetime.fromtimestamp(lo, self.tz).date() - timedelta(days=1)
+        windows = []
+        while True:
+            window = self._work_window(day)
+            windows.append(window)
+            if window[0] >= hi:
+                break
+            day += timedelta(days=1)
+        windows = np.array(windows, dtype=np.int64)
+        return windows[:-1, 1], windows[1:, 0] # From each day's end to the next day's start
+
+    def free_windows(self, range_start: datetime, range_end: datetime, min_duration: timedelta = timedelta(0)) -> List[Tuple[datetime, datetime]]:
+        """ Every free window of at least min_duration between range_start and range_end, inside work hours if set """
+        lo, hi = int(range_start.timestamp()), int(range_end.timestamp())
+        first = np.searchsorted(self.ends, lo, side="right")
+        last = np.searchsorted(self.starts, hi, side="left")
+        busy = self
+        if self.work_hours is not None: # Treat time outside work hours as busy
+            off_starts, off_ends = self._off_hours(lo, hi)
+            busy = BusyIntervals(np.concatenate((self.starts[first:last], off_starts)), np.concatenate((self.ends[first:last], off_ends)), self.tz.zone)
+            first, last = np.searchsorted(busy.ends, lo, side="right"), np.searchsorted(busy.starts, hi, side="left")
+        busy_starts, busy_ends = busy.starts[first:last], busy.ends[first:last]
+        gap_starts = np.maximum(np.concatenate(([lo], busy_ends)), lo)
+        gap_ends = np.minimum(np.concatenate((busy_starts, [hi])), hi)
+        keep = gap_ends - gap_starts >= max(int(min_duration.total_seconds()), 1)
+        return [(datetime.fromtimestamp(int(s), self.tz), datetime.fromtimestamp(int(e), self.tz)) for s, e in zip(gap_starts[keep], gap_ends[keep])]
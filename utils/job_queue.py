@@ -0,0 +1,144 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+
+class KeyedExecutor:
+    """
+    Bounded in-process job queue that serializes work per key.
+
+    Every key (a phone number) has its own pending deque and at most one worker handles a key at
+    a time, so jobs for one user never overlap while different users run fully in parallel.
+    Jobs for a key that arrive within `coalesce_window` seconds of each other are handed to
+    handler(key, items) together, capped at `max_wait` seconds after the first one. submit()
+    refuses new jobs once `max_depth` jobs are waiting so the webhook can push back.
+    """
+
+    def __init__(self, handler: Callable, workers: int = 8, max_depth: int = 500, coalesce_window: float = 0.0, max_wait: float = None):
+        self.handler = handler
+        self.max_depth = max_depth
+        self.coalesce_window = coalesce_window
+        self.max_wait = max_wait if max_wait is not None else 3 * coalesce_window
+        self._cond = threading.Condition()
+        self._pending = {}  # key -> deque of items
+        self._first_at = {}  # key -> arrival time of the oldest pending item
+        self._ready_at = {}  # key -> time the key may run
+        self._heap = []  # (ready time, key); stale when it doesn't match _ready_at
+        self._active = set()  # keys a worker is handling
+        self._depth = 0
+        self.processed = 0
+        self.batches = 0
+        self.failed = 0
+        self.rejected = 0
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"keyed-executor-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key: str, item) -> bool:
+        """ Queue item behind earlier work for key. Returns False if the queue is full """
+        now = time.monotonic()
+        with self._cond:
+            if self._depth >= self.max_depth:
+                self.rejected += 1
+                return False
+            self._depth += 1
+            self._pending.setdefault(key, deque()).append(item)
+            first = self._first_at.setdefault(key, now)
+            self._set_ready(key, min(now + self.coalesce_window, first + self.max_wait))
+        return True
+
+    def _set_ready(self, key, ready_at):
+        # Caller holds the condition. Keys being handled are rescheduled when their worker finishes
+        if key in self._active:
+            return
+        self._ready_at[key] = ready_at
+        heapq.heappush(self._heap, (ready_at, key))
+        self._cond.notify()
+
+    def _next_key(self):
+        # Caller holds the condition. Returns a ready key or waits for one
+        while True:
+            while self._heap and self._ready_at.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._cond.wait()
+                continue
+            ready_at, key = self._heap[0]
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            heapq.heappop(self._heap)
+            del self._ready_at[key]
+            return key
+
+    def _work(self):
+        while True:
+            with self._cond:
+                key = self._next_key()
+                items = list(self._pending.pop(key))
+                del self._first_at[key]
+                self._active.add(key)
+            try:
+                self.handler(key, items)
+                failed = False
+            except Exception as e:
+                logger.exception("Queued job for %s failed", key)
+                failed = True
+            with self._cond:
+                self._active.discard(key)
+                self._depth -= len(items)
+                self.processed += len(items)
+                self.batches += 1
+                self.failed += failed
+                if key in self._pending: # More arrived while this key was running
+                    self._set_ready(key, min(time.monotonic() + self.coalesce_window, self._first_at[key] + self.max_wait))
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "active_users": len(self._active),
+                "processed": self.processed,
+                "batches": self.batches,
+                "coalesced": self.processed - self.batches,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+
+class KeyedLock:
+    """ One lock per key, created on demand and dropped when nobody holds or waits for it """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # key -> [lock, users]
+
+    @contextmanager
+    def hold(self, key: str):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
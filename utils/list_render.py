@@ -0,0 +1,130 @@
+import logging
+import re
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+import pytz
+
+from .sms_stream import segment_count
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+REMINDERS_HEADER = "Here's what's on your plate!"
+CALENDAR_HEADER = "Here is what your next week will look like!"
+# Longest listing, in SMS segments; anything past it becomes "+N more"
+MAX_SEGMENTS = 6
+# Days ahead that are named by weekday alone ("Thu") rather than with their date
+WEEKDAY_ONLY = 6
+
+# Listing requests that want an answer about the items rather than the items themselves
+PROSE_CUES = re.compile(
+    r"\b(summar\w*|busiest|busy|free|how many|how much|when|which|should|why|explain|describe|"
+    r"prioriti\w*|most important|first|last|overview|advice|plan my|in a sentence|briefly)\b",
+    re.IGNORECASE)
+
+
+def wants_prose(message: str) -> bool:
+    """ Whether a listing request needs the model rather than a plain list """
+    return bool(PROSE_CUES.search(message or ""))
+
+
+def _local(value: str, tz) -> Tuple[datetime, bool]:
+    """ A stored or Calendar time in the user's timezone, and whether it was an all-day date """
+    if len(value) == 10: # All-day events are plain dates
+        return tz.localize(datetime.fromisoformat(value)), True
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = pytz.UTC.localize(dt) # All times in the database are UTC
+    return dt.astimezone(tz), False
+
+
+def _clock(dt: datetime) -> str:
+    return dt.strftime("%I:%M %p").lstrip("0")
+
+
+def day_label(day: date, today: date) -> str:
+    """ "Today", "Tomorrow", "Thu" within the next week, otherwise "Thu 11/06" """
+    offset = (day - today).days
+    if offset == 0:
+        return "Today"
+    if offset == 1:
+        return "Tomorrow"
+    if 1 < offset <= WEEKDAY_ONLY:
+        return day.strftime("%a")
+    return day.strftime("%a %m/%d")
+
+
+def render_schedule(header: str, items: List[Tuple[datetime, str]], empty: str, now: datetime, max_segments: int = MAX_SEGMENTS) -> str:
+    """
+    Lay out (local start, line) items under a header line per day, in start order.
+
+    Items are added while the text, with room for a "+N more" line, stays within
+    max_segments SMS segments.
+    """
+    if not items:
+        return empty
+    items = sorted(items, key=lambda item: item[0])
+    today = now.date()
+    lines = [header]
+    last_day = None
+    shown = 0
+    for start, line in items:
+        day = start.date()
+        added = ([day_label(day, today)] if day != last_day else []) + [f"  {line}"]
+        remaining = len(items) - shown - 1
+        footer = [f"+{remaining} more"] if remaining else []
+        if shown and segment_count("\n".join(lines + added + footer)) > max_segments:
+            break
+        lines += added
+        last_day = day
+        shown += 1
+    if shown < len(items):
+        lines.append(f"+{len(items) - shown} more")
+    return "\n".join(lines)
+
+
+def render_reminders(reminders: List[Tuple[str, str]], timezone: str = "US/Eastern", now: Optional[datetime] = None, max_segments: int = MAX_SEGMENTS) -> str:
+    """
+    Text for the (task, time) tuples from get_reminders.
+
+    Args:
+        reminders (list): (task, ISO time) tuples
+        timezone (str): The user's timezone
+
+    Returns:
+        str: Reminders grouped by day, e.g. "Tomorrow\\n  9:00 AM Submit essay"
+    """
+    tz = pytz.timezone(timezone or "US/Eastern")
+    now = (now or datetime.now(pytz.UTC)).astimezone(tz)
+    items = []
+    for task, time_str in reminders:
+        start, _ = _local(time_str, tz)
+        items.append((start, f"{_clock(start)} {task}"))
+    return render_schedule(REMINDERS_HEADER, items, "You have no upcoming reminders.", now, max_segments)
+
+
+def render_events(events: List[Tuple[str, str, str]], timezone: str = "US/Eastern", now: Optional[datetime] = None, max_segments: int = MAX_SEGMENTS) -> str:
+    """
+    Text for the (start, end, summary) tuples from list_calendar.
+
+    Args:
+        events (list): (start, end, summary) tuples; starts and ends are ISO datetimes, or dates for all-day events
+        timezone (str): The user's timezone
+
+    Returns:
+        str: Events grouped by day, e.g. "Thu\\n  2:00 PM-3:15 PM Chem lab"
+    """
+    tz = pytz.timezone(timezone or "US/Eastern")
+    now = (now or datetime.now(pytz.UTC)).astimezone(tz)
+    items = []
+    for start_str, end_str, summary in events:
+        start, all_day = _local(start_str, tz)
+        if all_day:
+            items.append((start, f"All day: {summary}"))
+            continue
+        end, _ = _local(end_str, tz) if end_str else (None, False)
+        span = _clock(start) if end is None else f"{_clock(start)}-{_clock(end)}" if end.date() == start.date() else f"{_clock(start)}-{end.strftime('%a')} {_clock(end)}"
+        items.append((start, f"{span} {summary}"))
+    return render_schedule(CALENDAR_HEADER, items, "Nothing on your calendar coming up.", now, max_segments)
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Output item fields callers read (tool call name and arguments, message text)
+ITEM_FIELDS = ("type", "id", "call_id", "name", "arguments")
+# Expired rows are swept from the disk tier once per this many writes
+SWEEP_EVERY = 1000
+
+
+def request_key(request: dict) -> str:
+    """ Hash of everything that shapes the output: model, instructions, input, tools and sampling options """
+    fields = {k: v for k, v in request.items() if k != "stream"}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _snapshot(response) -> dict:
+    """ The parts of a response callers use, as plain data """
+    output = [{field: getattr(item, field) for field in ITEM_FIELDS if getattr(item, field, None) is not None} for item in getattr(response, "output", None) or []]
+    return {"output_text": getattr(response, "output_text", "") or "", "output": output}
+
+
+def _reusable(response) -> bool:
+    """ Incomplete or failed responses are passed on but not cached """
+    return getattr(response, "status", None) in (None, "completed")
+
+
+def _response(snapshot: dict):
+    """ A response-shaped object for a cached snapshot. Items only carry the fields they had """
+    return SimpleNamespace(output_text=snapshot["output_text"], output=[SimpleNamespace(**item) for item in snapshot["output"]], usage=None, cached=True)
+
+
+class ResponseCache:
+    """
+    Cache for Responses API calls whose output is a pure function of the request.
+
+    Entries are keyed by request_key, expire after `ttl` seconds and are evicted least recently
+    used past `max_entries`. With `path` a SQLite file backs the in-memory tier, so entries
+    survive restarts and are shared by workers on the same disk. Concurrent identical requests
+    are coalesced: one caller makes the call and the rest wait for its result. Failed calls,
+    streamed calls and incomplete responses are never cached.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()  # key -> (expires at, snapshot)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.exception("Failed to open LLM cache at %s, using memory only", path)
+            self._db = None
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key: str, snapshot: dict, ttl: float):
+        # Caller holds the lock
+        self._entries[key] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        """ (snapshot, seconds left) from the disk tier """
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.exception("LLM cache read failed")
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1] - time.time()
+
+    def _disk_put(self, key: str, snapshot: dict, ttl: float):
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)", (key, json.dumps(snapshot), time.time() + ttl))
+                self._writes += 1
+                if self._writes % SWEEP_EVERY == 0:
+                    self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.exception("LLM cache write failed")
+
+    def create(self, client, ttl: Optional[float] = None, **request):
+        """
+        client.responses.create(**request), answered from the cache when an identical request was made before.
+
+        Args:
+            client: OpenAI client (or anything with responses.create)
+            ttl (float): Seconds to keep this response, instead of the cache's default
+            request: Arguments for responses.create
+
+        Returns:
+            The live response on a miss; a response-shaped copy with `cached` set on a hit
+        """
+        if request.get("stream"):
+            return client.responses.create(**request)
+        ttl = self.ttl if ttl is None else ttl
+        key = request_key(request)
+        with self._lock:
+            snapshot = self._lookup(key)
+            if snapshot is not None:
+                self.hits += 1
+                return _response(snapshot)
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return _response(future.result())
+
+        try:
+            found = self._disk_get(key)
+            if found is not None:
+                snapshot, left = found
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, snapshot, left)
+                future.set_result(snapshot)
+                return _response(snapshot)
+
+            with self._lock:
+                self.misses += 1
+            response = client.responses.create(**request)
+            snapshot = _snapshot(response)
+            if _reusable(response):
+                with self._lock:
+                    self._store(key, snapshot, ttl)
+                self._disk_put(key, snapshot, ttl)
+            future.set_result(snapshot)
+            return response
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round((self.hits + self.disk_hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                "errors": self.errors,
+                "evictions": self.evictions,
+                "inflight": len(self._inflight),
+                "disk": self._db is not None,
+            }
+
+
+class CachedClient:
+    """
+    OpenAI client stand-in whose responses.create goes through a ResponseCache.
+
+    Streamed requests pass straight through; everything else on the client is delegated.
+    """
+
+    def __init__(self, client, cache: ResponseCache, ttl: Optional[float] = None):
+        self.client = client
+        self.cache = cache
+        self.responses = SimpleNamespace(create=lambda **request: cache.create(client, ttl=ttl, **request))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+_response_cache = None
+
+def get_response_cache() -> ResponseCache:
+    """Initialize and return the process-wide LLM response cache"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", 2048)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+            path=os.getenv("LLM_CACHE_PATH") or None, # e.g. /tmp/llm_cache.sqlite to keep entries across restarts
+        )
+    return _response_cache
+
+
+def cached(client):
+    """ Wrap an OpenAI client in the process-wide cache, unless LLM_CACHE=0 """
+    if os.getenv("LLM_CACHE", "1") != "1" or client is None:
+        return client
+    return CachedClient(client, get_response_cache())
@@ -1,80 +1,155 @@
-import os
+import re
+from typing import Callable, List
+
+from .user_cache import get_user_cache
+from .llm_cache import cached
+from .clients import get_openai_client, get_twilio_client
 
 # Set up logging
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
-# Import OpenAI
-from openai import OpenAI
-_oclient = None
-def get_openai_client():
-    """Initialize and return the OpenAI client"""
-    global _oclient
-    if _oclient is None:
-        # Api key
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        _oclient = OpenAI(api_key=openai_api_key)
-    return _oclient
-
-# Get Twilio Client
-from twilio.rest import Client
-_tclient = None
-def get_twilio_client():
-    """Initialize and return the Twilio client"""
-    global _tclient
-    if _tclient is None:
-        # Api keys
-        twilio_sid = os.getenv("TWILIO_SID")
-        twilio_auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        _tclient = Client(twilio_sid, twilio_auth_token)
-    return _tclient
-
-
-def getSummary(db, user_number) -> str:
-    user_ref = db.collection("Users").document(user_number)
+
+# Bounds that keep the memory map and the prompt context small
+MAX_DAILY = 7           # Daily summaries kept before they are folded into a weekly one
+MAX_WEEKLY = 4          # Weekly summaries kept before the oldest is folded into long_term
+LONG_TERM_CHARS = 1200
+MAX_FACTS = 30
+FACT_CHARS = 200
+CONTEXT_CHARS = 2000
+
+FOLD_INSTRUCTIONS = "Combine these summaries of a user's text conversations into one short summary. Keep commitments, preferences and recurring plans; drop small talk."
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def _fact_key(fact: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", fact.lower()).strip()
+
+
+def merge_facts(facts: List[str], new_facts: List[str]) -> List[str]:
+    """
+    Add new facts, dropping duplicates by normalized text. A restated fact moves to the end, and
+    only the newest MAX_FACTS are kept.
+    """
+    merged = {}
+    for fact in list(facts or []) + list(new_facts or []):
+        if not isinstance(fact, str) or not fact.strip():
+            continue
+        key = _fact_key(fact)
+        merged.pop(key, None)
+        merged[key] = _truncate(fact, FACT_CHARS)
+    return list(merged.values())[-MAX_FACTS:]
+
+
+def fold_memory(memory: dict, summary: str, day: str, combine: Callable[[List[str]], str] = None) -> dict:
+    """
+    Add a day's summary and fold older summaries so the stored size stays bounded.
+
+    Args:
+        memory (dict): The user's current memory map
+        summary (str): Summary of the messages since the last watermark
+        day (str): Date of the summary (YYYY-MM-DD)
+        combine (callable): Merges a list of summaries into one; defaults to joining and truncating
+
+    Returns:
+        dict: New values for memory.daily, memory.weekly and memory.long_term (and an emptied
+              memory.summary once legacy summaries have been moved into long_term)
+    """
+    combine = combine or (lambda texts: " ".join(texts))
+    daily = list(memory.get("daily") or [])
+    weekly = list(memory.get("weekly") or [])
+    long_term = memory.get("long_term") or ""
+
+    # Summaries from before the daily/weekly layout count as long term memory
+    legacy = [text for text in memory.get("summary") or [] if isinstance(text, str)]
+    migrated = {"summary": []} if memory.get("summary") else {}
+    if legacy:
+        long_term = _truncate(combine([long_term] + legacy[-3:] if long_term else legacy[-3:]), LONG_TERM_CHARS)
+
+    if daily and daily[-1].get("date") == day: # Second run on the same day
+        daily[-1] = {"date": day, "text": combine([daily[-1]["text"], summary])}
+    else:
+        daily.append({"date": day, "text": summary})
+
+    if len(daily) > MAX_DAILY:
+        week = daily[:MAX_DAILY]
+        daily = daily[MAX_DAILY:]
+        weekly.append({"start": week[0]["date"], "end": week[-1]["date"], "text": combine([d["text"] for d in week])})
+
+    while len(weekly) > MAX_WEEKLY:
+        oldest = weekly.pop(0)
+        long_term = _truncate(combine([long_term, oldest["text"]] if long_term else [oldest["text"]]), LONG_TERM_CHARS)
+
+    return {"daily": daily, "weekly": weekly, "long_term": long_term, **migrated}
+
+
+def build_memory_context(user_dict: dict) -> str:
+    """ Short memory section for the request context (see prompt.request_context). Empty when nothing is stored """
+    memory = (user_dict or {}).get("memory") or {}
+    parts = []
+    if memory.get("facts"):
+        parts.append("Known facts about the user: " + "; ".join(memory["facts"]))
+    if memory.get("long_term"):
+        parts.append("Long term: " + memory["long_term"])
+    for week in memory.get("weekly") or []:
+        parts.append(f"Week of {week.get('start')}: {week.get('text')}")
+    for day in memory.get("daily") or []:
+        parts.append(f"{day.get('date')}: {day.get('text')}")
+    if not parts:
+        return ""
+    return "What you remember about this user:\n" + _truncate("\n".join(parts), CONTEXT_CHARS)
+
+
+def getSummary(db, user_number) -> List[str]:
+    """ The user's rolled-up summaries, oldest first """
     try:
-        user_dict = user_ref.get().to_dict().get("memory")
-        return user_dict["summary"]
+        memory = get_user_cache(db).get(user_number).get("memory")
+        summaries = [memory["long_term"]] if memory.get("long_term") else []
+        summaries += [week["text"] for week in memory.get("weekly") or []]
+        summaries += [day["text"] for day in memory.get("daily") or []]
+        return summaries
     except Exception as e:
         logger.exception("Failed to fetch summary from Firestore for user %s", user_number)
 
 
-def getFacts(db, user_number) -> str:
-    user_ref = db.collection("Users").document(user_number)
+def getFacts(db, user_number) -> List[str]:
     try:
-        user_dict = user_ref.get().to_dict().get("memory")
-        return user_dict["facts"]
+        user_dict = get_user_cache(db).get(user_number).get("memory")
+        return user_dict.get("facts") or []
     except Exception as e:
-        logger.exception("Failed to fetch summary from Firestore for user %s", user_number)
+        logger.exception("Failed to fetch facts from Firestore for user %s", user_number)
 
 
 def setSummary(db, user_ref, user_number, TwilioID):
-    # Summarize the recent messages
-    Tclient = get_twilio_client()
-    user = Tclient.conversations.v1.conversations(
-        TwilioID
-    ).messages.list(limit=10)
-    messages = []
-    for record in user:
-        messages.append(record.body)
-    logger.info("Summarizing %d messages from user: %s", len(messages), user_number)
-
-    Oclient = get_openai_client()
-    summary = Oclient.responses.create(
-        model="gpt-4o-mini",
-        instructions= "Summarize the user's messages.",
-        input= messages
-        )
-    Summary = summary.output_text
+    """ Summarize one user's new messages. user_ref is the user's document snapshot """
+    from .summarizer import SummaryEngine
+
+    try:
+        SummaryEngine(db, cached(get_openai_client()), get_twilio_client()).process_page([user_ref])
+    except Exception as e:
+        logger.exception("Error updating summary for user %s", user_number)
+
+
+async def setSummary_async(db, user_ref, user_number, TwilioID):
+    """ setSummary on the running event loop, with the loop's async OpenAI and Twilio clients """
+    from .summarizer import SummaryEngine
+
     try:
-        user_dict = user_ref.to_dict()
-        _summary = user_dict["memory"]["summary"]
-        update = _summary.append(Summary)
-        db.collection("Users").document(user_number).update({"memory.summary": update})
-        db.collection("Users").document(user_number).update({"memory.summarized": True})
+        await SummaryEngine(db, cached(get_openai_client()), get_twilio_client()).process_page_async([user_ref])
     except Exception as e:
         logger.exception("Error updating summary for user %s", user_number)
 
-def setFacts():
-    None
\ No newline at end of file
+
+def setFacts(db, user_number, facts: List[str]):
+    """ Merge facts into the user's memory """
+    try:
+        users = get_user_cache(db)
+        current = (users.get(user_number).get("memory") or {}).get("facts") or []
+        users.update(user_number, {"memory.facts": merge_facts(current, facts)})
+    except Exception as e:
+        logger.exception("Error updating facts for user %s", user_number)
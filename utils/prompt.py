@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+
+from .tools_instructions import tools
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Requests are laid out static-first so the provider's prompt cache can reuse the prefix:
+#   tools         - fixed schemas, one of a few fixed subsets picked by the user's state
+#   instructions  - fixed text, the same for every user
+#   input         - a developer message with the user's memory and the current date and time, then the user's message
+# Nothing user- or time-dependent may go into tools or instructions; it goes into request_context instead,
+# so prompt_cache_key, which hashes tools and instructions, is shared by every request with the same prefix.
+
+# Tools that need a linked Google account
+GOOGLE_TOOLS = {"parse_calendar_event", "list_calendar_events", "update_checkMail"}
+# Told to users without them, so the model offers to link rather than pretending to add events
+NOT_CONNECTED = "The user has not linked Google Calendar or Gmail. For calendar or email requests, offer to link them."
+
+_subsets: Dict[bool, List[dict]] = {}
+
+
+def tools_for(profile: Optional[dict]) -> List[dict]:
+    """
+    The tools worth offering a user, in the order of `tools`.
+
+    The same list object is returned for the same state, so the serialized schemas are
+    byte-identical across calls and workers.
+    """
+    connected = bool((profile or {}).get("googleConnected"))
+    if connected not in _subsets:
+        _subsets[connected] = [t for t in tools if connected or t["name"] not in GOOGLE_TOOLS]
+    return _subsets[connected]
+
+
+def time_context(timezone: Optional[str] = None, now: Optional[datetime] = None) -> str:
+    """ The current date and time in the user's timezone, for resolving "tomorrow", "in an hour", weekdays """
+    tz = pytz.timezone(timezone or "US/Eastern")
+    local = (now or datetime.now(pytz.UTC)).astimezone(tz)
+    return f"Current date and time: {local.strftime('%Y-%m-%d %H:%M')}, {local.strftime('%A')} (weekday {local.isoweekday()}), timezone {tz.zone}."
+
+
+def date_context(timezone: Optional[str] = None, now: Optional[datetime] = None) -> str:
+    """ Today's date in the user's timezone, for calls that only resolve days. Stays the same all day, so cached responses are reused """
+    tz = pytz.timezone(timezone or "US/Eastern")
+    local = (now or datetime.now(pytz.UTC)).astimezone(tz)
+    return f"Today's date: {local.strftime('%Y-%m-%d')}, {local.strftime('%A')} (weekday {local.isoweekday()}), timezone {tz.zone}."
+
+
+def request_context(profile: Optional[dict], now: Optional[datetime] = None, memory: str = "") -> str:
+    """ The dynamic suffix for a user's conversation turn: what we remember about them (stable between summaries, so first), then the time """
+    profile = profile or {}
+    context = time_context(profile.get("timezone"), now)
+    if not profile.get("googleConnected"):
+        context += " " + NOT_CONNECTED
+    return memory + "\n\n" + context if memory else context
+
+
+def cache_key(instructions: Optional[str], tool_list: Optional[List[dict]]) -> str:
+    """ Stable key for the static prefix, so requests that share it are routed to the same cache """
+    prefix = json.dumps([tool_list or [], instructions or ""], sort_keys=True)
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:32]
+
+
+def build_request(instructions: Optional[str], role: str, message, tool_list: Optional[List[dict]] = None, context: Optional[str] = None, model: str = "gpt-4.1") -> dict:
+    """
+    Responses API arguments with the static prefix first and the dynamic parts last.
+
+    Args:
+        instructions (str): Static instructions
+        role (str): Role of the message
+        message: The message content
+        tool_list (list): Tool schemas, from tools_for where they depend on the user
+        context (str): Dynamic text such as time_context, sent as a developer message before the message
+
+    Returns:
+        dict: Keyword arguments for responses.create
+    """
+    request_input = []
+    if context:
+        request_input.append({"role": "developer", "content": context})
+    request_input.append({"role": role, "content": message})
+    return dict(
+        instructions=instructions,
+        model=model,
+        input=request_input,
+        tools=tool_list,
+        prompt_cache_key=cache_key(instructions, tool_list),
+    )
+
+
+def log_usage(response, label: str = "response"):
+    """ Log the tokens a response used, and how many of the input tokens were served from the prompt cache """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "input_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) or 0
+    logger.info("OpenAI %s usage: input=%s (cached %s) output=%s", label, usage.input_tokens, cached, usage.output_tokens)
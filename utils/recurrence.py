@@ -0,0 +1,118 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pytz
+from dateutil.rrule import rrule, HOURLY, DAILY, WEEKLY, MONTHLY, MO, TU, WE, TH, FR, SA, SU
+
+from .reminder_store import parse_time
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {"hourly": HOURLY, "daily": DAILY, "weekly": WEEKLY, "monthly": MONTHLY}
+# parse_reminder_frequency numbers days of the week from 0 for Sunday
+WEEKDAYS = [SU, MO, TU, WE, TH, FR, SA]
+
+
+def _skip_periods(start: datetime, freq: int, interval: int, after: datetime) -> datetime:
+    """
+    Move a naive start forward by whole rule periods (keeping its time of day and weekday) to
+    just before `after`, computed directly rather than by stepping through every missed occurrence
+    """
+    if after <= start:
+        return start
+    if freq == MONTHLY:
+        months = (after.year - start.year) * 12 + after.month - start.month
+        skip = max(months // interval - 1, 0) * interval
+        month = start.month - 1 + skip
+        return start.replace(year=start.year + month // 12, month=month % 12 + 1, day=1) # The rule's bymonthday picks the day
+    period = {HOURLY: timedelta(hours=1), DAILY: timedelta(days=1), WEEKLY: timedelta(weeks=1)}[freq] * interval
+    return start + period * max((after - start) // period - 1, 0)
+
+
+def reminder_rule(frequency: dict, first: datetime, timezone: str = "US/Eastern", after: Optional[datetime] = None) -> Optional[rrule]:
+    """
+    The recurrence of a reminder as a dateutil rrule.
+
+    Daily and longer rules run in the user's local wall time, so a 9:00 reminder stays at 9:00
+    across DST changes; hourly rules run in UTC. Days of the week come from the reminder's own
+    start rather than today's weekday, and "monthly" is a calendar month, falling back to the
+    month's last day when the reminder's day doesn't exist (e.g. the 31st in April).
+
+    Args:
+        frequency (dict): parse_reminder_frequency arguments: time_unit, how_often, days_of_week
+        first (datetime): The reminder's first (or current) occurrence, timezone-aware
+        timezone (str): The user's timezone
+        after (datetime): If given, the rule starts at the last whole period before this, so
+            reminders far behind cost the same to advance as recent ones
+
+    Returns:
+        rrule: Naive datetimes, in local time for daily and longer rules and UTC for hourly, or None if the frequency is unusable
+    """
+    freq = FREQUENCIES.get((frequency or {}).get("time_unit"))
+    if freq is None:
+        return None
+    interval = max(int(frequency.get("how_often") or 1), 1)
+    days = frequency.get("days_of_week")
+    tz = pytz.UTC if freq == HOURLY else pytz.timezone(timezone or "US/Eastern")
+    start = first.astimezone(tz).replace(tzinfo=None)
+    if freq == WEEKLY and days:
+        interval = 1 # Several days a week means every week on those days, as parse_reminder_frequency sets how_often to the count
+    skipped = _skip_periods(start, freq, interval, after.astimezone(tz).replace(tzinfo=None)) if after else start
+
+    if freq == WEEKLY and days:
+        return rrule(WEEKLY, byweekday=[WEEKDAYS[d % 7] for d in days], dtstart=skipped)
+    if freq == MONTHLY:
+        monthday = (start.day, -1) if start.day > 28 else start.day
+        return rrule(MONTHLY, interval=interval, bymonthday=monthday, bysetpos=1 if start.day > 28 else None, dtstart=skipped)
+    return rrule(freq, interval=interval, dtstart=skipped)
+
+
+def reminder_timezone(reminder: dict, users: dict) -> str:
+    """ The timezone a reminder recurs in: its own, else its user's profile timezone (reminders added before it was stored) """
+    user = users.get(reminder.get("user_number")) or {}
+    return reminder.get("timezone") or (user.get("profile") or {}).get("timezone") or "US/Eastern"
+
+
+def _to_utc(local: datetime, hourly: bool, tz) -> datetime:
+    if hourly:
+        return pytz.UTC.localize(local)
+    return tz.normalize(tz.localize(local)).astimezone(pytz.UTC) # normalize moves times skipped by DST forward
+
+
+def next_occurrences(frequency: dict, time_str: str, timezone: str = "US/Eastern", after: Optional[datetime] = None, count: int = 1) -> List[str]:
+    """
+    The next `count` occurrences of a recurring reminder strictly after `after` (default now).
+
+    Args:
+        frequency (dict): The reminder's stored frequency
+        time_str (str): The reminder's stored UTC time
+        timezone (str): The user's timezone
+
+    Returns:
+        list: UTC ISO times, in the same format standardize_time stores
+    """
+    tz = pytz.timezone(timezone or "US/Eastern")
+    after = after or datetime.now(pytz.UTC)
+    rule = reminder_rule(frequency, parse_time(time_str), tz.zone, after)
+    if rule is None:
+        return []
+    hourly = frequency.get("time_unit") == "hourly"
+    local_after = after.astimezone(pytz.UTC if hourly else tz).replace(tzinfo=None)
+    occurrences = []
+    # A couple of spare occurrences, since local times repeated when clocks fall back can land before `after`
+    for local in rule.xafter(local_after, count=count + 2, inc=False):
+        occurrence = _to_utc(local, hourly, tz)
+        if occurrence > after:
+            occurrences.append(occurrence.replace(second=0, microsecond=0).isoformat())
+            if len(occurrences) == count:
+                break
+    return occurrences
+
+
+def next_occurrence(frequency: dict, time_str: str, timezone: str = "US/Eastern", after: Optional[datetime] = None) -> Optional[str]:
+    """ The first occurrence after `after` (default now), or None if the frequency is unusable """
+    occurrences = next_occurrences(frequency, time_str, timezone, after, 1)
+    return occurrences[0] if occurrences else None
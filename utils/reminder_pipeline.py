@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from . import scheduler
+from .clients import send_text_async
+from .recurrence import next_occurrence, reminder_timezone
+from .reminder_store import time_fields
+from .reminder_text import ReminderTextEngine
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Firestore limits a WriteBatch to 500 writes
+MAX_BATCH_WRITES = 500
+# Keys per get_all call
+LOOKUP_CHUNK = 300
+
+
+class StageStats:
+    """ Thread-safe item, error and time counters for one pipeline stage """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def record(self, seconds: float, items: int = 1, errors: int = 0):
+        with self._lock:
+            self.items += items
+            self.errors += errors
+            self.seconds += seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "items": self.items,
+                "errors": self.errors,
+                "seconds": round(self.seconds, 4),
+                "per_second": round(self.items / self.seconds, 2) if self.seconds else 0.0,
+            }
+
+
+class ReminderPipeline:
+    """
+    Sends a batch of due reminders in four overlapping stages:
+
+        compose  - reminder text per unique task through the ReminderTextEngine, at most
+                   `openai_concurrency` calls in flight. Recurring reminders reuse the text
+                   stored on their document the first time they fired
+        lookup   - users from the UserCache, with one get_all for the misses, in parallel
+                   with compose
+        send     - Twilio sends as soon as a reminder's text and user are ready, at most
+                   `twilio_concurrency` in flight
+        write    - non-recurring reminders marked Completed, and new recurring reminder text
+                   stored, through WriteBatches of up to 500. With `advance_recurring`,
+                   recurring reminders are moved to their next occurrence in the same
+                   write, so they never fall behind and need the /update_recurring sweep
+
+    run() works through bounded thread pools on the sync clients. run_async() does the same on
+    the running event loop: compose and send are coroutines on the async OpenAI and Twilio
+    clients, held to their concurrency limits (see utils.clients), so hundreds of reminders in
+    flight add no threads; lookups and writes stay on the sync Firestore client in one worker thread.
+
+    Clients are passed in so the pipeline can be benchmarked against in-memory fakes.
+    """
+
+    STAGES = ("compose", "lookup", "send", "write")
+
+    def __init__(self, db, openai_client, twilio_client, openai_concurrency: int = 16, twilio_concurrency: int = 32, text_engine: ReminderTextEngine = None, user_cache=None, advance_recurring: bool = False,
+                 async_openai_client=None, async_twilio_client=None):
+        self.db = db
+        self.advance_recurring = advance_recurring
+        self.user_cache = user_cache
+        self.twilio_client = twilio_client
+        self.async_openai_client = async_openai_client  # None uses the running loop's clients from utils.clients
+        self.async_twilio_client = async_twilio_client
+        self.text_engine = text_engine or ReminderTextEngine(openai_client)
+        self._compose_pool = ThreadPoolExecutor(max_workers=openai_concurrency, thread_name_prefix="reminder-compose")
+        self._send_pool = ThreadPoolExecutor(max_workers=twilio_concurrency, thread_name_prefix="reminder-send")
+        self._lookup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reminder-lookup")
+        self.stats = {stage: StageStats() for stage in self.STAGES}
+
+    def compose(self, task: str) -> str:
+        """ Create the reminder text for a task """
+        return self.text_engine.text_for(task)
+
+    def _timed_compose(self, task: str) -> str:
+        start = time.perf_counter()
+        try:
+            text = self.compose(task)
+        except Exception as e:
+            self.stats["compose"].record(time.perf_counter() - start, errors=1)
+            raise
+        self.stats["compose"].record(time.perf_counter() - start)
+        return text
+
+    async def _timed_compose_async(self, task: str) -> str:
+        start = time.perf_counter()
+        try:
+            text = await self.text_engine.text_for_async(task, self.async_openai_client)
+        except Exception as e:
+            self.stats["compose"].record(time.perf_counter() - start, errors=1)
+            raise
+        self.stats["compose"].record(time.perf_counter() - start)
+        return text
+
+    def lookup_users(self, numbers: List[str]) -> Dict[str, dict]:
+        """ Fetch user documents with batched get_all calls. Returns {phone number: user dict} """
+        start = time.perf_counter()
+        numbers = list(numbers)
+        if self.user_cache is not None:
+            users = self.user_cache.get_many(numbers)
+            self.stats["lookup"].record(time.perf_counter() - start, items=len(numbers))
+            return users
+        users = {}
+        for i in range(0, len(numbers), LOOKUP_CHUNK):
+            refs = [self.db.collection("Users").document(f"{number}") for number in numbers[i:i + LOOKUP_CHUNK]]
+            for snapshot in self.db.get_all(refs):
+                if snapshot.exists:
+                    users[snapshot.id] = snapshot.to_dict()
+        self.stats["lookup"].record(time.perf_counter() - start, items=len(numbers))
+        return users
+
+    def send(self, twilio_id: str, body: str):
+        start = time.perf_counter()
+        try:
+            self.twilio_client.conversations.v1.conversations(
+                twilio_id
+            ).messages.create(
+                body=body
+            )
+        except Exception as e:
+            self.stats["send"].record(time.perf_counter() - start, errors=1)
+            raise
+        self.stats["send"].record(time.perf_counter() - start)
+
+    async def send_async(self, twilio_id: str, body: str):
+        start = time.perf_counter()
+        try:
+            await send_text_async(twilio_id, body, client=self.async_twilio_client)
+        except Exception as e:
+            self.stats["send"].record(time.perf_counter() - start, errors=1)
+            raise
+        self.stats["send"].record(time.perf_counter() - start)
+
+    def write_updates(self, updates: List[tuple]):
+        """ Apply (reminder id, fields) updates with as few batched commits as possible """
+        start = time.perf_counter()
+        for i in range(0, len(updates), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for reminder_id, fields in updates[i:i + MAX_BATCH_WRITES]:
+                batch.update(self.db.collection("Reminders").document(reminder_id), fields)
+            batch.commit()
+        self.stats["write"].record(time.perf_counter() - start, items=len(updates))
+
+    def advance(self, fired: List[tuple], users: Dict[str, dict]) -> List[tuple]:
+        """ (reminder id, next time) for each fired recurring reminder, in the reminder's or user's timezone """
+        advanced = []
+        for reminder_id, d in fired:
+            if d.get("recurring") != True:
+                continue
+            time_new = next_occurrence(d.get("frequency"), d.get("time"), reminder_timezone(d, users))
+            if time_new:
+                advanced.append((reminder_id, time_new))
+        return advanced
+
+    @staticmethod
+    def _split(reminders: List[tuple]):
+        """ Group reminders by task to compose once per unique task, skipping those that already have their text stored """
+        by_task = {}
+        ready = []
+        for reminder_id, d in reminders:
+            if d.get("message"):
+                ready.append((reminder_id, d, d["message"]))
+            else:
+                by_task.setdefault(d.get("task"), []).append((reminder_id, d))
+        return by_task, ready
+
+    def run(self, events) -> int:
+        """ Send every reminder snapshot in `events`. Returns the number of messages sent """
+        reminders = [(event.id, event.to_dict()) for event in events]
+        if not reminders:
+            return 0
+
+        numbers = {d.get("user_number") for _, d in reminders}
+        users_future = self._lookup_pool.submit(self.lookup_users, numbers)
+
+        by_task, ready = self._split(reminders)
+        text_futures = {self._compose_pool.submit(self._timed_compose, task): task for task in by_task}
+
+        users = users_future.result()
+        send_futures = {}
+        composed = []
+        updates = []
+
+        def submit_send(reminder_id, d, body):
+            composed.append((reminder_id, d))
+            number = d.get("user_number")
+            user_dict = users.get(number)
+            if user_dict is None:
+                logger.warning("Failed to find Firestore document for user %s", number)
+                return
+            send_futures[self._send_pool.submit(self.send, user_dict.get("twilio_ID"), body)] = (reminder_id, d)
+
+        for reminder_id, d, body in ready:
+            submit_send(reminder_id, d, body)
+        for future in as_completed(text_futures):
+            task = text_futures[future]
+            try:
+                body = future.result()
+            except Exception as e:
+                logger.exception("Failed to generate reminder text for task %s", task)
+                continue
+            for reminder_id, d in by_task[task]:
+                if d.get("recurring") == True: # Store the text so later occurrences reuse it
+                    updates.append((reminder_id, {"message": body}))
+                submit_send(reminder_id, d, body)
+
+        sent = 0
+        for future in as_completed(send_futures):
+            reminder_id, d = send_futures[future]
+            try:
+                future.result()
+                sent += 1
+            except Exception as e:
+                logger.exception("Failed to send message to %s via Twilio", d.get("user_number"))
+        return self._finish(reminders, composed, users, updates, sent)
+
+    async def run_async(self, events) -> int:
+        """ run() on the running event loop. Returns the number of messages sent """
+        reminders = [(event.id, event.to_dict()) for event in events]
+        if not reminders:
+            return 0
+
+        numbers = {d.get("user_number") for _, d in reminders}
+        users_future = asyncio.ensure_future(asyncio.to_thread(self.lookup_users, numbers))
+        by_task, ready = self._split(reminders)
+        composed = []
+        updates = []
+
+        async def deliver(reminder_id, d, body) -> int:
+            composed.append((reminder_id, d))
+            number = d.get("user_number")
+            user_dict = (await users_future).get(number)
+            if user_dict is None:
+                logger.warning("Failed to find Firestore document for user %s", number)
+                return 0
+            try:
+                await self.send_async(user_dict.get("twilio_ID"), body)
+                return 1
+            except Exception as e:
+                logger.exception("Failed to send message to %s via Twilio", number)
+                return 0
+
+        async def compose_and_deliver(task, items) -> int:
+            try:
+                body = await self._timed_compose_async(task)
+            except Exception as e:
+                logger.exception("Failed to generate reminder text for task %s", task)
+                return 0
+            for reminder_id, d in items:
+                if d.get("recurring") == True: # Store the text so later occurrences reuse it
+                    updates.append((reminder_id, {"message": body}))
+            return sum(await asyncio.gather(*(deliver(reminder_id, d, body) for reminder_id, d in items)))
+
+        counts = await asyncio.gather(*(deliver(*item) for item in ready), *(compose_and_deliver(task, items) for task, items in by_task.items()))
+        users = await users_future
+        return await asyncio.to_thread(self._finish, reminders, composed, users, updates, sum(counts))
+
+    def _finish(self, reminders: List[tuple], composed: List[tuple], users: Dict[str, dict], updates: List[tuple], sent: int) -> int:
+        """ Write the status, text and next-occurrence updates for the reminders that were composed """
+        # Set expired non-recurring reminder status to be completed
+        updates.extend((reminder_id, {"status": "Completed"}) for reminder_id, d in composed if d.get("recurring") == False)
+        advanced = self.advance(composed, users) if self.advance_recurring else []
+        updates.extend((reminder_id, time_fields(time_new)) for reminder_id, time_new in advanced)
+        if updates:
+            self.write_updates(updates)
+        for reminder_id, time_new in advanced:
+            scheduler.notify_scheduled(reminder_id, time_new)
+
+        logger.info("Reminder pipeline sent %d of %d reminders: %s", sent, len(reminders), self.snapshot_stats())
+        return sent
+
+    def snapshot_stats(self) -> Dict[str, Dict[str, float]]:
+        """ Per-stage counters since the pipeline was created """
+        stats = {stage: stats.as_dict() for stage, stats in self.stats.items()}
+        stats["text"] = {"hits": self.text_engine.hits, "misses": self.text_engine.misses, "llm_calls": self.text_engine.llm_calls}
+        return stats
@@ -0,0 +1,120 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import pytz
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from .checkpoints import load_checkpoint, save_checkpoint, finish_checkpoint
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Reminder documents keep the user-facing "time" string and also carry:
+#   fire_at - the same instant as a Firestore timestamp, so range queries compare instants rather
+#             than ISO strings, which sort wrongly across offsets ("+00:00", "Z", "-04:00")
+#   bucket  - the UTC hour it fires in ("2026-10-17T16"), so the scheduler reads its window with
+#             an "in" query on a few buckets instead of a range scan over time
+# The composite indexes these queries need are declared in firestore.indexes.json.
+BUCKET_FORMAT = "%Y-%m-%dT%H"
+BUCKET = timedelta(hours=1)
+# Firestore allows up to 30 values in an "in" filter
+MAX_IN_VALUES = 30
+# Firestore limits a WriteBatch to 500 writes
+MAX_BATCH_WRITES = 500
+JOB = "migrate_reminders"
+
+
+def parse_time(time_str: str) -> datetime:
+    """ Parse a stored reminder time. Naive times are UTC, as all times in the database are """
+    dt = datetime.fromisoformat(time_str.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=pytz.UTC)
+    return dt.astimezone(pytz.UTC)
+
+
+def bucket_for(fire_at: datetime) -> str:
+    return fire_at.astimezone(pytz.UTC).strftime(BUCKET_FORMAT)
+
+
+def buckets_between(start: datetime, end: datetime) -> List[str]:
+    """ Every bucket overlapping [start, end) """
+    current = start.astimezone(pytz.UTC).replace(minute=0, second=0, microsecond=0)
+    buckets = []
+    while current < end:
+        buckets.append(bucket_for(current))
+        current += BUCKET
+    return buckets
+
+
+def time_fields(time_str: str) -> Dict[str, object]:
+    """ The fields to write whenever a reminder's time is set or moved """
+    fire_at = parse_time(time_str)
+    return {"time": time_str, "fire_at": fire_at, "bucket": bucket_for(fire_at)}
+
+
+def pending_in_window(db, start: datetime, end: datetime) -> List:
+    """ Pending reminders firing in [start, end), read bucket by bucket. The fire_at range trims the partial first and last buckets on the server """
+    buckets = buckets_between(start, end)
+    snapshots = []
+    for i in range(0, len(buckets), MAX_IN_VALUES):
+        query = (db.collection("Reminders")
+                 .where(filter=FieldFilter("status", "==", "Pending"))
+                 .where(filter=FieldFilter("bucket", "in", buckets[i:i + MAX_IN_VALUES]))
+                 .where(filter=FieldFilter("fire_at", ">=", start))
+                 .where(filter=FieldFilter("fire_at", "<", end)))
+        snapshots.extend(query.stream())
+    return snapshots
+
+
+def migrate_reminders(db, page_size: int = MAX_BATCH_WRITES, max_seconds: float = None) -> dict:
+    """
+    Add fire_at and bucket to reminders written before they existed, resuming from the last checkpoint.
+
+    Pages through every reminder by document ID and rewrites the ones whose fields are missing or
+    disagree with "time", one WriteBatch per page. Safe to run repeatedly.
+
+    Args:
+        max_seconds (float): Stop after the page that crosses this budget; the next run resumes
+
+    Returns:
+        dict: Counters for this run, with "finished" set when every reminder was checked
+    """
+    start = time.monotonic()
+    checkpoint = load_checkpoint(db, JOB) or {}
+    cursor = checkpoint.get("cursor")
+    stats = {"checked": checkpoint.get("checked", 0), "migrated": checkpoint.get("migrated", 0), "unparseable": checkpoint.get("unparseable", 0)}
+    while True:
+        query = db.collection("Reminders").order_by("__name__").limit(page_size)
+        if cursor:
+            query = query.start_after({"__name__": cursor})
+        page = list(query.stream())
+        if not page:
+            finish_checkpoint(db, JOB, **stats)
+            logger.info("Reminder migration finished: %s", stats)
+            return {**stats, "finished": True}
+
+        batch = db.batch()
+        writes = 0
+        for snapshot in page:
+            d = snapshot.to_dict()
+            try:
+                fields = time_fields(d.get("time"))
+            except (TypeError, ValueError, AttributeError):
+                stats["unparseable"] += 1
+                logger.warning("Reminder %s has an unparseable time: %r", snapshot.id, d.get("time"))
+                continue
+            if d.get("fire_at") != fields["fire_at"] or d.get("bucket") != fields["bucket"]:
+                batch.update(snapshot.reference, {"fire_at": fields["fire_at"], "bucket": fields["bucket"]})
+                writes += 1
+        if writes:
+            batch.commit()
+        cursor = page[-1].id
+        stats["checked"] += len(page)
+        stats["migrated"] += writes
+        save_checkpoint(db, JOB, cursor, **stats)
+        if max_seconds is not None and time.monotonic() - start >= max_seconds:
+            logger.info("Reminder migration paused after %s: %s", cursor, stats)
+            return {**stats, "finished": False}
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .clients import create_response_async
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+REMINDER_INSTRUCTIONS = "Create a friendly reminder for the task the user enters. Keep it brief and keep the name of the reminder relatively the same. Do not say tell the user to set a reminder. Simply, remind them."
+
+# Templates for tasks that start with a verb ("call Mom") and for everything else ("dentist appointment")
+ACTION_TEMPLATES = [
+    "Hey! Just a reminder to {task}.",
+    "Friendly reminder: time to {task}!",
+    "Don't forget to {task}!",
+    "Quick reminder to {task}.",
+]
+ITEM_TEMPLATES = [
+    "Reminder: {task}!",
+    "Hey! Just a reminder about {task}.",
+    "Don't forget: {task}!",
+    "Heads up: {task}.",
+]
+
+ACTION_VERBS = {
+    "attend", "ask", "bring", "book", "buy", "call", "cancel", "check", "clean", "do", "drink", "eat",
+    "email", "feed", "fill", "finish", "fix", "get", "go", "grab", "leave", "make", "meet", "message",
+    "order", "pack", "pay", "pick", "prepare", "print", "read", "register", "renew", "reply", "respond",
+    "return", "review", "schedule", "send", "sign", "start", "study", "submit", "take", "text", "turn",
+    "update", "wake", "walk", "wash", "water", "work", "write",
+}
+
+# First person words swapped for second person when the task is echoed back
+PRONOUNS = {"my": "your", "me": "you", "i": "you", "mine": "yours", "myself": "yourself", "i'm": "you're"}
+
+_WORD = re.compile(r"[A-Za-z']+")
+
+
+def normalize_task(task: str) -> str:
+    """ Normalize task text into a cache key: lowercase, no punctuation, single spaces, no leading 'to' """
+    words = re.sub(r"[^\w\s']", " ", (task or "").lower()).split()
+    if words and words[0] == "to":
+        words = words[1:]
+    return " ".join(words)
+
+
+def task_key(task: str) -> str:
+    """ Content address for a task's phrasing """
+    return hashlib.sha256(normalize_task(task).encode("utf-8")).hexdigest()
+
+
+def _second_person(task: str) -> str:
+    return _WORD.sub(lambda m: PRONOUNS.get(m.group(0).lower(), m.group(0)), task)
+
+
+def render_template(task: str) -> str:
+    """ Deterministic reminder text. The same task always gets the same template """
+    cleaned = re.sub(r"^\s*(remind me )?(to )?", "", (task or "").strip(), flags=re.IGNORECASE).rstrip(" .!")
+    if not cleaned:
+        return "Hey! Just a reminder."
+    cleaned = _second_person(cleaned)
+    if normalize_task(cleaned).split(" ", 1)[0] in ACTION_VERBS:
+        templates = ACTION_TEMPLATES
+        cleaned = cleaned[0].lower() + cleaned[1:]
+    else:
+        templates = ITEM_TEMPLATES
+    index = int(task_key(task)[:8], 16) % len(templates)
+    return templates[index].format(task=cleaned)
+
+
+class ReminderTextEngine:
+    """
+    Produces the text sent when a reminder fires.
+
+    Lookups go through an in-memory LRU keyed by task_key, then a deterministic template. The
+    gpt-4o-mini rephrasing is only used when `use_llm` is set (REMINDER_TEXT_LLM=1), and falls
+    back to the template if the call fails. text_for_async does the same on an event loop with
+    the async OpenAI client.
+    """
+
+    def __init__(self, openai_client=None, use_llm: Optional[bool] = None, max_entries: int = 10000):
+        self.openai_client = openai_client
+        if use_llm is None:
+            use_llm = os.getenv("REMINDER_TEXT_LLM", "0") == "1"
+        self.use_llm = use_llm and openai_client is not None
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.llm_calls = 0
+
+    @staticmethod
+    def _request(task: str) -> dict:
+        return dict(
+            model="gpt-4o-mini",
+            instructions=REMINDER_INSTRUCTIONS,
+            input=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "input_text",
+                            "text": f"{task}"
+                        }
+                    ]
+                }
+            ],
+            temperature=0.35
+        )
+
+    def _generate(self, task: str) -> str:
+        if self.use_llm:
+            try:
+                self.llm_calls += 1
+                return self.openai_client.responses.create(**self._request(task)).output_text
+            except Exception as e:
+                logger.exception("Failed to generate reminder with OpenAI, using template")
+        return render_template(task)
+
+    async def _generate_async(self, task: str, openai_client=None) -> str:
+        if self.use_llm:
+            try:
+                self.llm_calls += 1
+                return (await create_response_async(client=openai_client, **self._request(task))).output_text
+            except Exception as e:
+                logger.exception("Failed to generate reminder with OpenAI, using template")
+        return render_template(task)
+
+    def _cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        return None
+
+    def _store(self, key: str, text: str):
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def text_for(self, task: str) -> str:
+        """ Return the reminder text for a task, generating it at most once per normalized task """
+        key = task_key(task)
+        text = self._cached(key)
+        if text is None:
+            text = self._generate(task)
+            self._store(key, text)
+        return text
+
+    async def text_for_async(self, task: str, openai_client=None) -> str:
+        """ text_for on the running event loop. The model call goes through `openai_client`, an AsyncOpenAI client (the loop's by default) """
+        key = task_key(task)
+        text = self._cached(key)
+        if text is None:
+            text = await self._generate_async(task, openai_client)
+            self._store(key, text)
+        return text
@@ -3,50 +3,42 @@ from google.cloud.firestore_v1.base_query import FieldFilter
 from rapidfuzz import fuzz 
 from datetime import datetime, timedelta
 import pytz
-from openai import OpenAI
-from twilio.rest import Client
 import os
+import time
 from typing import List, Tuple
 
 from . import time_utils
+from . import scheduler
+from .recurrence import next_occurrence, reminder_timezone
+from .reminder_pipeline import ReminderPipeline, MAX_BATCH_WRITES
+from .reminder_store import time_fields
+from .checkpoints import load_checkpoint, save_checkpoint, finish_checkpoint
+from .user_cache import get_user_cache
+from .llm_cache import cached
+from .clients import get_openai_client, get_twilio_client, run_async
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
-_oclient = None
-_tclient = None
-
-def get_openai_client():
-    """Initialize and return the OpenAI client"""
-    global _oclient
-    if _oclient is None:
-        # Api key
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        _oclient = OpenAI(api_key=openai_api_key)
-    return _oclient
-
-def get_twilio_client():
-    """Initialize and return the Twilio client"""
-    global _tclient
-    if _tclient is None:
-        # Api keys
-        twilio_sid = os.getenv("TWILIO_SID")
-        twilio_auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        _tclient = Client(twilio_sid, twilio_auth_token)
-    return _tclient
+_pipeline = None
+
+RECURRING_JOB = "update_recurring"
 
 def add_reminder(user_number, db, task, date, time, timezone, recurring=False, frequency=None) -> int:
     reminder_ref = db.collection("Reminders").document()
     try:
+        reminder_time = time_utils.standardize_time(date, time, timezone)
         reminder_ref.set({
             "user_number": user_number,
             "task": task,
-            "time": time_utils.standardize_time(date, time, timezone), 
+            **time_fields(reminder_time),
             "recurring": recurring,
             "frequency": frequency,
+            "timezone": timezone, # Recurrences keep their local time across DST
             "status": "Pending"
         })
+        scheduler.notify_scheduled(reminder_ref.id, reminder_time)
         logger.info("Added reminder for %s: %s at %s", user_number, task, time)
         return 1
     except Exception as e:
@@ -63,12 +55,13 @@ def delete_reminder(user_number, db, user_task, date=None, time=None):
         if fuzz.ratio(task, user_task) > 50 or task.lower() in user_task.lower() or user_task.lower() in task.lower():
             logger.info("Setting %s to be completed", task)
             to_delete_ref.document(event.id).update({"status": "Completed"})
+            scheduler.notify_removed(event.id)
 
 def get_reminders(user_number, db, timezone='US/Eastern') -> List[Tuple[str, str]]:
     if not timezone:
         timezone = "US/Eastern"
-    now = datetime.now(pytz.UTC).replace(second=0, microsecond=0).isoformat() # Don't change. All times in database is utc
-    reminders = db.collection("Reminders").where(filter=FieldFilter("user_number", "==", user_number)).where(filter=FieldFilter("time", ">=", now)).where(filter=FieldFilter("status", "==", "Pending")).order_by("time").stream()
+    now = datetime.now(pytz.UTC).replace(second=0, microsecond=0)
+    reminders = db.collection("Reminders").where(filter=FieldFilter("user_number", "==", user_number)).where(filter=FieldFilter("fire_at", ">=", now)).where(filter=FieldFilter("status", "==", "Pending")).order_by("fire_at").stream()
 
     schedule = []
     for reminder in reminders:
@@ -89,96 +82,80 @@ def get_reminders(user_number, db, timezone='US/Eastern') -> List[Tuple[str, str
     logger.info("Found %d reminders associated with user: %s", len(schedule), user_number)
     return schedule
 
-def handle_reminders(event, db):
-    # Convert to dictionary and get reminder task and user number
-    event_dict = event.to_dict()
-    task = event_dict.get("task")
-    number = event_dict.get("user_number")
+def get_reminder_pipeline(db) -> ReminderPipeline:
+    """Initialize and return the shared reminder pipeline"""
+    global _pipeline
+    if _pipeline is None:
+        advance = os.getenv("ADVANCE_RECURRING_AT_FIRE", "0") == "1" # Move recurring reminders to their next occurrence as they fire
+        _pipeline = ReminderPipeline(db, cached(get_openai_client()), get_twilio_client(), user_cache=get_user_cache(db), advance_recurring=advance)
+    return _pipeline
 
-    # Get OpenAI client and create message
-    try:
-        Oclient = get_openai_client()
-        message = Oclient.responses.create(
-            model="gpt-4o-mini",
-            instructions= "Create a friendly reminder for the task the user enters. Keep it brief and keep the name of the reminder relatively the same. Do not say tell the user to set a reminder. Simply, remind them.",
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": f"{task}"
-                        }
-                    ]
-                }
-            ],
-            temperature=0.35
-        )
-        message_final = message.output_text
-    except Exception as e:
-        logger.exception("Failed to generate reminder with OpenAI for user %s", number)
-        return
-    
-    user_ref = db.collection("Users").document(f"{number}").get()
-    if user_ref.exists:
-        user_dict = user_ref.to_dict()
-        # Add to twilio conversation
-        twilio_id = user_dict.get("twilio_ID")
-        try:
-            Tclient = get_twilio_client()
-            message = Tclient.conversations.v1.conversations(
-                twilio_id
-            ).messages.create(
-                body=message_final
-            )
-        except Exception as e:
-            logger.exception("Failed to send message to %s via Twilio", number)
-    else:
-        logger.warning("Failed to find Firestore document for user %s", number)
-        
-    # Set expired non-recurring reminder status to be completed 
-    if event_dict.get("recurring") == False:
-        db.collection("Reminders").document(event.id).update({"status": "Completed"})
-
-def update_recurring_reminders(db):
-    now = datetime.now(pytz.UTC).replace(second=0, microsecond=0).isoformat() # Don't change all times in database is utc
-    # Get all reminders that are recurring and before now
-    reminders = db.collection("Reminders").where(filter=FieldFilter("status", "==", "Pending")).where(filter=FieldFilter("recurring", "==", True)).where(filter=FieldFilter("time", "<", now)).stream() # Returns a stream of documents
-
-    # Iterate through all reminders
-    for event in reminders: # Reads document in document stream that match the query
-        event_dict = event.to_dict()
-        time = event_dict.get("time")
-        frequency = event_dict.get("frequency")
-        
-        # Get frequency specifics
-        time_unit = frequency.get("time_unit")
-        how_often = frequency.get("how_often")
-        days_of_week = frequency.get("days_of_week", None)
-
-        if time_unit == 'hourly':
-            time_new = datetime.isoformat(datetime.fromisoformat(time) + timedelta(hours=how_often))
-        elif time_unit == "daily":
-            time_new = datetime.isoformat(datetime.fromisoformat(time) + timedelta(days=how_often))
-        elif time_unit == "weekly":
-            # If there are no days of the week, then it is every {how_often} weeks
-            if days_of_week is None: 
-                time_new = datetime.isoformat(datetime.fromisoformat(time) + timedelta(weeks=how_often))
-            # If only one day of the week or all days of the week, then it is every one week
-            elif len(days_of_week) == 1 or len(days_of_week) == 7: 
-                time_new = datetime.isoformat(datetime.fromisoformat(time) + timedelta(weeks=1))
-            else:
-                weekday = datetime.weekday(datetime.fromisoformat(now)) + 1 # Datetime has Monday as 0, so need to add 1 to get Monday=1
-                if weekday == 7: weekday=0 # Set Sunday to 0
-                # Calculate how many days to increment based on today's weekday and {days_of_week}
-                difference = days_of_week[0]-weekday+7
-                for w in days_of_week:
-                    if w > weekday:
-                        difference = w-weekday
-                        break
-                time_new = datetime.isoformat(datetime.fromisoformat(time) + timedelta(days=difference))
-        elif time_unit == "monthly":
-            time_new = datetime.isoformat(datetime.fromisoformat(time) + timedelta(weeks=4*how_often))
-
-        # Set new time
-        db.collection("Reminders").document(event.id).update({"time": time_new})
+def handle_reminder_batch(events, db) -> int:
+    """Send a batch of due reminder snapshots through the reminder pipeline"""
+    if os.getenv("ASYNC_PIPELINES", "0") == "1": # Compose and send as coroutines on the async clients
+        return run_async(get_reminder_pipeline(db).run_async(events))
+    return get_reminder_pipeline(db).run(events)
+
+def handle_reminders(event, db):
+    handle_reminder_batch([event], db)
+
+def _recurring_page(db, now: datetime, cursor: dict, page_size: int):
+    query = db.collection("Reminders").where(filter=FieldFilter("status", "==", "Pending")).where(filter=FieldFilter("recurring", "==", True)).where(filter=FieldFilter("fire_at", "<", now)).order_by("fire_at").order_by("__name__")
+    if cursor:
+        query = query.start_after(cursor)
+    return list(query.limit(page_size).stream())
+
+def update_recurring_reminders(db, now: datetime = None, page_size: int = MAX_BATCH_WRITES, max_seconds: float = None) -> dict:
+    """
+    Move every past-due recurring reminder to its next occurrence after now, resuming from the last checkpoint.
+
+    Reminders are read a page at a time with a (fire_at, document ID) cursor and each page is
+    written as one WriteBatch of up to 500, then the cursor is checkpointed, so a run cut short
+    leaves every reminder either advanced or untouched and the next run picks up where it
+    stopped. Occurrences come from the reminder's RRULE in the user's timezone, skipping missed
+    periods directly (see utils.recurrence), so reminders far behind cost no more than others.
+
+    Args:
+        max_seconds (float): Stop after the page that crosses this budget; the next run resumes
+
+    Returns:
+        dict: Counters for this run, with "finished" set when every past-due reminder was checked
+    """
+    start = time.monotonic()
+    now = (now or datetime.now(pytz.UTC)).replace(second=0, microsecond=0)
+    checkpoint = load_checkpoint(db, RECURRING_JOB) or {}
+    cursor = checkpoint.get("cursor")
+    stats = {"checked": checkpoint.get("checked", 0), "advanced": checkpoint.get("advanced", 0), "pages": checkpoint.get("pages", 0)}
+    while True:
+        reminders = _recurring_page(db, now, cursor, page_size)
+        if not reminders:
+            finish_checkpoint(db, RECURRING_JOB, **stats)
+            logger.info("Recurring reminders advanced: %s", stats)
+            return {**stats, "finished": True}
+
+        # Reminders added before timezones were stored use the user's profile timezone
+        docs = [(event, event.to_dict()) for event in reminders]
+        numbers = {d.get("user_number") for _, d in docs if not d.get("timezone")}
+        users = get_user_cache(db).get_many(numbers) if numbers else {}
+        batch = db.batch()
+        updates = []
+        for event, d in docs:
+            time_new = next_occurrence(d.get("frequency"), d.get("time"), reminder_timezone(d, users), after=now)
+            if time_new is None:
+                logger.warning("Reminder %s has an unusable frequency: %s", event.id, d.get("frequency"))
+                continue
+            batch.update(event.reference, time_fields(time_new))
+            updates.append((event.id, time_new))
+        if updates:
+            batch.commit()
+        for reminder_id, time_new in updates:
+            scheduler.notify_scheduled(reminder_id, time_new)
+
+        cursor = {"fire_at": docs[-1][1].get("fire_at"), "__name__": reminders[-1].id}
+        stats["checked"] += len(reminders)
+        stats["advanced"] += len(updates)
+        stats["pages"] += 1
+        save_checkpoint(db, RECURRING_JOB, cursor, **stats)
+        if max_seconds is not None and time.monotonic() - start >= max_seconds:
+            logger.info("Recurring reminder update paused at %s: %s", cursor, stats)
+            return {**stats, "finished": False}
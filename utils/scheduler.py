@@ -0,0 +1,212 @@
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+import pytz
+from google.api_core.exceptions import FailedPrecondition
+
+from .reminder_store import parse_time, pending_in_window
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# How far ahead of now reminders are loaded into memory
+HORIZON = timedelta(minutes=15)
+# How far behind now a missed reminder is still sent
+CATCH_UP = timedelta(hours=6)
+# How often (seconds) the in-memory window is refreshed from Firestore, which also picks up
+# reminders written by other instances
+RELOAD_INTERVAL = 60
+# Longest the loop sleeps between checks (seconds)
+MAX_SLEEP = 1.0
+# Concurrent conditional writes when claiming due reminders
+CLAIM_WORKERS = 32
+
+
+class ReminderScheduler:
+    """
+    Keeps upcoming pending reminders in a min-heap ordered by fire time and sends them when due.
+
+    The heap only covers reminders up to now + HORIZON and is refreshed from Firestore every
+    RELOAD_INTERVAL seconds, so each tick only pops the reminders that are due. Entries are
+    deleted lazily: `_entries` holds the current time of each live reminder and heap items that
+    no longer match it are skipped when popped.
+    """
+
+    def __init__(self, db, handler: Callable):
+        self.db = db
+        self.handler = handler  # Called as handler(snapshots, db) with every claimed due reminder
+        self._heap: List[Tuple[float, str, str]] = []  # (fire timestamp, reminder id, stored time)
+        self._entries = {}  # reminder id -> stored time
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._loaded_until: Optional[datetime] = None
+        self._last_reload: Optional[datetime] = None
+
+    def schedule(self, reminder_id: str, time_str: str):
+        """ Add or move a reminder. Reminders beyond the loaded window are picked up by the next reload """
+        fire_at = parse_time(time_str)
+        with self._lock:
+            if self._loaded_until is None or fire_at >= self._loaded_until:
+                self._entries.pop(reminder_id, None)
+                return
+            self._entries[reminder_id] = time_str
+            heapq.heappush(self._heap, (fire_at.timestamp(), reminder_id, time_str))
+            is_next = self._heap[0][1] == reminder_id
+        if is_next:
+            self._wakeup.set()
+
+    def unschedule(self, reminder_id: str):
+        """ Drop a reminder; its heap item is discarded when it reaches the top """
+        with self._lock:
+            self._entries.pop(reminder_id, None)
+
+    def reload(self, now: datetime = None):
+        """
+        Refresh the heap from Firestore for the window around now.
+
+        The first load reaches back CATCH_UP to pick up missed reminders; later loads start just
+        before the previous one, and entries older than that are kept as they are.
+        """
+        now = now or datetime.now(pytz.UTC)
+        if self._last_reload is None:
+            start = now - CATCH_UP
+        else:
+            start = self._last_reload - timedelta(minutes=1)
+        start = start.replace(second=0, microsecond=0)
+        end = (now + HORIZON).replace(second=0, microsecond=0)
+        reminders = pending_in_window(self.db, start, end)
+
+        loaded = {}
+        for reminder in reminders:
+            d = reminder.to_dict()
+            time_str = d.get("time")
+            if not time_str or d.get("last_fired") == time_str: # Already sent for this occurrence
+                continue
+            loaded[reminder.id] = time_str
+
+        start_ts = start.timestamp()
+        with self._lock:
+            entries = {reminder_id: time_str for reminder_id, time_str in self._entries.items() if parse_time(time_str).timestamp() < start_ts}
+            entries.update(loaded)
+            self._heap = [(parse_time(time_str).timestamp(), reminder_id, time_str) for reminder_id, time_str in entries.items()]
+            heapq.heapify(self._heap)
+            self._entries = entries
+            self._loaded_until = end
+            self._last_reload = now
+        logger.info("Loaded %d pending reminders between %s and %s", len(loaded), start.isoformat(), end.isoformat())
+        self._wakeup.set()
+
+    def tick(self, now: datetime = None) -> int:
+        """ Reload if the window is stale, then send everything due """
+        now = now or datetime.now(pytz.UTC)
+        if self._last_reload is None or (now - self._last_reload).total_seconds() >= RELOAD_INTERVAL:
+            self.reload(now)
+        return self.run_pending(now)
+
+    def pop_due(self, now: datetime = None) -> List[Tuple[str, str]]:
+        """ Remove and return (reminder id, stored time) for every reminder due at or before now """
+        now_ts = (now or datetime.now(pytz.UTC)).timestamp()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_ts:
+                _, reminder_id, time_str = heapq.heappop(self._heap)
+                if self._entries.get(reminder_id) != time_str: # Stale entry
+                    continue
+                del self._entries[reminder_id]
+                due.append((reminder_id, time_str))
+        return due
+
+    def run_pending(self, now: datetime = None) -> int:
+        """ Send every due reminder. Returns the number of reminders claimed """
+        due = self.pop_due(now)
+        if not due:
+            return 0
+        with ThreadPoolExecutor(max_workers=CLAIM_WORKERS) as executor:
+            claimed = [snapshot for snapshot in executor.map(lambda item: self._claim(*item), due) if snapshot]
+        if claimed:
+            try:
+                self.handler(claimed, self.db)
+            except Exception as e:
+                logger.exception("Error sending reminders")
+        logger.info("Sent %d of %d due reminders", len(claimed), len(due))
+        return len(claimed)
+
+    def _claim(self, reminder_id: str, time_str: str):
+        """
+        Mark a reminder occurrence as fired so no other worker or instance sends it again.
+
+        The write is conditional on the document not having changed since it was read, so if two
+        instances race for the same reminder only one of them gets the snapshot back.
+        """
+        ref = self.db.collection("Reminders").document(reminder_id)
+        snapshot = ref.get()
+        if not snapshot.exists:
+            return None
+        d = snapshot.to_dict()
+        if d.get("status") != "Pending" or d.get("time") != time_str or d.get("last_fired") == time_str:
+            return None
+        try:
+            ref.update({"last_fired": time_str}, option=self.db.write_option(last_update_time=snapshot.update_time))
+        except FailedPrecondition:
+            logger.info("Reminder %s already claimed elsewhere", reminder_id)
+            return None
+        return snapshot
+
+    def start(self):
+        """ Load the initial window and start the background loop """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.reload()
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        with self._lock:
+            if not self._heap:
+                return MAX_SLEEP
+            return max(0.0, min(MAX_SLEEP, self._heap[0][0] - now.timestamp()))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.exception("Reminder scheduler tick failed")
+            self._wakeup.wait(self._seconds_until_next(datetime.now(pytz.UTC)))
+            self._wakeup.clear()
+
+
+_scheduler = None
+
+def set_scheduler(scheduler: Optional[ReminderScheduler]):
+    """Register the process-wide scheduler that reminder writes are reported to"""
+    global _scheduler
+    _scheduler = scheduler
+
+def get_scheduler() -> Optional[ReminderScheduler]:
+    """Return the process-wide scheduler, if one is running"""
+    return _scheduler
+
+def notify_scheduled(reminder_id: str, time_str: str):
+    """Report a created or rescheduled reminder to the running scheduler"""
+    if _scheduler is not None:
+        _scheduler.schedule(reminder_id, time_str)
+
+def notify_removed(reminder_id: str):
+    """Report a completed or deleted reminder to the running scheduler"""
+    if _scheduler is not None:
+        _scheduler.unschedule(reminder_id)
@@ -0,0 +1,155 @@
+import logging
+from typing import Callable, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# GSM 03.38 basic character set; anything outside it and the extension table forces UCS-2
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Extension table characters take two septets (escape + character)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+# Payload per segment of a concatenated SMS (the rest of the 140 bytes is the UDH)
+GSM7_SEGMENT = 153
+UCS2_SEGMENT = 67
+# Break points, most preferred first
+BREAKS = ("\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ")
+
+
+def is_gsm7(text: str) -> bool:
+    return all(c in GSM7_BASIC or c in GSM7_EXTENDED for c in text)
+
+
+def _units(c: str) -> tuple:
+    """ (septets in GSM-7 or None if not encodable, UTF-16 code units in UCS-2) """
+    gsm = 1 if c in GSM7_BASIC else 2 if c in GSM7_EXTENDED else None
+    return gsm, 2 if ord(c) > 0xFFFF else 1
+
+
+def segment_count(text: str) -> int:
+    """ Number of SMS segments `text` is billed as """
+    if not text:
+        return 0
+    if is_gsm7(text):
+        septets = sum(_units(c)[0] for c in text)
+        return 1 if septets <= 160 else -(-septets // GSM7_SEGMENT)
+    units = sum(_units(c)[1] for c in text)
+    return 1 if units <= 70 else -(-units // UCS2_SEGMENT)
+
+
+def fit(text: str, segments: int = 1) -> int:
+    """
+    Length of the longest prefix of `text` that fits in `segments` segments, counting GSM-7
+    septets while the prefix is GSM-7 and UTF-16 units once a character forces UCS-2. Never
+    cuts between an escape and its character or inside a surrogate pair, since whole
+    characters are counted.
+    """
+    gsm_limit, ucs_limit = GSM7_SEGMENT * segments, UCS2_SEGMENT * segments
+    septets = units = 0
+    gsm = True
+    for i, c in enumerate(text):
+        c_septets, c_units = _units(c)
+        units += c_units
+        if c_septets is None:
+            gsm = False
+        else:
+            septets += c_septets
+        if (septets > gsm_limit) if gsm else (units > ucs_limit):
+            return i
+    return len(text)
+
+
+class SegmentSplitter:
+    """
+    Cuts streamed text into SMS-sized messages as it arrives.
+
+    The first message is one segment, so it can go out as soon as that much text exists; later
+    messages are up to `segments` segments. Cuts fall on the latest paragraph, line, sentence
+    or word break that fits, and only fall back to a hard cut when a single word is too long.
+    """
+
+    def __init__(self, segments: int = 4, first_segments: int = 1):
+        self.segments = segments
+        self.first_segments = first_segments
+        self.sent = 0
+        self._buffer = ""
+
+    def _limit(self) -> int:
+        return self.first_segments if self.sent == 0 else self.segments
+
+    def _cut(self, final: bool) -> Optional[str]:
+        text = self._buffer
+        end = fit(text, self._limit())
+        if end == len(text):
+            if not final or not text.strip():
+                return None
+            cut = rest = end
+        else:
+            cut = rest = end
+            for mark in BREAKS:
+                at = text.rfind(mark, 0, end)
+                if at > end // 3: # Don't leave a stub of a message for a far-away break
+                    cut, rest = at + len(mark.rstrip()), at + len(mark) # Keep the punctuation, drop the whitespace
+                    break
+        chunk, self._buffer = text[:cut].rstrip(), text[rest:]
+        self.sent += 1
+        return chunk
+
+    def feed(self, delta: str) -> List[str]:
+        """ Add streamed text. Returns the messages that are complete """
+        self._buffer += delta
+        chunks = []
+        while True:
+            chunk = self._cut(final=False)
+            if chunk is None:
+                return chunks
+            if chunk:
+                chunks.append(chunk)
+
+    def flush(self) -> List[str]:
+        """ The rest of the text once the stream has ended """
+        chunks = []
+        while True:
+            chunk = self._cut(final=True)
+            if chunk is None:
+                return chunks
+            if chunk:
+                chunks.append(chunk)
+
+
+class DeliveredText(str):
+    """ Reply text that has already been sent to the user as it streamed """
+
+
+def stream_reply(openai_client, send: Callable[[str], None], splitter: Optional[SegmentSplitter] = None, **request):
+    """
+    Create a Responses API response with stream=True and text each SMS-sized piece of the
+    output through `send` as soon as it is complete, while the rest is still being generated.
+
+    Tool calls are not sent; the caller checks the returned response's output as usual.
+
+    Args:
+        openai_client: OpenAI client
+        send (callable): Sends one message to the user, called in order
+        request: Arguments for responses.create
+
+    Returns:
+        The completed response object, or None if the stream ended without one
+    """
+    splitter = splitter or SegmentSplitter()
+    response = None
+    for event in openai_client.responses.create(stream=True, **request):
+        kind = getattr(event, "type", "")
+        if kind == "response.output_text.delta":
+            for chunk in splitter.feed(event.delta):
+                send(chunk)
+        elif kind in ("response.completed", "response.incomplete"):
+            response = event.response
+        elif kind in ("response.failed", "error"):
+            logger.error("OpenAI stream failed: %s", getattr(event, "response", None) or getattr(event, "message", None))
+    for chunk in splitter.flush():
+        send(chunk)
+    return response
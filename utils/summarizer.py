@@ -0,0 +1,308 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from .clients import async_limit, create_response_async, get_async_twilio_client
+from .checkpoints import load_checkpoint, save_checkpoint, finish_checkpoint
+from .memory import FOLD_INSTRUCTIONS, LONG_TERM_CHARS, fold_memory, merge_facts
+from .user_cache import get_user_cache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+JOB = "summarize"
+# Firestore limits a WriteBatch to 500 writes
+MAX_BATCH_WRITES = 500
+
+PACKED_INSTRUCTIONS = """You summarize text message conversations between users and their assistant, Marley, for several users at once.
+The input is a JSON object mapping a user key to that user's new messages.
+Return a JSON object mapping every user key to {"summary": short summary of the new messages, "facts": list of short, lasting facts about the user (name, school, schedule, preferences); empty if none}."""
+SINGLE_INSTRUCTIONS = """You summarize a text message conversation between a user and their assistant, Marley.
+Return a JSON object {"summary": short summary of the messages, "facts": list of short, lasting facts about the user (name, school, schedule, preferences); empty if none}."""
+
+
+class SummaryEngine:
+    """
+    Nightly, incremental conversation summarizer.
+
+    Users with memory.summarized == False are streamed a page at a time in document ID order.
+    For each page only the Twilio messages newer than the user's memory.watermark are fetched,
+    conversations are packed `pack_size` users per model request, and the resulting summary and
+    facts are folded into the bounded memory layout (see memory.fold_memory). Every user gets
+    one merged update through a WriteBatch. After each page the last user ID is checkpointed in
+    Jobs/summarize, so a run cut short resumes after the last committed page.
+
+    run_async() and process_page_async() do the same on the running event loop, fetching with the
+    async Twilio client and summarizing with the async OpenAI client within their concurrency
+    limits (see utils.clients); Firestore reads and writes run in a worker thread.
+    """
+
+    def __init__(self, db, openai_client, twilio_client, page_size: int = 200, pack_size: int = 20, message_limit: int = 30, twilio_concurrency: int = 16, openai_concurrency: int = 8,
+                 async_openai_client=None, async_twilio_client=None):
+        self.db = db
+        self.openai_client = openai_client
+        self.twilio_client = twilio_client
+        self.async_openai_client = async_openai_client  # None uses the running loop's clients from utils.clients
+        self.async_twilio_client = async_twilio_client
+        self.page_size = min(page_size, MAX_BATCH_WRITES)
+        self.pack_size = pack_size
+        self.message_limit = message_limit
+        self.twilio_concurrency = twilio_concurrency
+        self.openai_concurrency = openai_concurrency
+        self.stats = {"users": 0, "summarized": 0, "skipped": 0, "model_calls": 0, "pages": 0}
+        self._lock = threading.Lock()
+
+    def fetch_messages(self, twilio_id: str, watermark: int = -1) -> Tuple[List[str], int]:
+        """
+        Messages newer than the watermark, oldest first.
+
+        Returns:
+            tuple: (["User: ...", "Marley: ..."], index of the newest message seen)
+        """
+        records = self.twilio_client.conversations.v1.conversations(
+            twilio_id
+        ).messages.list(order="desc", limit=self.message_limit)
+        return self._new_messages(records, watermark)
+
+    async def fetch_messages_async(self, twilio_id: str, watermark: int = -1) -> Tuple[List[str], int]:
+        """ fetch_messages on the async Twilio client, within the Twilio concurrency limit """
+        client = self.async_twilio_client or get_async_twilio_client()
+        async with async_limit("twilio"):
+            records = await client.conversations.v1.conversations(
+                twilio_id
+            ).messages.list_async(order="desc", limit=self.message_limit)
+        return self._new_messages(records, watermark)
+
+    @staticmethod
+    def _new_messages(records, watermark: int) -> Tuple[List[str], int]:
+        new = [record for record in records if record.index is not None and record.index > watermark]
+        messages = [f"{'Marley' if record.author == 'system' else 'User'}: {record.body}" for record in reversed(new) if record.body]
+        return messages, max([record.index for record in new], default=watermark)
+
+    def _request(self, instructions: str, text: str, json_output: bool) -> dict:
+        with self._lock:
+            self.stats["model_calls"] += 1
+        kwargs = {"text": {"format": {"type": "json_object"}}} if json_output else {}
+        return dict(model="gpt-4o-mini", instructions=instructions, input=text, **kwargs)
+
+    def _create(self, instructions: str, text: str, json_output: bool = False) -> str:
+        return self.openai_client.responses.create(**self._request(instructions, text, json_output)).output_text
+
+    async def _create_async(self, instructions: str, text: str, json_output: bool = False) -> str:
+        return (await create_response_async(client=self.async_openai_client, **self._request(instructions, text, json_output))).output_text
+
+    def combine(self, texts: List[str]) -> str:
+        """ Fold several summaries into one, used when daily and weekly summaries roll up """
+        texts = [text for text in texts if text]
+        if len(texts) <= 1:
+            return texts[0] if texts else ""
+        try:
+            return self._create(FOLD_INSTRUCTIONS, "\n\n".join(texts))
+        except Exception as e:
+            logger.exception("Failed to fold summaries, joining them instead")
+            return " ".join(texts)[:LONG_TERM_CHARS]
+
+    @staticmethod
+    def _parse(value) -> Optional[dict]:
+        if isinstance(value, str):
+            value = {"summary": value, "facts": []}
+        if not isinstance(value, dict) or not isinstance(value.get("summary"), str) or not value["summary"].strip():
+            return None
+        facts = value.get("facts")
+        return {"summary": value["summary"].strip(), "facts": [f for f in facts if isinstance(f, str)] if isinstance(facts, list) else []}
+
+    def _unpack(self, keys: Dict[str, str], reply: str) -> Dict[str, dict]:
+        results = {}
+        for key, value in json.loads(reply).items():
+            parsed = self._parse(value)
+            if key in keys and parsed:
+                results[keys[key]] = parsed
+        return results
+
+    def summarize_pack(self, conversations: Dict[str, List[str]]) -> Dict[str, dict]:
+        """ {user: {"summary", "facts"}} from one model request. Users the reply misses are retried alone """
+        keys = {f"u{i}": user_id for i, user_id in enumerate(conversations)}
+        results = {}
+        if len(conversations) > 1:
+            try:
+                results = self._unpack(keys, self._create(PACKED_INSTRUCTIONS, json.dumps({key: conversations[user_id] for key, user_id in keys.items()}), json_output=True))
+            except Exception as e:
+                logger.exception("Packed summary request failed, summarizing users one at a time")
+        for user_id, messages in conversations.items():
+            if user_id not in results:
+                try:
+                    parsed = self._parse(json.loads(self._create(SINGLE_INSTRUCTIONS, "\n".join(messages), json_output=True)))
+                    if parsed:
+                        results[user_id] = parsed
+                except Exception as e:
+                    logger.exception("Error summarizing messages for user %s", user_id)
+        return results
+
+    async def summarize_pack_async(self, conversations: Dict[str, List[str]]) -> Dict[str, dict]:
+        """ summarize_pack on the async OpenAI client; the users the reply misses are retried alone, concurrently """
+        keys = {f"u{i}": user_id for i, user_id in enumerate(conversations)}
+        results = {}
+        if len(conversations) > 1:
+            try:
+                results = self._unpack(keys, await self._create_async(PACKED_INSTRUCTIONS, json.dumps({key: conversations[user_id] for key, user_id in keys.items()}), json_output=True))
+            except Exception as e:
+                logger.exception("Packed summary request failed, summarizing users one at a time")
+
+        async def single(user_id):
+            try:
+                parsed = self._parse(json.loads(await self._create_async(SINGLE_INSTRUCTIONS, "\n".join(conversations[user_id]), json_output=True)))
+                if parsed:
+                    results[user_id] = parsed
+            except Exception as e:
+                logger.exception("Error summarizing messages for user %s", user_id)
+        await asyncio.gather(*(single(user_id) for user_id in conversations if user_id not in results))
+        return results
+
+    def _page(self, cursor: Optional[str]):
+        query = self.db.collection("Users").where(filter=FieldFilter("memory.summarized", "==", False)).order_by("__name__")
+        if cursor:
+            query = query.start_after({"__name__": cursor})
+        return list(query.limit(self.page_size).stream())
+
+    def _safe_fetch(self, twilio_id: str, watermark: int):
+        if not twilio_id:
+            return [], watermark
+        try:
+            return self.fetch_messages(twilio_id, watermark)
+        except Exception as e:
+            logger.exception("Failed to fetch messages for conversation %s", twilio_id)
+            return None
+
+    async def _safe_fetch_async(self, twilio_id: str, watermark: int):
+        if not twilio_id:
+            return [], watermark
+        try:
+            return await self.fetch_messages_async(twilio_id, watermark)
+        except Exception as e:
+            logger.exception("Failed to fetch messages for conversation %s", twilio_id)
+            return None
+
+    @staticmethod
+    def _targets(users) -> Tuple[Dict[str, dict], List[tuple]]:
+        """ ({user: memory}, [(user, conversation, watermark)]) for a page of user snapshots """
+        memories = {user.id: (user.to_dict().get("memory") or {}) for user in users}
+        return memories, [(user.id, user.to_dict().get("twilio_ID"), memories[user.id].get("watermark", -1)) for user in users]
+
+    def _packs(self, conversations: Dict[str, List[str]]) -> List[Dict[str, List[str]]]:
+        user_ids = list(conversations)
+        return [{user_id: conversations[user_id] for user_id in user_ids[i:i + self.pack_size]} for i in range(0, len(user_ids), self.pack_size)]
+
+    def process_page(self, users) -> int:
+        """ Summarize one page of user snapshots and commit their updates in one batch """
+        memories, targets = self._targets(users)
+        with ThreadPoolExecutor(max_workers=self.twilio_concurrency) as executor:
+            fetched = dict(zip([user_id for user_id, _, _ in targets], executor.map(lambda target: self._safe_fetch(*target[1:]), targets)))
+        conversations = {user_id: result[0] for user_id, result in fetched.items() if result and result[0]}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.openai_concurrency) as executor:
+            for result in executor.map(self.summarize_pack, self._packs(conversations)):
+                results.update(result)
+        return self._commit_page(memories, fetched, conversations, results)
+
+    async def process_page_async(self, users) -> int:
+        """ process_page on the running event loop """
+        memories, targets = self._targets(users)
+        fetched = dict(zip([user_id for user_id, _, _ in targets], await asyncio.gather(*(self._safe_fetch_async(*target[1:]) for target in targets))))
+        conversations = {user_id: result[0] for user_id, result in fetched.items() if result and result[0]}
+
+        results = {}
+        for result in await asyncio.gather(*(self.summarize_pack_async(pack) for pack in self._packs(conversations))):
+            results.update(result)
+        # Folding can call the model to roll summaries up, so the commit runs off the loop
+        return await asyncio.to_thread(self._commit_page, memories, fetched, conversations, results)
+
+    def _commit_page(self, memories: Dict[str, dict], fetched: Dict[str, Optional[tuple]], conversations: Dict[str, List[str]], results: Dict[str, dict]) -> int:
+        day = datetime.now(pytz.UTC).strftime("%Y-%m-%d")
+        batch = self.db.batch()
+        skipped = 0
+        for user_id, result in fetched.items():
+            if result is None or (user_id in conversations and user_id not in results): # Leave it for the next run
+                skipped += 1
+                continue
+            memory = memories[user_id]
+            fields = {"memory.summarized": True, "memory.watermark": result[1]}
+            if user_id in results:
+                folded = fold_memory(memory, results[user_id]["summary"], day, combine=self.combine)
+                fields.update({f"memory.{key}": value for key, value in folded.items()})
+                fields["memory.facts"] = merge_facts(memory.get("facts"), results[user_id]["facts"])
+            batch.update(self.db.collection("Users").document(user_id), fields)
+        batch.commit()
+        users_cache = get_user_cache(self.db)
+        for user_id in fetched:
+            users_cache.invalidate(user_id)
+
+        self.stats["summarized"] += len(results)
+        self.stats["skipped"] += skipped
+        return len(results)
+
+    def _next_page(self, cursor: Optional[str]):
+        """ The page after `cursor`, finishing the checkpoint when there is none """
+        users = self._page(cursor)
+        if not users:
+            finish_checkpoint(self.db, JOB, **self.stats)
+            logger.info("Summarization finished: %s", self.stats)
+        return users
+
+    def _page_done(self, users, start: float, max_seconds: Optional[float]) -> Optional[dict]:
+        """ Checkpoint after a page. Returns the run's result when the time budget is spent """
+        cursor = users[-1].id
+        self.stats["pages"] += 1
+        self.stats["users"] += len(users)
+        save_checkpoint(self.db, JOB, cursor, **self.stats)
+        if max_seconds is not None and time.monotonic() - start >= max_seconds:
+            logger.info("Summarization paused after %s: %s", cursor, self.stats)
+            return {**self.stats, "finished": False}
+        return None
+
+    async def run_async(self, max_seconds: float = None) -> dict:
+        """ run() on the running event loop """
+        start = time.monotonic()
+        checkpoint = await asyncio.to_thread(load_checkpoint, self.db, JOB) or {}
+        cursor = checkpoint.get("cursor")
+        while True:
+            users = await asyncio.to_thread(self._next_page, cursor)
+            if not users:
+                return {**self.stats, "finished": True}
+            await self.process_page_async(users)
+            cursor = users[-1].id
+            paused = await asyncio.to_thread(self._page_done, users, start, max_seconds)
+            if paused:
+                return paused
+
+    def run(self, max_seconds: float = None) -> dict:
+        """
+        Summarize every unsummarized user, resuming from the last checkpoint.
+
+        Args:
+            max_seconds (float): Stop after the page that crosses this budget; the next run resumes
+
+        Returns:
+            dict: Counters for this run, with "finished" set when every user was processed
+        """
+        start = time.monotonic()
+        checkpoint = load_checkpoint(self.db, JOB) or {}
+        cursor = checkpoint.get("cursor")
+        while True:
+            users = self._next_page(cursor)
+            if not users:
+                return {**self.stats, "finished": True}
+            self.process_page(users)
+            cursor = users[-1].id
+            paused = self._page_done(users, start, max_seconds)
+            if paused:
+                return paused
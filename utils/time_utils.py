@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
 from dateutil.parser import isoparse
 import pytz
-from typing import Tuple, List
+from typing import Tuple, List, Optional
+
+from .intervals import BusyIntervals, to_epoch
 
 def standardize_time(date_str: str, time_str: str, user_timezone: str = "US/Eastern") -> str:
     """
@@ -81,38 +83,37 @@ def format_time_for_display(iso_time: str, timezone: str ="US/Eastern") -> Tuple
     
     return date_str, time_str
 
-def find_conflict(possible_times: List[str], user_events: List[str], Timezone: str) -> datetime:
+def candidate_window(possible_times: List[str], Timezone: str, duration: timedelta = timedelta(hours=1)) -> Optional[Tuple[str, str]]:
+    """
+    The time range a set of candidate times covers, for fetching only the calendar events that matter.
+    
+    Args:
+        possible_times (array): ISO format start times; naive times are in Timezone
+        Timezone (str): The user's timezone
+        duration (timedelta): Length of the event
+        
+    Returns:
+        tuple: (start, end) in UTC ISO format, or None if there are no candidates
+    """
+    user_tz = pytz.timezone(Timezone or "US/Eastern")
+    starts = [to_epoch(time, user_tz) for time in possible_times or []]
+    if not starts:
+        return None
+    return (datetime.fromtimestamp(min(starts), pytz.UTC).isoformat(),
+            (datetime.fromtimestamp(max(starts), pytz.UTC) + duration).isoformat())
+
+def find_conflict(possible_times: List[str], user_events: List[str], Timezone: str, duration: timedelta = timedelta(hours=1), work_hours: Optional[dict] = None) -> datetime:
     """
     Determines the best time to schedule the event.
     
     Args:
         possible_times (array): an array of ISO format strings for the possible times of the event
         user_events (array[tuples]): an array of tuples of ISO format datetime string where tuple: (start, end, event)
+        duration (timedelta): Length of the event
+        work_hours (dict): The profile's workHours, {"start": "HH:MM", "end": "HH:MM"}; candidates outside it are skipped
         
     Returns:
-        best_time (datetime object): datetime object of the best available time
+        best_time (datetime object): datetime object of the first free candidate, in the user's timezone
     """
-    user_tz = pytz.timezone(Timezone)
-    for time in possible_times:
-        time_start = isoparse(time)  # safe for aware datetimes
-        if time_start.tzinfo is None: # Ensure time is timezone aware
-            time_start = user_tz.localize(time_start)
-        time_end = time_start + timedelta(hours=1)
-
-        conflict = False
-        for unavailable_start, unavailable_end, event in user_events: # Loop through user schedule to find best time
-            event_start = isoparse(unavailable_start)
-            event_end = isoparse(unavailable_end)
-
-            # Ensure time is timezone aware
-            if event_start.tzinfo is None:
-                event_start = user_tz.localize(event_start)
-            if event_end.tzinfo is None:
-                event_end = user_tz.localize(event_end)
-
-            if time_start < event_end and time_end > event_start:
-                conflict = True
-                break
-        if not conflict:
-            return time_start
-    return None
\ No newline at end of file
+    busy = BusyIntervals.from_events(user_events, Timezone, work_hours)
+    return busy.first_free(possible_times, duration)
@@ -1,6 +1,3 @@
-from datetime import datetime
-import pytz
-
 tools = [
     {
         "type": "function",
@@ -15,11 +12,11 @@ tools = [
                 },
                 "date": {
                     "type": "string",
-                    "description": f"Date must be in YYYY-MM-DD format. If user specifies weekday or tomorrow or in the future, calculate based off today's date of {datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d')} and today's weekday of {datetime.weekday(datetime.now())+1}. Always convert into the future."
+                    "description": "Date must be in YYYY-MM-DD format. If user specifies weekday or tomorrow or in the future, calculate based off the current date and weekday given in the conversation. Always convert into the future."
                 },
                 "time": {
                     "type": "string",
-                    "description": f"Time must be in 24-hour format (HH:MM), do not include seconds. Today's time is {datetime.now(pytz.timezone('US/Eastern')).strftime('%H:%M')} if not provided by user. Convert phrases like 'in 5 minutes' or 'in an hour' into an absolute time based off today's time. Always convert into the future."
+                    "description": "Time must be in 24-hour format (HH:MM), do not include seconds. Use the current time given in the conversation if not provided by user. Convert phrases like 'in 5 minutes' or 'in an hour' into an absolute time based off today's time. Always convert into the future."
                 },
                 "recurring": {
                     "type": "boolean",
@@ -79,7 +76,7 @@ tools = [
     {
         "type": "function",
         "name": "parse_calendar_event",
-        "description": "Determine event, date, start_time, end_time, and duration of a user's calendar event.",
+        "description": "Determine event, date, start_time, end_time, and duration of a user's calendar event. For several events in one message, fill in events instead.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -89,15 +86,15 @@ tools = [
                 },
                 "date": {
                     "type": "string",
-                    "description": f"Date must be in YYYY-MM-DD format. If user specifies weekday or tomorrow or in the future, calculate based off today's date of {datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d')} and today's weekday of {datetime.weekday(datetime.now())+1}. Always convert into the future."
+                    "description": "Date must be in YYYY-MM-DD format. If user specifies weekday or tomorrow or in the future, calculate based off the current date and weekday given in the conversation. Always convert into the future."
                 },
                 "start_time": {
                     "type": "string",
-                    "description": f"The start time of the event. Time must be in 24-hour format (HH:MM). Today's time is {datetime.now(pytz.timezone('US/Eastern')).strftime('%H:%M')} if not provided by user. Convert phrases like 'in 5 minutes' or 'in an hour' into an absolute time based off today's time. Always convert into the future."
+                    "description": "The start time of the event. Time must be in 24-hour format (HH:MM). Use the current time given in the conversation if not provided by user. Convert phrases like 'in 5 minutes' or 'in an hour' into an absolute time based off today's time. Always convert into the future."
                 },
                 "end_time": {
                     "type": "string",
-                    "description": f"The end time of the event. Time must be in 24-hour format (HH:MM)."
+                    "description": "The end time of the event. Time must be in 24-hour format (HH:MM)."
                 },
                 "duration": {
                     "type": "integer",
@@ -106,10 +103,57 @@ tools = [
                 "recurring": {
                     "type": "boolean",
                     "description": "Whether the event is recurring or not."
+                },
+                "events": {
+                    "type": "array",
+                    "description": "Only when the user asks for several events at once (e.g. 'add my class schedule MWF 10-11, TTh 2-3:15'): one item per distinct event or time, instead of the fields above.",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "event": {
+                                "type": "string",
+                                "description": "The event the user specified"
+                            },
+                            "date": {
+                                "type": "string",
+                                "description": "Date of the first occurrence in YYYY-MM-DD format. Always in the future."
+                            },
+                            "start_time": {
+                                "type": "string",
+                                "description": "The start time of the event in 24-hour format (HH:MM)."
+                            },
+                            "end_time": {
+                                "type": "string",
+                                "description": "The end time of the event in 24-hour format (HH:MM)."
+                            },
+                            "duration": {
+                                "type": "integer",
+                                "description": "How long the event is in hours, if no end time is given."
+                            },
+                            "frequency": {
+                                "type": "string",
+                                "description": "How often the event repeats, if it is recurring.",
+                                "enum": ["DAILY", "WEEKLY", "MONTHLY", "YEARLY"]
+                            },
+                            "interval": {
+                                "type": "integer",
+                                "description": "Interval between recurrences. (2 means every 2 weeks)"
+                            },
+                            "byday": {
+                                "type": "array",
+                                "items": {
+                                    "type": "string",
+                                    "enum": ["SU", "MO", "TU", "WE", "TH", "FR", "SA"]
+                                },
+                                "description": "For 'WEEKLY', the days of the week the event repeats on."
+                            }
+                        },
+                        "required": ["event", "date", "start_time"]
+                    }
                 }
             },
             "additionalProperties": False,
-            "required": ["event", "date", "start_time"]
+            "required": []
         },
         "strict": False    
     },
@@ -217,9 +261,9 @@ email_tools = [
                     "type": "array",
                     "items": {
                         "type": "string",
-                        "description": f"Express in isoformat. If email specifies weekday or a day in the future, calculate based off today's date: {datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d')} and today's weekday of {datetime.weekday(datetime.now())+1}."
+                        "description": "Express in isoformat. If email specifies weekday or a day in the future, calculate based off the current date and weekday given in the conversation."
                     },
-                    "description": f"Return a list of all possible times that the email mentions. Sort earliest to latest."
+                    "description": "Return a list of all possible times that the email mentions. Sort earliest to latest."
                 }
             },
             "additionalProperties": False,
@@ -229,14 +273,14 @@ email_tools = [
     }
 ]
 
-assistant_instructions = f"""
+assistant_instructions = """
                         You are a friendly personal AI assistant named Marley that helps manage day-to-day deadlines, 
                         class homework, projects, meetings, etc. You proactively help people stay on top of commitments, 
                         and you communicate purely through texting/sms. You are fully able to set reminders and text users.
 
                         You were created by Boston University Men's Swim and Dive team members Jonny Farber, Jonathan "Big Fish" Tsang, and Evan Liu, if any user inquires. 
 
-                        Today's date and time is {datetime.now(pytz.timezone("US/Eastern")).strftime("%Y-%m-%d %H:%M")}, if needed.
+                        The current date and time is given in the conversation, if needed.
                     """
 
 recurrence_instructions = "Determine the frequency of a user's reminder request or calendar creation."
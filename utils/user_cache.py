@@ -0,0 +1,217 @@
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+logger = logging.getLogger(__name__)
+
+# Keys per get_all call
+LOOKUP_CHUNK = 300
+
+_MISSING = object()  # Cached "document does not exist"
+
+
+def _is_plain(value) -> bool:
+    """ Whether a written value can be applied to the cached copy (not a Sentinel or transform) """
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return True
+    if isinstance(value, list):
+        return all(_is_plain(v) for v in value)
+    if isinstance(value, dict):
+        return all(_is_plain(v) for v in value.values())
+    return False
+
+
+def _merge(target: dict, source: dict):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class UserCache:
+    """
+    Read-through cache for documents in the Users collection, keyed by phone number.
+
+    Entries expire after `ttl` seconds and the least recently used entry is evicted past
+    `max_entries`. Writes made through update()/set() are applied to the cached copy when they
+    only hold plain values and invalidate it otherwise. With `listen` (USER_CACHE_LISTENERS=1)
+    each cached user also gets an on_snapshot listener so writes from other instances land here.
+    Callers get deep copies, so mutating a returned dict never changes the cache.
+    """
+
+    def __init__(self, db, ttl: float = 60, max_entries: int = 10000, listen: Optional[bool] = None):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        if listen is None:
+            listen = os.getenv("USER_CACHE_LISTENERS", "0") == "1"
+        self.listen = listen
+        self._entries = OrderedDict()  # phone -> (expires at, data or _MISSING)
+        self._watches = {}  # phone -> on_snapshot watch
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _ref(self, phone: str):
+        return self.db.collection("Users").document(f"{phone}")
+
+    def _lookup(self, phone: str):
+        # Caller holds the lock
+        entry = self._entries.get(phone)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic() and phone not in self._watches:
+            del self._entries[phone]
+            return None
+        self._entries.move_to_end(phone)
+        return entry[1]
+
+    def _store(self, phone: str, data):
+        # Caller holds the lock
+        self._entries[phone] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(phone)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            watch = self._watches.pop(evicted, None)
+            if watch is not None:
+                watch.unsubscribe()
+
+    def _snapshot_data(self, snapshot):
+        return snapshot.to_dict() if snapshot.exists else _MISSING
+
+    def get(self, phone: str) -> Optional[dict]:
+        """ Return the user's document as a dict, or None if it doesn't exist """
+        with self._lock:
+            data = self._lookup(phone)
+            if data is not None:
+                self.hits += 1
+                return None if data is _MISSING else copy.deepcopy(data)
+            self.misses += 1
+        snapshot = self._ref(phone).get()
+        data = self._snapshot_data(snapshot)
+        with self._lock:
+            self._store(phone, data)
+        self._watch(phone)
+        return None if data is _MISSING else copy.deepcopy(data)
+
+    def get_many(self, phones: Iterable[str]) -> Dict[str, dict]:
+        """ Return {phone: user dict} for the users that exist, reading all misses with get_all """
+        found, missing = {}, []
+        with self._lock:
+            for phone in set(phones):
+                data = self._lookup(phone)
+                if data is None:
+                    self.misses += 1
+                    missing.append(phone)
+                else:
+                    self.hits += 1
+                    if data is not _MISSING:
+                        found[phone] = copy.deepcopy(data)
+        for i in range(0, len(missing), LOOKUP_CHUNK):
+            snapshots = list(self.db.get_all([self._ref(phone) for phone in missing[i:i + LOOKUP_CHUNK]]))
+            with self._lock:
+                for snapshot in snapshots:
+                    data = self._snapshot_data(snapshot)
+                    self._store(snapshot.id, data)
+                    if data is not _MISSING:
+                        found[snapshot.id] = copy.deepcopy(data)
+        return found
+
+    def update(self, phone: str, fields: dict):
+        """ user_ref.update(fields), keeping the cached copy in step """
+        self._ref(phone).update(fields)
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[1] is _MISSING or not all(_is_plain(v) for v in fields.values()):
+                self._invalidate(phone)
+                return
+            for path, value in fields.items():
+                parts = path.split(".")
+                target = entry[1]
+                for part in parts[:-1]:
+                    if not isinstance(target.get(part), dict):
+                        target[part] = {}
+                    target = target[part]
+                target[parts[-1]] = copy.deepcopy(value)
+
+    def set(self, phone: str, data: dict, merge: bool = False):
+        """ user_ref.set(data, merge=merge), keeping the cached copy in step """
+        self._ref(phone).set(data, merge=merge)
+        with self._lock:
+            entry = self._entries.get(phone)
+            if not _is_plain(data) or (merge and (entry is None or entry[1] is _MISSING)):
+                self._invalidate(phone)
+            elif merge:
+                _merge(entry[1], data)
+            else:
+                self._store(phone, copy.deepcopy(data))
+
+    def invalidate(self, phone: str):
+        with self._lock:
+            self._invalidate(phone)
+
+    def _invalidate(self, phone: str):
+        # Caller holds the lock
+        if self._entries.pop(phone, None) is not None:
+            self.invalidations += 1
+
+    def _watch(self, phone: str):
+        """ Keep the cached copy current with a Firestore listener """
+        if not self.listen:
+            return
+        with self._lock:
+            if phone in self._watches or phone not in self._entries:
+                return
+            self._watches[phone] = None  # Reserve while the listener is created
+
+        def on_snapshot(snapshots, changes, read_time):
+            with self._lock:
+                if phone in self._watches:
+                    for snapshot in snapshots:
+                        self._store(phone, self._snapshot_data(snapshot))
+
+        try:
+            watch = self._ref(phone).on_snapshot(on_snapshot)
+        except Exception as e:
+            logger.exception("Failed to listen to user %s", phone)
+            with self._lock:
+                self._watches.pop(phone, None)
+            return
+        with self._lock:
+            if phone in self._watches:
+                self._watches[phone] = watch
+                return
+        watch.unsubscribe() # Evicted while the listener was being created
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "listeners": len(self._watches),
+            }
+
+
+_user_cache = None
+
+def get_user_cache(db) -> UserCache:
+    """Initialize and return the process-wide user cache"""
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = UserCache(db, ttl=float(os.getenv("USER_CACHE_TTL", 60)))
+    return _user_cache